@@ -0,0 +1,263 @@
+"""Description: Benchmark suite for the search and assembly pipeline, with a simulator for synthetic genomes and reads.
+The simulator is deterministic for a given seed: it makes a random genome (optionally with repeated segments, which is
+what makes assembly hard), samples reads from it at a given length and coverage, and adds substitution errors.
+Every stage of the pipeline (reading the reads, building the filter tree, checking queries, counting k-mers, building the
+graph and extending contigs) is timed and its peak memory measured, at a few scale tiers, and the results are written
+as JSON so that runs can be compared. The search tree is sized the way main.py sizes it (the root for an estimate of the
+distinct k-mers, and each leaf for its own bin of reads), and the false positive rates of its root and its leaves are
+measured with k-mers that aren't in the reads, against the rate they were sized for.
+Usage: python benchmark.py [--tiers small medium] [--output results.json] [--seed 0] [--fpr 0.01] [--no-memory]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import reading_input # import the FASTA/FASTQ parsing from reading_input.py
+from bloom_filter import BloomFilter, get_m, get_k # import the bloom filter from bloom_filter.py
+from bloom_filter_search_tree import BloomFilterSearchTree # import the search tree from bloom_filter_search_tree.py
+from hyperloglog import estimate_distinct_kmers # import the distinct k-mer estimate from hyperloglog.py
+from de_bruijn_graph import DeBruijnGraph # import the graph from de_bruijn_graph.py
+from kmer_counter import KmerCounter # import the k-mer counting table from kmer_counter.py
+from kmers import kmer_array, reverse_complement # import the k-mer encoding from kmers.py
+
+# the scale tiers; each one is a set of keyword arguments for run_benchmark
+TIERS = {
+    "tiny": {"genome_length": 2000, "read_length": 100, "coverage": 10, "num_repeats": 2, "repeat_length": 150},
+    "small": {"genome_length": 20000, "read_length": 100, "coverage": 20, "num_repeats": 10, "repeat_length": 300},
+    "medium": {"genome_length": 200000, "read_length": 150, "coverage": 20, "num_repeats": 50, "repeat_length": 500},
+    "large": {"genome_length": 2000000, "read_length": 150, "coverage": 30, "num_repeats": 200, "repeat_length": 1000}
+}
+
+'''Make a random genome, with some segments copied to other places in it
+Input: INT length; INT num_repeats, the number of repeated segments; INT repeat_length, the length of each;
+        INT seed, for the random number generator
+Output: STRING genome
+'''
+def simulate_genome(length, num_repeats=0, repeat_length=0, seed=0):
+    rng = random.Random(seed)
+    genome = [rng.choice("ACGT") for _ in range(length)]
+    for _ in range(num_repeats):
+        if repeat_length >= length:
+            break
+        source = rng.randrange(length - repeat_length)
+        target = rng.randrange(length - repeat_length)
+        genome[target:target + repeat_length] = genome[source:source + repeat_length]
+    return "".join(genome)
+
+'''Sample reads from a genome at random positions, with substitution errors
+Input: STRING genome; INT read_length; FLOAT coverage, the average number of reads covering each base;
+        FLOAT error_rate, the chance that each base of a read is replaced with another one; INT seed;
+        BOOL both_strands, whether half of the reads (on average) come from the other strand
+Output: DICT reads, where the key is the read ID and the value is the read sequence
+'''
+def simulate_reads(genome, read_length, coverage, error_rate=0.0, seed=0, both_strands=False):
+    rng = random.Random(seed)
+    num_reads = int(math.ceil(coverage * len(genome) / read_length))
+    reads = {}
+    for i in range(num_reads):
+        start = rng.randrange(len(genome) - read_length + 1)
+        read = list(genome[start:start + read_length])
+        for position in range(read_length):
+            if rng.random() < error_rate:
+                read[position] = rng.choice([base for base in "ACGT" if base != read[position]])
+        read = "".join(read)
+        if both_strands and rng.random() < 0.5:
+            read = reverse_complement(read)
+        reads["read_" + str(i)] = read
+    return reads
+
+'''Write reads to a FASTA file
+Input: DICT reads; STRING file_name
+'''
+def write_fasta(reads, file_name):
+    with open(file_name, "w") as file:
+        for read_ID, sequence in reads.items():
+            file.write(">" + read_ID + "\n" + sequence + "\n")
+
+'''Run a function, timing it and measuring the peak memory it allocates (with tracemalloc, so NumPy arrays count too).
+Tracing every allocation slows Python code down a lot, so the memory is measured in a second run of the function.
+Input: FUNCTION function, called with no arguments; BOOL memory, whether to measure the memory as well
+Output: the function's return value; DICT with the elapsed "seconds" and the "peak_bytes" allocated (None if not measured)
+'''
+def measure(function, memory=True):
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        del result
+        tracemalloc.start()
+        try:
+            result = function()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result, {"seconds": seconds, "peak_bytes": peak}
+
+'''Measure the false positive rate of a bloom filter holding a set of k-mers, sized for a target rate with get_m and get_k
+Input: NUMPY ARRAY kmers (uint64, distinct); INT k, the k-mer length; FLOAT false_positive_rate, the target;
+        INT num_trials, the number of random k-mers (not in the set) to check; INT seed
+Output: DICT with the filter's size, the target rate, the rate predicted from its size, and the measured rate
+'''
+def measure_false_positive_rate(kmers, k, false_positive_rate, num_trials=100000, seed=0):
+    n = max(1, len(kmers))
+    array_size = get_m(n, false_positive_rate)
+    num_hash_functions = get_k(n, array_size)
+    bloom_filter = BloomFilter(array_size, num_hash_functions, seed)
+    bloom_filter.add_many(kmers)
+    trials = held_out_kmers(kmers, k, num_trials, seed)
+    return {
+        "num_items": int(len(kmers)),
+        "array_size": array_size,
+        "num_hash_functions": num_hash_functions,
+        "target": false_positive_rate,
+        "predicted": (1 - math.exp(-num_hash_functions * n / array_size)) ** num_hash_functions,
+        "measured": float(bloom_filter.check_many(trials).mean()) if len(trials) else 0.0
+    }
+
+'''Draw random k-mers that aren't in a set, to measure false positives with
+Input: NUMPY ARRAY kmers (uint64), the set; INT k, the k-mer length; INT num_trials, the number of k-mers to draw
+        (the ones that happen to be in the set are dropped); INT seed
+Output: NUMPY ARRAY (uint64) of k-mers
+'''
+def held_out_kmers(kmers, k, num_trials, seed=0):
+    rng = np.random.default_rng(seed)
+    trials = rng.integers(0, 4 ** k, size=num_trials, dtype=np.uint64) if k < 32 else \
+        rng.integers(0, 2 ** 63, size=num_trials, dtype=np.uint64)
+    return trials[~np.isin(trials, kmers)]
+
+'''Measure the false positive rates of the root and the leaves of a search tree with k-mers that aren't in the reads
+(so they aren't in any leaf either)
+Input: BloomFilterSearchTree search_tree; NUMPY ARRAY kmers (uint64), every distinct k-mer of the reads;
+        INT num_trials, the number of held-out k-mers; INT seed
+Output: DICT with the "root" (its size, the rate predicted from its size and the measured rate) and the "leaves" (their
+        number, mean size, and the mean and highest measured rates)
+'''
+def measure_tree_false_positive_rate(search_tree, kmers, num_trials=20000, seed=0):
+    search_tree.flush()
+    trials = held_out_kmers(kmers, search_tree.k, num_trials, seed)
+    num_hash_functions = search_tree.num_hash_functions
+    root = search_tree.node_filter(search_tree.root)
+    leaf_rates = [float(search_tree.node_filter(leaf).check_many(trials).mean()) if len(trials) else 0.0
+                  for leaf in search_tree.leaf_reads]
+    return {
+        "root": {
+            "num_items": int(len(kmers)),
+            "array_size": search_tree.array_size,
+            "num_hash_functions": num_hash_functions,
+            "predicted": (1 - math.exp(-num_hash_functions * len(kmers) / search_tree.array_size)) ** num_hash_functions,
+            "measured": float(root.check_many(trials).mean()) if len(trials) else 0.0
+        },
+        "leaves": {
+            "num_leaves": len(leaf_rates),
+            "mean_array_size": float(np.mean([search_tree.sizes[leaf] for leaf in search_tree.leaf_reads])),
+            "measured_mean": float(np.mean(leaf_rates)),
+            "measured_max": max(leaf_rates)
+        }
+    }
+
+'''Simulate a read set and time every stage of searching it and assembling queries from it
+Input: INT genome_length; INT read_length; FLOAT coverage; INT num_repeats; INT repeat_length; FLOAT error_rate;
+        INT k, the k-mer length; FLOAT false_positive_rate, the target rate of the search tree's filters;
+        INT num_queries, the number of queries (segments of the genome) to check and extend; INT query_length; INT seed;
+        BOOL memory, whether to measure the peak memory of each stage
+Output: DICT results, with the parameters, the "stages" (seconds and peak_bytes of each), the "false_positive_rate" of a
+        single filter sized for the k-mers, and the "tree_false_positive_rate" (see measure_tree_false_positive_rate)
+'''
+def run_benchmark(genome_length, read_length, coverage, num_repeats=0, repeat_length=0, error_rate=0.001, k=21,
+                  false_positive_rate=0.01, num_queries=20, query_length=60, seed=0, memory=True):
+    parameters = {"genome_length": genome_length, "read_length": read_length, "coverage": coverage,
+                  "num_repeats": num_repeats, "repeat_length": repeat_length, "error_rate": error_rate, "k": k,
+                  "false_positive_rate": false_positive_rate, "num_queries": num_queries,
+                  "query_length": query_length, "seed": seed}
+    genome = simulate_genome(genome_length, num_repeats, repeat_length, seed)
+    rng = random.Random(seed)
+    queries = [genome[start:start + query_length]
+               for start in (rng.randrange(genome_length - query_length + 1) for _ in range(num_queries))]
+    stages = {}
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "reads.fasta")
+        write_fasta(simulate_reads(genome, read_length, coverage, error_rate, seed), file_name)
+        reads, stages["read_reads"] = measure(lambda: reading_input.read_reads(file_name), memory)
+
+    # sized as in main.py: the root for the estimated distinct k-mers of the reads (the leaves size themselves)
+    num_kmers = max(1, int(estimate_distinct_kmers(reads.values(), k) * 1.03))
+    array_size = get_m(num_kmers, false_positive_rate)
+    num_hash_functions = get_k(num_kmers, array_size)
+    def build_search_tree():
+        search_tree = BloomFilterSearchTree(k, array_size, num_hash_functions)
+        for read_ID, sequence in reads.items():
+            search_tree.add(sequence, read_ID)
+        search_tree.flush()
+        return search_tree
+    search_tree, stages["filter_build"] = measure(build_search_tree, memory)
+    found, stages["check"] = measure(lambda: [search_tree.check(query) for query in queries], memory)
+
+    def build_kmer_table():
+        kmer_table = KmerCounter(k)
+        for sequence in reads.values():
+            kmer_table.add(kmer_array(sequence, k))
+        kmer_table.kmers # count the last batch inside the measurement
+        return kmer_table
+    kmer_table, stages["kmer_table"] = measure(build_kmer_table, memory)
+    graph, stages["graph_build"] = measure(lambda: DeBruijnGraph(None, k, kmer_table=kmer_table), memory)
+    contigs, stages["get_longest_contig"] = measure(lambda: [graph.get_longest_contig(query) for query in queries],
+                                                    memory)
+
+    return {
+        "parameters": parameters,
+        "stages": stages,
+        "counts": {
+            "reads": len(reads),
+            "distinct_kmers": len(kmer_table),
+            "graph_nodes": len(graph.nodes),
+            "queries_found": sum(found),
+            "mean_contig_length": float(np.mean([len(contig) for contig in contigs])) if contigs else 0.0
+        },
+        "false_positive_rate": measure_false_positive_rate(kmer_table.kmers, k, false_positive_rate, seed=seed),
+        "tree_false_positive_rate": measure_tree_false_positive_rate(search_tree, kmer_table.kmers, seed=seed)
+    }
+
+'''Run the benchmark at the given tiers and write the results to a JSON file
+Input: LIST tiers, names from TIERS; STRING output, the JSON file name (None to skip writing); INT seed;
+        BOOL memory, whether to measure the peak memory of each stage; FLOAT false_positive_rate, the target rate
+Output: DICT results, by tier name
+'''
+def run_tiers(tiers, output=None, seed=0, memory=True, false_positive_rate=0.01):
+    results = {tier: run_benchmark(seed=seed, memory=memory, false_positive_rate=false_positive_rate, **TIERS[tier])
+               for tier in tiers}
+    if output is not None:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search and assembly pipeline on simulated reads")
+    parser.add_argument("--tiers", nargs="+", default=["small"], choices=list(TIERS), help="scale tiers to run")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file for the results")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the simulator")
+    parser.add_argument("--fpr", type=float, default=0.01,
+                        help="target false positive rate of the bloom filters (default: %(default)s)")
+    parser.add_argument("--no-memory", action="store_true", help="only time the stages (halves the run time)")
+    args = parser.parse_args()
+    results = run_tiers(args.tiers, args.output, args.seed, not args.no_memory, args.fpr)
+    for tier, result in results.items():
+        print(tier)
+        for stage, measurement in result["stages"].items():
+            peak = "" if measurement["peak_bytes"] is None else "{:>12.1f} MB".format(measurement["peak_bytes"] / 1e6)
+            print("  {:<20}{:>10.3f} s".format(stage, measurement["seconds"]) + peak)
+        rates = result["false_positive_rate"]
+        print("  false positive rate: target {:.4g}, predicted {:.4g}, measured {:.4g}".format(
+            rates["target"], rates["predicted"], rates["measured"]))
+        tree_rates = result["tree_false_positive_rate"]
+        print("  search tree: root measured {:.4g}, {} leaves measured {:.4g} on average (highest {:.4g})".format(
+            tree_rates["root"]["measured"], tree_rates["leaves"]["num_leaves"], tree_rates["leaves"]["measured_mean"],
+            tree_rates["leaves"]["measured_max"]))
+
+if __name__ == '__main__':
+    main()
@@ -1,44 +1,11 @@
-"""Description: Functions for exploring the optimal array size for the bloom filter as well as
-number of hash functions. Class for BloomFilter object.
+"""Description: Functions for choosing the optimal array size for the bloom filter as well as
+number of hash functions (the plots for exploring them are in plotting.py). Class for BloomFilter object.
 """
 import numpy as np
-import matplotlib.pyplot as plt
 import math
+import hashlib
 # Portion of search module...
 
-# EXPLORE
-# 1. evaluate the appropriate array size and number of hash functions
-''' Plot a range of solutions for the equation to find the optimal array size, m
-Input: INTEGER n, number of items/sequences that are to be added to the bloom filter
-Output: plot showing relationship between false positive rate and array size
-'''
-def evaluate_m(n):
-    # get a range of p (false positive rate)
-    p_range = np.arange(1e-10, 1e-3, 1e-10)
-    # use the range of p to calculate possible solutions to the array size equation
-    m_range = (-(n * np.log(p_range))) / np.log(2)**2
-    plt.plot(m_range, p_range)
-    plt.title(label = "False Positive Rate v. Array size")
-    #plt.ylim([1e-10, 1e-3])
-    #plt.xlim(1, 1e6)
-    plt.ylabel("False Positive Rate")
-    plt.xlabel("Array size")
-    plt.savefig('FPR_array_size_plot.pdf')
-
-''' Plot a range of solutions for the equation to find the optimal number of hash functions, k
-Input: INTEGER n, number of items/sequences that are to be added to the bloom filter
-Output: plot showing relationship between array size and number of has functions
-'''
-def evaluate_k(n):
-    k_range = ((np.arange(1e6, 1e7, 5e5))/n) * np.log(2)
-    plt.plot((np.arange(1e6, 1e7, 5e5)), k_range)
-    plt.title(label = "Number of Hash Functions v. Array size")
-    #plt.ylim([1e-10, 1e-3])
-    #plt.xlim(1, 1e6)
-    plt.ylabel("Number of Hash Functions")
-    plt.xlabel("Array size")
-    plt.savefig('num_hash_array_size_plot.pdf')
-
 '''Get the optimal array size
 Input: INTEGER n, number of items/sequences that are to be added to the bloom filter;
         FLOAT p, false positive rate
@@ -58,45 +25,230 @@ def get_k(n, m):
     return k
 
 
+# HASHING
+# constants for the 64-bit finalizer of MurmurHash3, a stable hash that gives the same value in every process
+# (unlike the builtin hash(), which is salted per process for strings)
+_FMIX_C1 = np.uint64(0xff51afd7ed558ccd)
+_FMIX_C2 = np.uint64(0xc4ceb9fe1a85ec53)
+_SECOND_HASH_SALT = np.uint64(0x9e3779b97f4a7c15)
+
+''' Mix an array of 64-bit keys with the MurmurHash3 finalizer
+Input: NUMPY ARRAY keys (uint64); INT seed, value xor-ed into the keys before mixing
+Output: NUMPY ARRAY (uint64) of hash values, one per key
+'''
+def hash64(keys, seed=0):
+    h = np.asarray(keys, dtype=np.uint64) ^ np.uint64(seed)
+    h = h ^ (h >> np.uint64(33))
+    h = h * _FMIX_C1 # uint64 array arithmetic wraps around, which is what the mixer expects
+    h = h ^ (h >> np.uint64(33))
+    h = h * _FMIX_C2
+    h = h ^ (h >> np.uint64(33))
+    return h
+
+''' Turn a string into a stable 64-bit key that can be passed to hash64
+Input: STRING seq
+Output: NUMPY ARRAY (uint64) holding a single key
+'''
+def string_key(seq):
+    digest = hashlib.blake2b(seq.encode(), digest_size=8).digest()
+    return np.frombuffer(digest, dtype=np.uint64)
+
+
+''' Number of uint64 words needed to hold a bit array
+Input: INT array_size, the number of bits
+Output: INT number of words
+'''
+def num_words(array_size):
+    return (array_size + 63) // 64
+
+''' Count the bits that are set in an array of uint64 words
+Input: NUMPY ARRAY words (uint64)
+Output: INTEGER number of 1 bits
+'''
+def popcount(words):
+    if hasattr(np, "bitwise_count"): # NumPy 2.0+
+        return int(np.bitwise_count(words).sum(dtype=np.int64))
+    return int(np.unpackbits(np.ascontiguousarray(words).view(np.uint8)).sum(dtype=np.int64))
+
+
 ''' Class for BloomFilter object
 '''
 class BloomFilter:
-    '''BloomFilter object has a size, number of hash functions, and an array
-    Input: INT array_size, the size of the array to use as filter; INT num_hash_functions, number of hash functions to use
+    '''BloomFilter object has a size, number of hash functions, and an array of bits packed into 64-bit words
+    Input: INT array_size, the number of bits to use as filter; INT num_hash_functions, number of hash functions to use;
+            INT seed, the hash seed (filters with the same size, number of hash functions and seed are interchangeable);
+            NUMPY ARRAY array (optional), existing uint64 words to use as the filter instead of allocating new ones
     Output: BloomFilter object
     '''
-    def __init__(self, array_size, num_hash_functions):
-        # intialize the array size and the number of hash functions for the new bl0om filter object
+    def __init__(self, array_size, num_hash_functions, seed=0, array=None):
+        # intialize the array size and the number of hash functions for the new bloom filter object
         self.array_size = array_size
         self.num_hash_functions = num_hash_functions
-        # and set all of the values in the array to False
-        self.array = np.zeros(self.array_size, dtype=bool)
-        # set the salt values, or seeds (value to be added to the sequence to create a pseudo family of hash functions)
+        self.seed = seed
+        # the bits are packed 64 to a word and all of them start out as 0 (an eighth of the memory of a bool array)
+        if array is None:
+            array = np.zeros(num_words(array_size), dtype=np.uint64)
+        self.array = array
         # bloom filters require that each sequence being added is hashed multiple times to prevent collision
-        # the salt value corresponds to each hash function in the "family" used to hash the sequence
-        self.salt_values = range(num_hash_functions)
+        # instead of a family of salted hash functions, two independent hashes h1 and h2 are combined as h1 + i*h2
+        # (Kirsch-Mitzenmacher double hashing), which keeps the false positive rate of k independent hashes
+        self._probe_steps = np.arange(num_hash_functions, dtype=np.uint64)
+
+    '''Hash function to get the array indices in the bloom filter for a set of keys. The probes of every key
+    are computed in one NumPy operation.
+    Input: NUMPY ARRAY keys (uint64)
+    Output: NUMPY ARRAY (uint64) of shape (len(keys), num_hash_functions), the array indices for each key
+    '''
+    def _hash(self, keys):
+        h1 = hash64(keys, self.seed)
+        h2 = hash64(keys, np.uint64(self.seed) ^ _SECOND_HASH_SALT) | np.uint64(1) # odd step so probes don't repeat
+        # use modulo so the value is not larger than the array
+        return (h1[:, None] + self._probe_steps[None, :] * h2[:, None]) % np.uint64(self.array_size)
 
-    '''Hash function to get array indices in the bloom filter for this specific sequence
-    Input: STRING seq, the sequence being hashed; INT seed, the hash function number
-    Output: INTEGER value, the array index
+    '''Set the bits at the given array indices to 1
+    Input: NUMPY ARRAY positions (uint64)
     '''
-    def _hash(self, seq, seed):
-        return (hash(seq) + seed) % self.array_size # use modulo so the value is not larger than the array
-    
+    def _set_bits(self, positions):
+        positions = positions.ravel()
+        words = (positions >> np.uint64(6)).astype(np.intp)
+        masks = np.uint64(1) << (positions & np.uint64(63))
+        np.bitwise_or.at(self.array, words, masks) # use .at so that repeated words are all applied
+
+    '''Look up the bits at the given array indices
+    Input: NUMPY ARRAY positions (uint64)
+    Output: NUMPY ARRAY (bool) of the same shape, True where the bit is set
+    '''
+    def _get_bits(self, positions):
+        words = self.array[(positions >> np.uint64(6)).astype(np.intp)]
+        return ((words >> (positions & np.uint64(63))) & np.uint64(1)).astype(bool)
+
     '''Function to add a sequence to the bloom filter by changing specific indices in the array from 0 to 1
     Input: STRING seq, the sequence being added
     '''
     def add(self, seq):
-        for hash_func in self.salt_values:
-            hash_result = self._hash(seq, hash_func) # hash the sequence being added
-            self.array[hash_result] = 1 # set the element at the hash_result - th index to 1 (the sequence has been added/"seen")
-            
+        self._set_bits(self._hash(string_key(seq)))
+
     '''Function to check if a sequence has been added to/seen by the bloom filter
     Input: STRING seq, the sequence of interest
+    Output: BOOL, False if the sequence definitely is not in the bloom filter and True if it (likely) is
     '''
     def check(self, seq):
-        for hash_func in self.salt_values:
-            hash_result = self._hash(seq, hash_func) # hash the sequence of interest
-            if self.array[hash_result] == 0: # check if the element at the hash_result - th index of the array is 0 
-                return False # if so, then we can stop and return False because the sequence definitely is not in the bloom filter
-        return True # if all of the elements are True then the sequence is (likely) in the bloom filter
+        # the sequence is (likely) in the bloom filter only if all of its bits are set
+        return bool(self._get_bits(self._hash(string_key(seq))).all())
+
+    '''Function to add a whole array of 2-bit encoded k-mers (see kmers.py) to the bloom filter at once
+    Input: NUMPY ARRAY kmers (uint64)
+    '''
+    def add_many(self, kmers):
+        self._set_bits(self._hash(kmers))
+
+    '''Function to check a whole array of 2-bit encoded k-mers (see kmers.py) against the bloom filter at once
+    Input: NUMPY ARRAY kmers (uint64)
+    Output: NUMPY ARRAY (bool), True for each k-mer that is (likely) in the bloom filter
+    '''
+    def check_many(self, kmers):
+        return self._get_bits(self._hash(kmers)).all(axis=1)
+
+    '''Fraction of the bits in the filter that are set to 1
+    Output: FLOAT fill ratio between 0 and 1
+    '''
+    def fill_ratio(self):
+        return popcount(self.array) / self.array_size
+
+    '''Expected false positive rate of the filter given how full it currently is
+    Output: FLOAT, the probability that an item that was never added is reported as present
+    '''
+    def estimated_false_positive_rate(self):
+        return self.fill_ratio() ** self.num_hash_functions
+
+
+''' Class for CountingBloomFilter object
+'''
+class CountingBloomFilter(BloomFilter):
+    '''CountingBloomFilter object keeps a 4-bit counter in place of each bit (two counters per byte), so items can be
+    removed again and the filter can tell roughly how many times an item was added. Counters stop at 15 and a counter
+    that has reached 15 is never decremented, since its true value is no longer known.
+    Input: INT array_size, the number of counters; INT num_hash_functions, number of hash functions to use; INT seed, the hash seed
+    Output: CountingBloomFilter object
+    '''
+    def __init__(self, array_size, num_hash_functions, seed=0):
+        super().__init__(array_size, num_hash_functions, seed, array=np.zeros((array_size + 1) // 2, dtype=np.uint8))
+
+    '''Read the counters at the given array indices
+    Input: NUMPY ARRAY positions (uint64)
+    Output: NUMPY ARRAY (uint8) of counts, same shape as positions
+    '''
+    def _get_counts(self, positions):
+        shifts = ((positions & np.uint64(1)) * np.uint64(4)).astype(np.uint8)
+        return (self.array[(positions >> np.uint64(1)).astype(np.intp)] >> shifts) & np.uint8(15)
+
+    '''Write the counters at the given (distinct) array indices
+    Input: NUMPY ARRAY positions (uint64, distinct); NUMPY ARRAY values (uint8, at most 15)
+    '''
+    def _write_counts(self, positions, values):
+        # the two counters sharing a byte are written separately, so that no byte is assigned twice in one go
+        for odd in (0, 1):
+            selected = (positions & np.uint64(1)) == odd
+            indices = (positions[selected] >> np.uint64(1)).astype(np.intp)
+            shift = np.uint8(4 * odd)
+            kept = self.array[indices] & ~np.uint8(15 << (4 * odd))
+            self.array[indices] = kept | (values[selected].astype(np.uint8) << shift)
+
+    '''Increment the counters at the given array indices (once per occurrence)
+    Input: NUMPY ARRAY positions (uint64)
+    '''
+    def _set_bits(self, positions):
+        positions, increments = np.unique(positions.ravel(), return_counts=True)
+        self.add_to_counters(positions, increments)
+
+    '''Add to the counters at the given array indices, for example the summed probes of k-mers that were hashed and
+    counted in another process
+    Input: NUMPY ARRAY positions (uint64, distinct); NUMPY ARRAY increments, how much to add to each counter
+    '''
+    def add_to_counters(self, positions, increments):
+        counts = self._get_counts(positions).astype(np.int64)
+        self._write_counts(positions, np.minimum(counts + increments, 15))
+
+    '''Look up whether the counters at the given array indices are non-zero
+    Input: NUMPY ARRAY positions (uint64)
+    Output: NUMPY ARRAY (bool) of the same shape
+    '''
+    def _get_bits(self, positions):
+        return self._get_counts(positions) > 0
+
+    '''Function to remove an array of 2-bit encoded k-mers that were added before
+    Input: NUMPY ARRAY kmers (uint64)
+    '''
+    def remove_many(self, kmers):
+        positions, decrements = np.unique(self._hash(kmers).ravel(), return_counts=True)
+        counts = self._get_counts(positions).astype(np.int64)
+        # saturated counters stay saturated
+        self._write_counts(positions, np.where(counts == 15, 15, np.maximum(counts - decrements, 0)))
+
+    '''Function to remove a sequence that was added before
+    Input: STRING seq
+    '''
+    def remove(self, seq):
+        self.remove_many(string_key(seq))
+
+    '''Estimate how many times each k-mer was added (the smallest of its counters, which can only overestimate)
+    Input: NUMPY ARRAY kmers (uint64)
+    Output: NUMPY ARRAY (uint8) of counts, at most 15
+    '''
+    def count_many(self, kmers):
+        return self._get_counts(self._hash(kmers)).min(axis=1)
+
+    '''Function to check a whole array of 2-bit encoded k-mers against the filter, optionally requiring an abundance
+    Input: NUMPY ARRAY kmers (uint64); INT min_count, how many times a k-mer must have been added to be reported
+    Output: NUMPY ARRAY (bool), True for each k-mer that was (likely) added at least min_count times
+    '''
+    def check_many(self, kmers, min_count=1):
+        return self.count_many(kmers) >= min_count
+
+    '''Fraction of the counters that are non-zero
+    Output: FLOAT fill ratio between 0 and 1
+    '''
+    def fill_ratio(self):
+        low = np.count_nonzero(self.array & np.uint8(15))
+        high = np.count_nonzero(self.array >> np.uint8(4))
+        return (low + high) / self.array_size
@@ -1,95 +1,426 @@
 """Description: Class for BloomFilterSearchTree object.
 """
-import numpy as np
-import matplotlib.pyplot as plt
 import math
-import bisect
+import numpy as np
 from bloom_filter import * # import functions from bloom_filter.py
+from kmers import kmer_array # import the k-mer encoding from kmers.py
+import instrumentation # import the counters from instrumentation.py
+
+# number of query k-mers looked up at a time when a node is scored, between checks of whether the threshold is decided
+SCORE_CHUNK = 256
+
+# default number of reads binned together into one leaf filter
+DEFAULT_READS_PER_LEAF = 32
+
+
+''' Round an array size up so that it can be halved (folded) several times and still be a whole number of 64-bit words.
+The size becomes c * 2^s with c between 32 and 64, which is at most 1/32 more bits than asked for.
+Input: INT array_size
+Output: INT the rounded array size
+'''
+def foldable_size(array_size):
+    unit = max(64, 1 << max(0, int(array_size).bit_length() - 6))
+    return -(-int(array_size) // unit) * unit
+
+''' Change the size of a filter to another size of the same tree (the tree's array size halved some number of times).
+A key's probe positions in a smaller filter are its positions in the larger one modulo the smaller size, so a filter is
+made smaller by OR-ing its equal parts together (folding) and larger by repeating it; either way the new filter holds
+every key the old one did, with more false positives.
+Input: NUMPY ARRAY words (uint64), the filter; INT array_size, its size; INT size, the new size
+Output: NUMPY ARRAY (uint64) of the new filter's words
+'''
+def resize_filter(words, array_size, size):
+    if size < array_size:
+        return np.bitwise_or.reduce(words.reshape(array_size // size, size // 64), axis=0)
+    if size > array_size:
+        return np.tile(words, size // array_size)
+    return words.copy()
+
 
-"""Description: Class for BloomFilterSearchTree object which is an collection of BloomFilter objects.
-Having a bloom filters arranged into a tree cuts down in the search time as it will return False right
-away if a sequence has not been added. It continues traversing the tree in search of the node containing
-the sequence if the sequence has been added (with some level of false positivity).
+"""Description: Class for BloomFilterSearchTree object, a Sequence Bloom Tree (Solomon & Kingsford, 2016).
+Each leaf is a bloom filter holding the k-mers of a bin of reads_per_leaf reads and each internal node holds the
+union of the filters below it. Searching starts at the root and skips every subtree whose filter doesn't hold enough of
+the query's k-mers, so only the branches that can contain a match are visited.
+Only the root has the full array size (chosen for every k-mer of the read set). Every other filter is the full filter
+folded in half some number of times (see resize_filter): a leaf is sized for its own k-mers, and an internal node for
+its depth, since each level down holds about half as many k-mers. The probe positions of a query are computed once
+for the full size and reduced modulo each node's size, and the filters are packed one after another into one uint64
+array, so the memory is about the array size times the depth of the tree instead of times the number of reads.
 """
 class BloomFilterSearchTree:
     """Initialize the bloom filter tree object.
-    Input: INT k, the k-mer length; INT array_size, the size of the array to be used as a bloom filter;
-            INT num_hash_functions, the number of hash functions to use for the bloom filters
+    Input: INT k, the k-mer length; INT array_size, the size of the root's bloom filter (rounded up with foldable_size);
+            INT num_hash_functions, the number of hash functions to use for the bloom filters;
+            INT reads_per_leaf, the number of reads binned together into one leaf filter; INT seed, the hash seed;
+            INT min_kmer_count, k-mers seen in the reads fewer times than this are treated as absent (likely errors);
+            BOOL canonical, whether to store each k-mer as the smaller of itself and its reverse complement, so that a
+            query is found whichever strand it (or the read holding it) was sequenced from
     Output: BloomFilterSearchTree object"""
-    def __init__(self, k, array_size, num_hash_functions):
+    def __init__(self, k, array_size, num_hash_functions, reads_per_leaf=DEFAULT_READS_PER_LEAF, seed=0,
+                 min_kmer_count=1, canonical=False):
         self.k = k
-        self.array_size = array_size
+        self.canonical = canonical
+        self.array_size = foldable_size(array_size)
         self.num_hash_functions = num_hash_functions
-        # dictionary to hold the bloom filters where each key is a node in the tree representing a sequence
-        # and its value is the corresponding bloom filter for all of the k-mers of that sequence
-        self.bloom_filter_search_tree = {} 
-    
+        self.reads_per_leaf = reads_per_leaf
+        self.seed = seed
+        # the words of every node's filter, one after another; grown by doubling as nodes are added
+        self.filters = np.zeros(4 * num_words(self.array_size), dtype=np.uint64)
+        self.words_used = 0
+        self.num_nodes = 0
+        # tree structure, indexed by node number (-1 when there is no such node)
+        self.left = []
+        self.right = []
+        self.parent = []
+        # where each node's words start in self.filters, and the size of its filter in bits
+        self.offsets = []
+        self.sizes = []
+        self.root = -1
+        # the read IDs held by each leaf node
+        self.leaf_reads = {}
+        # the number of reads in the leaves (a bin's reads are counted once it becomes a leaf)
+        self.num_reads = 0
+        # the k-mers and IDs of the reads in the bin that is still being filled
+        self._bin_kmers = []
+        self._bin_reads = []
+        # hashes k-mers to their probe positions in the full-size filter
+        self._hasher = BloomFilter(self.array_size, num_hash_functions, seed, array=np.zeros(0, dtype=np.uint64))
+        # how many times each k-mer was seen, counted while the reads are added so that error k-mers can be
+        # left out of the search without a second pass over the reads
+        self.min_kmer_count = min_kmer_count
+        self.abundance = CountingBloomFilter(self.array_size, num_hash_functions, seed) if min_kmer_count > 1 else None
+
+    """Get the bloom filter of a node. The filter shares its array with the tree.
+    Input: INT node, the node number
+    Output: BloomFilter object"""
+    def node_filter(self, node):
+        offset = self.offsets[node]
+        return BloomFilter(self.sizes[node], self.num_hash_functions, self.seed,
+                           array=self.filters[offset:offset + num_words(self.sizes[node])])
+
+    """Reduce probe positions in the full-size filter to the positions in a node's filter
+    Input: INT node; NUMPY ARRAY positions (uint64), from the full-size filter;
+            DICT reduced (optional), the positions already reduced to each size, which is filled in as they are needed
+            (many nodes share a size, so a search or an insertion only has to reduce the positions once for each)
+    Output: NUMPY ARRAY (uint64) positions in the node's filter"""
+    def _node_positions(self, node, positions, reduced=None):
+        size = self.sizes[node]
+        if size == self.array_size:
+            return positions
+        if reduced is None:
+            return positions % np.uint64(size)
+        if size not in reduced:
+            reduced[size] = positions % np.uint64(size)
+        return reduced[size]
+
+    """Check if a node is a leaf
+    Input: INT node, the node number
+    Output: BOOL"""
+    def is_leaf(self, node):
+        return self.left[node] == -1
+
     """Function to generate all of the k-mers for a given sequence. Each of these k-mers will then be added to a bloom filter
     for the sequence.
-    Input: STRING seq, the sequence being added to the bloom filter tree
-    Ouput: LIST kmers, a list of the possible kmers for the given sequence"""
-    def _get_kmers(self, seq):
-        kmers = []
-        for i in range(len(seq) - self.k +1):
-            kmers.append(seq[i:i+self.k])
-        return kmers
-
-    """Function to add a bloom filter to the tree. This is done by creating a bloom filter for the input sequence
-    to which each of its kmers are added. The given sequence becomes a node and is stored as a key in the 
-    BloomFilterSearchTree object's dictionary, and the bloom filter is the corresponding value.
-    Input: STRING seq, sequence being added"""
-    def add(self, seq):
-        # first get the kmers for the sequence
-        seq_kmers = self._get_kmers(seq)
-        # then define the overlap we want between the kmers
-        # one way is to have the overlap be the length of the sequence - k
-        #overlap = len(seq) - self.k
-
-        # construct nodes by overlapping the sequence kmers
-        # pre/suffix overlap the kmer by one base to aid in the construction of the de bruijn graph
-        for i in range(len(seq_kmers)):
-            #prefix = seq[:i] 
-            #suffix = seq[i + self.k:] 
-            #node = prefix + suffix # concatenate to create a node
-            
-            node = seq_kmers[i]
-            #print(node)
-            if node not in self.bloom_filter_search_tree: 
-                self.bloom_filter_search_tree[node] = BloomFilter(self.array_size, self.num_hash_functions)
-            self.bloom_filter_search_tree[node].add(seq_kmers[i])
-
-    """Function to check if a sequence is in the bloom filter search tree
-    Input: STRING query, the sequence of interest/query
+    Input: STRING seq, the sequence being added to the bloom filter tree;
+            BOOL return_positions, whether to also return where each k-mer starts in the sequence
+    Ouput: NUMPY ARRAY kmers, the 2-bit encoded kmers of the given sequence (see kmers.py)"""
+    def _get_kmers(self, seq, return_positions=False):
+        return kmer_array(seq, self.k, self.canonical, return_positions)
+
+    """Allocate a new, empty node
+    Input: INT size, the size of the node's filter (the array size halved some number of times)
+    Output: INT node, the node number"""
+    def _new_node(self, size):
+        words = num_words(size)
+        if self.words_used + words > len(self.filters):
+            grown = np.zeros(max(2 * len(self.filters), self.words_used + words), dtype=np.uint64)
+            grown[:self.words_used] = self.filters[:self.words_used]
+            self.filters = grown
+        node = self.num_nodes
+        self.num_nodes += 1
+        self.left.append(-1)
+        self.right.append(-1)
+        self.parent.append(-1)
+        self.offsets.append(self.words_used)
+        self.sizes.append(size)
+        self.words_used += words
+        return node
+
+    """The smallest size (the array size halved as many times as it can be) that is at least a given number of bits
+    Input: FLOAT bits
+    Output: INT size"""
+    def _fold_size(self, bits):
+        size = self.array_size
+        while size % 128 == 0 and size // 2 >= bits:
+            size //= 2
+        return size
+
+    """Size of a leaf filter: as many bits per k-mer as the full-size filter has when it is optimal for its number of
+    hash functions (m / n = num_hash_functions / ln 2), so a leaf has about the same false positive rate as the root
+    Input: INT num_kmers, the number of distinct k-mers in the leaf
+    Output: INT size"""
+    def _leaf_size(self, num_kmers):
+        return self._fold_size(num_kmers * self.num_hash_functions / math.log(2))
+
+    """Estimate how many distinct k-mers a node holds from the fraction of its bits that are set
+    Input: INT node
+    Output: FLOAT estimate"""
+    def _estimated_kmers(self, node):
+        size = self.sizes[node]
+        empty = 1 - popcount(self.node_filter(node).array) / size
+        if empty <= 0:
+            return float(size)
+        return -size / self.num_hash_functions * math.log(empty)
+
+    """Number of internal nodes above a node
+    Input: INT node
+    Output: INT depth"""
+    def _depth(self, node):
+        depth = 0
+        while self.parent[node] != -1:
+            node = self.parent[node]
+            depth += 1
+        return depth
+
+    """Insert a leaf into the tree. Starting at the root, the leaf's filter is OR-ed into every node on the way down,
+    always moving to the child whose filter is most similar (fewest differing bits) to the leaf. When a leaf is reached
+    it is replaced by a new internal node that has the old leaf and the new leaf as its children.
+    Input: INT leaf, the node number of the new leaf; NUMPY ARRAY bits, the uint64 words of the leaf's k-mers in a
+            full-size filter"""
+    def _insert_leaf(self, leaf, bits):
+        if self.root == -1:
+            self.root = leaf
+            return
+        # the leaf's filter folded to each size it is needed at
+        folded = {self.array_size: bits}
+        def fold(size):
+            if size not in folded:
+                folded[size] = resize_filter(bits, self.array_size, size)
+            return folded[size]
+        node = self.root
+        while not self.is_leaf(node):
+            self.node_filter(node).array[:] |= fold(self.sizes[node])
+            left, right = self.left[node], self.right[node]
+            left_distance = popcount(self.node_filter(left).array ^ fold(self.sizes[left]))
+            right_distance = popcount(self.node_filter(right).array ^ fold(self.sizes[right]))
+            node = left if left_distance <= right_distance else right
+        # split the leaf that was reached into an internal node with two children
+        parent = self.parent[node]
+        if parent == -1:
+            # the only leaf so far was the root, which is kept at full size: the new internal node takes over its
+            # filter, and the leaf is folded down to the size of its own k-mers
+            size = self._leaf_size(self._estimated_kmers(node))
+            node_bits = resize_filter(self.node_filter(node).array, self.array_size, size)
+            internal = self._new_node(size)
+            self.offsets[internal], self.offsets[node] = self.offsets[node], self.offsets[internal]
+            self.sizes[internal], self.sizes[node] = self.array_size, size
+            self.node_filter(node).array[:] = node_bits
+        else:
+            # the old leaf's k-mers are only kept at the leaf's size, but they are all in both the parent and the
+            # leaf, so the bits set in both (at the new node's size) hold them, with a few false positives
+            size = max(self._fold_size(self.array_size >> self._depth(node)), self.sizes[node], self.sizes[leaf])
+            node_bits = (resize_filter(self.node_filter(parent).array, self.sizes[parent], size) &
+                         resize_filter(self.node_filter(node).array, self.sizes[node], size))
+            internal = self._new_node(size)
+            self.node_filter(internal).array[:] = node_bits
+        self.node_filter(internal).array[:] |= fold(self.sizes[internal])
+        grandparent = self.parent[node]
+        self.parent[internal] = grandparent
+        if grandparent == -1:
+            self.root = internal
+        elif self.left[grandparent] == node:
+            self.left[grandparent] = internal
+        else:
+            self.right[grandparent] = internal
+        self.left[internal], self.right[internal] = node, leaf
+        self.parent[node] = self.parent[leaf] = internal
+
+    """Function to add a read to the tree. Its k-mers go into the bin that is being filled, which becomes a leaf once it
+    holds reads_per_leaf reads (or when the tree is searched, see flush).
+    Input: STRING seq, sequence being added; read_id (optional), the ID reported for this read by query()"""
+    def add(self, seq, read_id=None):
+        if read_id is None:
+            read_id = self.num_reads + len(self._bin_reads)
+        kmers = self._get_kmers(seq)
+        instrumentation.count("kmers_inserted", len(kmers))
+        if self.abundance is not None:
+            self.abundance.add_many(kmers)
+        self._bin_kmers.append(kmers)
+        self._bin_reads.append(read_id)
+        if len(self._bin_reads) >= self.reads_per_leaf:
+            self.flush()
+
+    """Insert the bin that is being filled as a leaf, sized for its distinct k-mers, so that every read added so far can be
+    searched for (the searches call this themselves)"""
+    def flush(self):
+        if not self._bin_reads:
+            return
+        # the distinct k-mers of the bin (sorted by hand, which is much faster than np.unique's hash table)
+        kmers = np.sort(np.concatenate(self._bin_kmers))
+        distinct = np.ones(len(kmers), dtype=bool)
+        distinct[1:] = kmers[1:] != kmers[:-1]
+        read_ids = self._bin_reads
+        self._bin_kmers = []
+        self._bin_reads = []
+        self.add_leaf(kmers[distinct], read_ids)
+
+    """Add a leaf whose k-mers have already been collected (for example by another process) to the tree
+    Input: NUMPY ARRAY kmers (uint64), the distinct k-mers of the leaf's reads; LIST read_ids, the IDs of the reads"""
+    def add_leaf(self, kmers, read_ids):
+        bits = np.zeros(num_words(self.array_size), dtype=np.uint64)
+        BloomFilter(self.array_size, self.num_hash_functions, self.seed, array=bits).add_many(kmers)
+        self.add_leaf_filter(bits, len(kmers), read_ids)
+
+    """Add a leaf whose k-mers have already been hashed (for example by another process) to the tree
+    Input: NUMPY ARRAY bits, the uint64 words of the leaf's k-mers in a full-size filter (with this tree's seed and
+            number of hash functions); INT num_kmers, the number of distinct k-mers in it; LIST read_ids, the IDs of
+            the reads"""
+    def add_leaf_filter(self, bits, num_kmers, read_ids):
+        # the first leaf is the root, which always has the full size
+        leaf = self._new_node(self.array_size if self.root == -1 else self._leaf_size(num_kmers))
+        self.node_filter(leaf).array[:] = resize_filter(bits, self.array_size, self.sizes[leaf])
+        self.leaf_reads[leaf] = list(read_ids)
+        self.num_reads += len(read_ids)
+        self._insert_leaf(leaf, bits)
+
+    """Function to check if a sequence is in the bloom filter search tree, i.e. whether (enough of) its k-mers are found
+    in the reads
+    Input: STRING query, the sequence of interest/query; FLOAT theta, the fraction of the query's k-mers that have
+            to be found, so that a query with a SNP or a sequencing error can still be reported (1.0 needs all of them)
     Output: BOOL eval, True if the sequence is (likely) in the tree and False if it is not """
-    def check(self, query):
+    def check(self, query, theta=1.0):
+        self.flush()
         query_kmers = self._get_kmers(query)
-        #print(query_kmers)
-        #print(query)
-        for i in range(len(query_kmers)):
-            #prefix = query[:i] 
-            #suffix = query[i + self.k:] 
-            #prefix = query[i + self.k:]
-            #suffix = query[:i]  
-            #if i == 0:
-            #    prefix = ""
-            #else:
-            #    prefix = query_kmers[i-1][-1]
-            #if i == (len(query_kmers) - 1):
-            #    suffix = ""
-            #else:
-            #    suffix = query_kmers[i+1][0]
-            #print(prefix)
-            #print(suffix)
-            #node = prefix + query_kmers[i] + suffix
-            node = query_kmers[i]
-            #print(node)
-            #print("/n")
-            if node not in self.bloom_filter_search_tree:
-                return False
-            if self.bloom_filter_search_tree[node].check(query_kmers[i]) == False:
-            #if node not in self.bloom_filter_search_tree and (self.bloom_filter_search_tree[node].check(query_kmers[i]) == False):
-                return False
-            #else:
-                #continue
-        return True
-            
+        if self.root == -1 or len(query_kmers) == 0:
+            return False
+        # the root is the union of every read, so this is the same as asking the whole read set
+        positions = self._hasher._hash(query_kmers)
+        needed = theta * len(query_kmers)
+        return self._count_found(self.root, positions, self._solid(query_kmers), needed) >= needed
+
+    """Check a batch of sequences at once: the k-mers of every query are hashed and looked up in the root filter together,
+    which is much faster than calling check() once per query when the queries are short
+    Input: LIST queries, the query sequences; FLOAT theta, the fraction of each query's k-mers that have to be found
+    Output: LIST of BOOL, the result of check() for each query"""
+    def check_batch(self, queries, theta=1.0):
+        self.flush()
+        query_kmers = [self._get_kmers(query) for query in queries]
+        lengths = np.array([len(kmers) for kmers in query_kmers], dtype=np.int64)
+        if self.root == -1 or lengths.sum() == 0:
+            return [False] * len(queries)
+        kmers = np.concatenate(query_kmers)
+        found = self.node_filter(self.root).check_many(kmers) & self._solid(kmers)
+        # number of k-mers found for each query
+        counts = np.bincount(np.repeat(np.arange(len(queries)), lengths), weights=found, minlength=len(queries))
+        return ((lengths > 0) & (counts >= theta * lengths)).tolist()
+
+    """Score a sequence against the whole read set: the fraction of its k-mers found and, optionally, the fraction of
+    its bases covered by at least one k-mer that was found (which tells a single mismatch, which loses up to k k-mers
+    but leaves most bases covered, from a query that only half matches)
+    Input: STRING query; BOOL positional, whether to also return the positional coverage
+    Output: FLOAT fraction of k-mers found (and FLOAT fraction of bases covered, if positional is True)"""
+    def score(self, query, positional=False):
+        self.flush()
+        query_kmers, starts = self._get_kmers(query, return_positions=True)
+        if self.root == -1 or len(query_kmers) == 0:
+            return (0.0, 0.0) if positional else 0.0
+        found = self.node_filter(self.root).check_many(query_kmers) & self._solid(query_kmers)
+        if positional:
+            return float(found.mean()), self._coverage(found, starts, len(query))
+        return float(found.mean())
+
+    """Fraction of a query's bases covered by the k-mers that were found
+    Input: NUMPY ARRAY found (bool), for each k-mer; NUMPY ARRAY starts, where each k-mer starts; INT length of the query
+    Output: FLOAT coverage"""
+    def _coverage(self, found, starts, length):
+        # +1 where a found k-mer starts and -1 where it ends; a base is covered where the running sum is positive
+        depth = np.zeros(length + 1, dtype=np.int64)
+        np.add.at(depth, starts[found], 1)
+        np.add.at(depth, starts[found] + self.k, -1)
+        return float((np.cumsum(depth[:length]) > 0).mean())
+
+    """Count how many of a query's k-mers are in a node's filter. The k-mers are looked up in chunks, and the count
+    stops as soon as the threshold is either reached or out of reach, unless the exact count is wanted.
+    Input: INT node; NUMPY ARRAY positions, the query's probe positions in the full-size filter; NUMPY ARRAY solid (bool), which k-mers count;
+            FLOAT needed, the number of k-mers that have to be found; BOOL exact, whether to count every k-mer;
+            DICT reduced (optional), see _node_positions
+    Output: INT found, the number of k-mers found (once the count stops early, only whether it reaches needed is exact)"""
+    def _count_found(self, node, positions, solid, needed, exact=False, reduced=None):
+        node_filter = self.node_filter(node)
+        positions = self._node_positions(node, positions, reduced)
+        found = 0
+        for start in range(0, len(positions), SCORE_CHUNK):
+            end = min(start + SCORE_CHUNK, len(positions))
+            found += int((node_filter._get_bits(positions[start:end]).all(axis=1) & solid[start:end]).sum())
+            if found + len(positions) - end < needed:
+                break # the threshold can't be reached with the k-mers that are left
+            if found >= needed and not exact:
+                break
+        return found
+
+    """Find which k-mers were seen at least min_kmer_count times in the reads
+    Input: NUMPY ARRAY kmers (uint64)
+    Output: NUMPY ARRAY (bool), True for each k-mer that is abundant enough to be searched for"""
+    def _solid(self, kmers):
+        if self.abundance is None:
+            return np.ones(len(kmers), dtype=bool)
+        return self.abundance.check_many(kmers, self.min_kmer_count)
+
+    """Function to find the reads that contain a query sequence. A subtree is only searched if its node has at least
+    a fraction theta of the query's k-mers, since none of the reads below it can have more.
+    Input: STRING seq, the query sequence; FLOAT theta, the fraction of query k-mers a read has to contain
+    Output: LIST read_ids, the IDs of the reads (in the matching leaves) that (likely) contain the query"""
+    def query(self, seq, theta=1.0):
+        self.flush()
+        query_kmers = self._get_kmers(seq)
+        if self.root == -1 or len(query_kmers) == 0:
+            return []
+        # the probe positions are computed once for the full-size filter and reduced to each node's size
+        positions = self._hasher._hash(query_kmers)
+        solid = self._solid(query_kmers)
+        needed = theta * len(query_kmers)
+        reduced = {}
+        matches = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if self._count_found(node, positions, solid, needed, reduced=reduced) < needed:
+                continue # prune the subtree
+            if self.is_leaf(node):
+                matches.extend(self.leaf_reads[node])
+            else:
+                stack.append(self.right[node])
+                stack.append(self.left[node])
+        return matches
+
+    """Find the reads that contain at least a fraction theta of a query's k-mers, with the score of each. Subtrees are
+    pruned as in query(), and only the leaves that pass are scored exactly.
+    Input: STRING seq, the query sequence; FLOAT theta, the fraction of query k-mers a read has to contain;
+            BOOL positional, whether to also report the fraction of the query's bases covered by the read's k-mers
+    Output: LIST of (read ID, FLOAT fraction of k-mers found) tuples, best first
+            (or (read ID, FLOAT fraction, FLOAT coverage) tuples, if positional is True)"""
+    def scored_query(self, seq, theta=0.8, positional=False):
+        self.flush()
+        query_kmers, starts = self._get_kmers(seq, return_positions=True)
+        if self.root == -1 or len(query_kmers) == 0:
+            return []
+        positions = self._hasher._hash(query_kmers)
+        solid = self._solid(query_kmers)
+        needed = theta * len(query_kmers)
+        reduced = {}
+        matches = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if not self.is_leaf(node):
+                if self._count_found(node, positions, solid, needed, reduced=reduced) >= needed:
+                    stack.append(self.right[node])
+                    stack.append(self.left[node])
+                continue
+            found = self.node_filter(node)._get_bits(self._node_positions(node, positions, reduced)).all(axis=1) & solid
+            if found.sum() < needed:
+                continue
+            score = (float(found.mean()), self._coverage(found, starts, len(seq))) if positional else (float(found.mean()),)
+            matches.extend((read_ID,) + score for read_ID in self.leaf_reads[node])
+        matches.sort(key=lambda match: -match[1])
+        return matches
@@ -2,107 +2,622 @@
 contig containing the query sequence.
 NOTE: this class is only used when a query sequece is determined to be in the Bloom Filter Search Tree is found."""
 
-from collections import defaultdict # this method is used to define the type for the values in the dictionaries used
+import numpy as np
+from kmers import * # 2-bit k-mer encoding from kmers.py
+from kmer_counter import KmerCounter # k-mer counting table from kmer_counter.py
+import instrumentation # stage timers and counters from instrumentation.py
+from extension_cache import ExtensionCache, DEFAULT_MAX_BYTES # the walk cache from extension_cache.py
+
+# number of bits set in each 4-bit edge mask
+_MASK_DEGREE = np.array([bin(mask).count("1") for mask in range(16)], dtype=np.uint8)
+# the base of each single-bit edge mask
+_MASK_BASE = {1: 0, 2: 1, 4: 2, 8: 3}
+# the same, as a list indexed by mask (-1 when the mask doesn't have exactly one bit set)
+_MASK_BASE_LIST = [_MASK_BASE.get(mask, -1) for mask in range(16)]
+# each edge mask with its bases complemented (bit b moved to bit 3 - b), for reading a node on the other strand
+_MASK_COMPLEMENT = [int(format(mask, "04b")[::-1], 2) for mask in range(16)]
 
 class DeBruijnGraph:
     """Initialize the de Bruijn Graph object.
     Input: DICT reads, dictionary of sequencing reads for which the key is the sequence ID and the value is the
-    sequence string; INT k, length of the k-mers
+    sequence string (or any iterable of sequences, such as the encoded batches from reading_input.read_batches,
+    so that the reads don't have to be held in memory); INT k, length of the k-mers; INT min_count, k-mers seen fewer times than this are
+    dropped as (likely) sequencing errors; KmerCounter kmer_table (optional), k-mers that have already been counted,
+    in which case reads is not used; BOOL canonical, whether a k-mer and its reverse complement are the same edge, so
+    that reads from both strands build one graph (the k-mer table then holds canonical k-mers); INT cache_bytes, the
+    memory budget of the cache of extensions walked by get_longest_contig (0 turns the cache off); INT kmer_capacity, the
+    number of distinct k-mers to allocate the k-mer table for up front (such as an estimate from hyperloglog.py)
     Output:
     """
-    def __init__(self, reads, k):
+    def __init__(self, reads, k, min_count=1, kmer_table=None, canonical=False, cache_bytes=DEFAULT_MAX_BYTES,
+                 kmer_capacity=0):
         self.k = k
+        self.canonical = canonical
+        # the extensions walked so far (see extension_cache.py)
+        self.extension_cache = ExtensionCache(cache_bytes) if cache_bytes else None
         # build the k-mer table that will be used to construct the graph
-        self.kmer_table = self._build_kmer_table(self.k, reads)
+        if kmer_table is None:
+            with instrumentation.stage("kmer_table"):
+                kmer_table = self._build_kmer_table(self.k, reads, kmer_capacity)
+        self.kmer_table = kmer_table
+        self.min_count = min_count
+        if min_count > 1:
+            self.kmer_table.apply_threshold(min_count)
         # construct the graph
-        self.graph = self._construct_debruijn_graph(self.kmer_table)
+        with instrumentation.stage("graph_construction"):
+            self.nodes, self.edges = self._construct_debruijn_graph(self.kmer_table)
+        if instrumentation.enabled():
+            instrumentation.gauge("graph_nodes", len(self.nodes))
+            instrumentation.gauge("graph_edges", int(_MASK_DEGREE[self.edges & 15].sum()))
+        # unitigs and the k-mer -> (unitig, offset) index, filled in by compact()
+        self.clear_unitigs()
+
 
-    
     """Build a k-mer table. All of the possible k-mers are configured for each sequencing read
-    and its frequency is recorded. 
-    Input: INT k, length of the k-mers; DICT reads, dictionary of sequenceing reads where the key is the 
-    sequence ID and the value is a sequence string
-    Ouptut: DICT kmer_table, dictionary where each key is a kmer and the value is a count for that k-mer"""
-    def _build_kmer_table(self, k, reads):
-        kmer_table = defaultdict(int)
-        for seq in reads.values():
-            for i in range(len(seq) - k+ 1):
-                kmer = seq[i:i+k]
-                kmer_table[kmer] +=1
+    and its frequency is recorded.
+    Input: INT k, length of the k-mers; DICT reads, dictionary of sequenceing reads where the key is the
+    sequence ID and the value is a sequence string (or an iterable of sequences); INT capacity, see KmerCounter
+    Ouptut: KmerCounter kmer_table, holding each distinct 2-bit encoded kmer and a count for that k-mer"""
+    def _build_kmer_table(self, k, reads, capacity=0):
+        kmer_table = KmerCounter(k, capacity=capacity)
+        sequences = reads.values() if isinstance(reads, dict) else reads
+        for kmers in iter_kmer_arrays(sequences, k, self.canonical):
+            kmer_table.add(kmers)
         return kmer_table
 
-    """Construct the de Bruijn Graph. Returned is a dictionary of k-1 mer prefixes (the keys) and
-    their corresponding suffixes (the values). Following the overlap when traversing the tree will help to
-    find the longest contig containing the query sequence in the get_longest_contig method below.
-    Input: DICT kmer_table, dictionary of k-mers from all of the sequencing reads
-    Output: DICT de_bruijn_graph, where the key is the prefix of a kmer and the value is a list of possible suffixes."""
+    """Construct the de Bruijn Graph. The nodes are the k-1 mer prefixes and suffixes of the k-mers, and every k-mer is
+    an edge from its prefix to its suffix. Since a node can only be followed (or preceded) by one of four bases, its
+    edges are stored as two 4-bit masks over A/C/G/T packed into one byte: the low bits for the outgoing edges and the
+    high bits for the incoming ones. That's 9 bytes per node, and the degrees can be read straight off the masks.
+    In canonical mode a node is stored once, as the smaller of the k-1 mer and its reverse complement, and its masks
+    describe the edges of that strand: an edge that leaves the other strand enters this one with the complement base.
+    Input: KmerCounter kmer_table, the 2-bit encoded k-mers from all of the sequencing reads
+    Output: NUMPY ARRAY nodes, the sorted, distinct 2-bit encoded k-1 mers (uint64);
+    NUMPY ARRAY edges, the edge masks of each node (uint8)"""
     def _construct_debruijn_graph(self, kmer_table):
-        de_bruijn_graph = {}
-        for kmer in kmer_table:
-            prefix = kmer[:-1]
-            suffix = kmer[1:]
-            if prefix not in de_bruijn_graph:
-                #de_bruijn_graph[prefix][suffix] = count
-                de_bruijn_graph[prefix] = [suffix]
-            else:
-                de_bruijn_graph[prefix].append(suffix)
-        return de_bruijn_graph
+        edge_nodes, bits = self._edge_bits(kmer_table.kmers)
+        nodes = np.unique(edge_nodes)
+        edges = np.zeros(len(nodes), dtype=np.uint8)
+        np.bitwise_or.at(edges, np.searchsorted(nodes, edge_nodes), bits)
+        return nodes, edges
 
-    """Construct the longest contig that contains the query sequence
-    Input:
-    Output:"""
-    def get_longest_contig(self, query_seq):
-        # start with the first k-mer of the query
-        first_kmer = query_seq[:self.k]
-        #print(first_kmer)
-        # then split into left and right
-        left_kmer = first_kmer[:-1]
-        right_kmer = first_kmer[1:]
-        #print(left_kmer)
-        #print(right_kmer)
-        # start at the left k-mer
-        # keep track of the nodes visited and th edges between them
-        contig_nodes_left = []
-        #print(contig_nodes_left)
-        contig_edges = []
-        current_node = left_kmer
+    """Find the mask bits that a set of edges (k-mers) sets: the prefix gets an outgoing edge labelled with the k-mer's
+    last base and the suffix an incoming edge labelled with its first base, or in canonical mode the same on whichever
+    strand each node is stored on
+    Input: NUMPY ARRAY kmers (uint64)
+    Output: NUMPY ARRAY nodes (uint64), as stored in self.nodes, one per bit (a node can appear several times);
+    NUMPY ARRAY bits (uint8), the bit each of them gets"""
+    def _edge_bits(self, kmers):
+        suffix_mask = np.uint64((1 << (2 * (self.k - 1))) - 1)
+        prefixes = kmers >> np.uint64(2) # drop the last base
+        suffixes = kmers & suffix_mask # drop the first base
+        last_bases = (kmers & np.uint64(3)).astype(np.uint8)
+        first_bases = (kmers >> np.uint64(2 * (self.k - 1))).astype(np.uint8)
+        if not self.canonical:
+            return (np.concatenate((prefixes, suffixes)),
+                    np.concatenate((np.left_shift(1, last_bases), np.left_shift(16, first_bases))).astype(np.uint8))
+        rc_prefixes = reverse_complement_kmers(prefixes, self.k - 1)
+        rc_suffixes = reverse_complement_kmers(suffixes, self.k - 1)
+        # a k-1 mer that is its own reverse complement takes the edge on both strands, so both tests use <= / >=
+        forward_prefixes = prefixes <= rc_prefixes
+        reverse_prefixes = prefixes >= rc_prefixes
+        forward_suffixes = suffixes <= rc_suffixes
+        reverse_suffixes = suffixes >= rc_suffixes
+        nodes = np.concatenate((prefixes[forward_prefixes], rc_prefixes[reverse_prefixes],
+                                suffixes[forward_suffixes], rc_suffixes[reverse_suffixes]))
+        bits = np.concatenate((np.left_shift(1, last_bases[forward_prefixes]),
+                               np.left_shift(16, 3 - last_bases[reverse_prefixes]),
+                               np.left_shift(16, first_bases[forward_suffixes]),
+                               np.left_shift(1, 3 - first_bases[reverse_suffixes]))).astype(np.uint8)
+        return nodes, bits
+
+    """Add more reads to the graph without rebuilding it. Their k-mers are counted into the k-mer table, the k-mers that
+    reach min_count become new edges (adding nodes where needed), and if the graph has been compacted, only the unitigs
+    that pass through a node whose edges changed are walked again. The cached extensions are dropped. Tips and bubbles
+    that the new reads bring in are not simplified. (With min_count > 1, the counts of k-mers dropped when the graph
+    was built are lost, so those k-mers start again from zero.)
+    Input: DICT reads (or any iterable of sequences, as for the constructor)
+    Output: NUMPY ARRAY changed, the nodes (as stored in self.nodes, sorted) that were added or gained edges"""
+    def add_reads(self, reads):
+        with instrumentation.stage("graph_update"):
+            batch = self._build_kmer_table(self.k, reads)
+            kmers, counts = batch.kmers, batch.counts
+            before = self.kmer_table.count_many(kmers)
+            self.kmer_table.add_counts(kmers, counts)
+            new_edges = kmers[(before < self.min_count) & (before + counts >= self.min_count)]
+            edge_nodes, bits = self._edge_bits(new_edges)
+            changed = np.unique(edge_nodes)
+            # insert the nodes that aren't in the graph yet, keeping the node array sorted
+            positions = np.searchsorted(self.nodes, changed)
+            present = positions < len(self.nodes)
+            present[present] = self.nodes[positions[present]] == changed[present]
+            self.nodes = np.insert(self.nodes, positions[~present], changed[~present])
+            self.edges = np.insert(self.edges, positions[~present], np.uint8(0))
+            np.bitwise_or.at(self.edges, np.searchsorted(self.nodes, edge_nodes), bits)
+            if self.extension_cache is not None and len(changed):
+                self.extension_cache.clear()
+            if self.unitigs is not None and len(changed):
+                self._update_unitigs(changed)
+        instrumentation.count("graph_nodes_changed", len(changed))
+        return changed
+
+    """Find a node in the graph with a binary search
+    Input: INT node, a 2-bit encoded k-1 mer
+    Output: INT index of the node in self.nodes, or -1 if the node is not in the graph"""
+    def _node_index(self, node):
+        index = int(np.searchsorted(self.nodes, np.uint64(node)))
+        if index < len(self.nodes) and self.nodes[index] == node:
+            return index
+        return -1
+
+    """The form a k-1 mer is stored in: itself, or in canonical mode the smaller of it and its reverse complement
+    Input: INT node, a 2-bit encoded k-1 mer
+    Output: INT node as stored in self.nodes"""
+    def _canonical_node(self, node):
+        if self.canonical:
+            return min(node, reverse_complement_kmer(node, self.k - 1))
+        return node
+
+    """Find a node and read its edge masks on the strand the k-1 mer is given on
+    Input: INT node, a 2-bit encoded k-1 mer (on either strand in canonical mode)
+    Output: INT index of the node in self.nodes (-1 if it is not in the graph); INT out mask; INT in mask"""
+    def _oriented_masks(self, node):
+        stored = self._canonical_node(node)
+        index = self._node_index(stored)
+        if index < 0:
+            return -1, 0, 0
+        out_edges, in_edges = int(self.edges[index]) & 15, int(self.edges[index]) >> 4
+        if stored != node:
+            # on the other strand the edges swap direction and their bases are complemented
+            out_edges, in_edges = _MASK_COMPLEMENT[in_edges], _MASK_COMPLEMENT[out_edges]
+        return index, out_edges, in_edges
+
+    """Get the outgoing edge mask of a node (bit b is set if the node is followed by base b)
+    Input: INT node, a 2-bit encoded k-1 mer
+    Output: INT 4-bit mask, 0 if the node is not in the graph"""
+    def out_mask(self, node):
+        return self._oriented_masks(node)[1]
+
+    """Get the incoming edge mask of a node (bit b is set if the node is preceded by base b)
+    Input: INT node, a 2-bit encoded k-1 mer
+    Output: INT 4-bit mask, 0 if the node is not in the graph"""
+    def in_mask(self, node):
+        return self._oriented_masks(node)[2]
+
+    """Number of edges leaving a node
+    Input: INT node, a 2-bit encoded k-1 mer
+    Output: INT out-degree"""
+    def out_degree(self, node):
+        return int(_MASK_DEGREE[self.out_mask(node)])
+
+    """Number of edges entering a node
+    Input: INT node, a 2-bit encoded k-1 mer
+    Output: INT in-degree"""
+    def in_degree(self, node):
+        return int(_MASK_DEGREE[self.in_mask(node)])
+
+    """Remove an edge (a k-mer) from the graph by clearing its bits in the masks of the two nodes it joins.
+    The nodes themselves stay in the node array, possibly with no edges left. Any unitigs are out of date afterwards,
+    and the cached extensions are dropped.
+    Input: INT kmer, a 2-bit encoded k-mer"""
+    def remove_edge(self, kmer):
+        prefix, last_base = kmer >> 2, kmer & 3
+        suffix, first_base = kmer & ((1 << (2 * (self.k - 1))) - 1), kmer >> (2 * (self.k - 1))
+        # the same bits that _construct_debruijn_graph set for the k-mer
+        bits = [(prefix, 1 << last_base), (suffix, 16 << first_base)]
+        if self.canonical:
+            rc_prefix = reverse_complement_kmer(prefix, self.k - 1)
+            rc_suffix = reverse_complement_kmer(suffix, self.k - 1)
+            bits = [(prefix, 1 << last_base)] * (prefix <= rc_prefix) + \
+                   [(rc_prefix, 16 << (3 - last_base))] * (prefix >= rc_prefix) + \
+                   [(suffix, 16 << first_base)] * (suffix <= rc_suffix) + \
+                   [(rc_suffix, 1 << (3 - first_base))] * (suffix >= rc_suffix)
+        for node, bit in bits:
+            index = self._node_index(node)
+            if index >= 0:
+                self.edges[index] &= np.uint8(~bit & 255)
+        self.clear_unitigs()
+        if self.extension_cache is not None:
+            self.extension_cache.clear()
+
+    """Whether a walk that steps from one node to the next has to stop there because it has reached a fold, where the
+    graph turns onto the other strand and going on would walk back over the same k-mers in reverse complement (canonical
+    mode only): the step was over a k-mer that is its own reverse complement, or reached a k-1 mer that is its own
+    reverse complement (whose next step is the reverse complement of this one). Walks, unitigs and the extensions read
+    off them all end at a fold, after the step onto it.
+    Input: INT node; INT next_node, 2-bit encoded k-1 mers, in the direction of the walk (next_node is node's successor
+            when walking right, its predecessor when walking left)
+    Output: BOOL"""
+    def _folds(self, node, next_node):
+        if not self.canonical:
+            return False
+        # a k-1 mer can only be its own reverse complement when k is odd, and a k-mer only when k is even; either way
+        # its first base has to pair with its last, which rules most steps out before the reverse complement is taken
+        first_base = (next_node if self.k % 2 else node) >> (2 * (self.k - 2))
+        if first_base != 3 - (next_node & 3):
+            return False
+        return reverse_complement_kmer(next_node, self.k - 1) == (next_node if self.k % 2 else node)
+
+    """Forget the unitigs and their index (after the graph has changed); compact() builds them again"""
+    def clear_unitigs(self):
+        self.unitigs = None
+        self._unitig_is_cycle = None
+        self._index_kmers = None
+        self._index_unitigs = None
+        self._index_offsets = None
+
+    """Walk forward from a node for as long as the path doesn't branch, i.e. every node on it has exactly one
+    incoming and one outgoing edge. Stops at branches, dead ends, folds (see _folds), and when a cycle comes back around.
+    The extension from every node on the walk is the rest of the walk, so all of them are cached together (unless the
+    walk stopped on a cycle, where the extension depends on where the walk started).
+    Input: INT node, a 2-bit encoded k-1 mer
+    Output: STRING bases, the bases added to the right of the node"""
+    def _extend_right(self, node):
+        if self.extension_cache is not None:
+            cached = self.extension_cache.get((node, 1))
+            if cached is not None:
+                return cached
+        suffix_mask = (1 << (2 * (self.k - 1))) - 1
+        top_shift = 2 * (self.k - 2)
+        bases = []
+        walked = [node]
+        visited = {node}
+        closed = False
         while True:
-            # get the k-1 mers that overlap with the current node
-            neighbors = self.graph[current_node]
-            #print(neighbors)
-            if len(neighbors) == 1:
-                # if there is only one neighbor, set it as the next node and loop
-                next_node, edge_label = neighbors[0]
-                contig_nodes_left.append(current_node)
-                contig_edges.append(edge_label)
-                current_node = next_node
-            else:
-                # branching point or dead end...?
-                contig_nodes_left.append(current_node)
+            index, out_edges, in_edges = self._oriented_masks(node)
+            if index < 0:
+                break
+            if _MASK_DEGREE[out_edges] != 1 or _MASK_DEGREE[in_edges] != 1:
+                break # branching point or dead end
+            if self._folds((_MASK_BASE[in_edges] << top_shift) | (node >> 2), node):
+                break # the walk reached (or started at) a fold
+            base = _MASK_BASE[out_edges]
+            node = ((node << 2) | base) & suffix_mask
+            if node in visited: # a cycle (folds stop the walk before it can come back on the other strand)
+                closed = True
                 break
-            
-        # do the same for the right kmer
-        contig_nodes_right = []
-        current_node = right_kmer
-        #print(current_node)
+            visited.add(node)
+            walked.append(node)
+            bases.append(base)
+        instrumentation.count("traversal_steps", len(bases))
+        extension = "".join("ACGT"[base] for base in bases)
+        if self.extension_cache is not None:
+            # the walk from the i-th node on it is everything after that node
+            entries = [(walked[0], 0, len(extension))] if closed else \
+                [(walked_node, i, len(extension)) for i, walked_node in enumerate(walked)]
+            self.extension_cache.add(extension, [((key, 1), start, end) for key, start, end in entries])
+        return extension
+
+    """Walk backward from a node for as long as the path doesn't branch (see _extend_right)
+    Input: INT node, a 2-bit encoded k-1 mer
+    Output: STRING bases, the bases added to the left of the node, in sequence order"""
+    def _extend_left(self, node):
+        if self.extension_cache is not None:
+            cached = self.extension_cache.get((node, -1))
+            if cached is not None:
+                return cached
+        suffix_mask = (1 << (2 * (self.k - 1))) - 1
+        top_shift = 2 * (self.k - 2)
+        bases = []
+        walked = [node]
+        visited = {node}
+        closed = False
         while True:
-            neighbors = self.graph[current_node]
-            #print(neighbors)
-            if len(neighbors) == 1:
-                next_node, edge_label = neighbors[0]
-                contig_nodes_right.append(current_node)
-                contig_edges.append(edge_label)
-                current_node = next_node
+            index, out_edges, in_edges = self._oriented_masks(node)
+            if index < 0:
+                break
+            if _MASK_DEGREE[out_edges] != 1 or _MASK_DEGREE[in_edges] != 1:
+                break # branching point or dead end
+            if self._folds(((node << 2) | _MASK_BASE[out_edges]) & suffix_mask, node):
+                break # the walk reached (or started at) a fold
+            base = _MASK_BASE[in_edges]
+            node = (base << top_shift) | (node >> 2)
+            if node in visited:
+                closed = True
+                break
+            visited.add(node)
+            walked.append(node)
+            bases.append(base)
+        instrumentation.count("traversal_steps", len(bases))
+        bases.reverse()
+        extension = "".join("ACGT"[base] for base in bases)
+        if self.extension_cache is not None:
+            # the walk from the i-th node on it is everything to the left of that node
+            entries = [(walked[0], 0, len(extension))] if closed else \
+                [(walked_node, 0, len(extension) - i) for i, walked_node in enumerate(walked)]
+            self.extension_cache.add(extension, [((key, -1), start, end) for key, start, end in entries])
+        return extension
+
+    """Compact the graph into unitigs, the maximal non-branching paths, and index where every k-mer sits in them.
+    A unitig starts at every edge leaving a node that doesn't have exactly one incoming and one outgoing edge, and runs
+    until it reaches another such node. Whatever is left over forms isolated cycles, which become one unitig each.
+    In canonical mode the edges leaving both strands of a node are followed, and each unitig is kept on one strand only.
+    A unitig also ends at a fold (see _folds), so a run of internal nodes between two folds is a unitig of its own,
+    which starts with the k-mer of its first fold.
+    After this, get_longest_contig looks the query's end k-mers up in the index instead of walking the graph.
+    Output: LIST unitigs, the sequence of each unitig"""
+    def compact(self):
+        nodes = self.nodes.tolist()
+        internal = self._internal_nodes().tolist()
+        visited = [False] * len(nodes)
+        unitigs = []
+        is_cycle = []
+        seen = set() # canonical mode: unitigs already found from their other end
+        # paths between branching nodes (and dead ends)
+        for start in range(len(nodes)):
+            if internal[start]:
+                continue
+            for start_node in self._orientations(nodes[start]):
+                start_out = self._oriented_masks(start_node)[1]
+                for base in range(4):
+                    if not (start_out >> base) & 1:
+                        continue
+                    unitig, path = self._walk_unitig(start_node, base, internal)
+                    for index in path:
+                        visited[index] = True
+                    if self.canonical:
+                        key = min(unitig, reverse_complement(unitig))
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                    unitigs.append(unitig)
+                    is_cycle.append(False)
+        # isolated cycles, where every node is internal, and runs of internal nodes between two folds
+        for start in range(len(nodes)):
+            if not internal[start] or visited[start]:
+                continue
+            start_node = self._unitig_start(nodes[start], internal, {})
+            if start_node is None:
+                unitig, path = self._walk_cycle(nodes[start])
             else:
-                # branching point/dead end...
-                contig_nodes_right.append(current_node)
+                unitig, path = self._walk_unitig(start_node, _MASK_BASE_LIST[self._oriented_masks(start_node)[1]],
+                                                 internal)
+                path.append(self._node_index(self._canonical_node(start_node)))
+            for index in path:
+                visited[index] = True
+            unitigs.append(unitig)
+            is_cycle.append(start_node is None)
+        self.unitigs = unitigs
+        self._unitig_is_cycle = is_cycle
+        self._build_unitig_index()
+        instrumentation.gauge("unitigs", len(unitigs))
+        return unitigs
+
+    """Find which nodes are internal to a unitig, i.e. have exactly one incoming and one outgoing edge. The degrees are
+    the same on both strands, so in canonical mode a node is internal or not regardless of strand.
+    Output: NUMPY ARRAY (bool), for each node in self.nodes"""
+    def _internal_nodes(self):
+        return (_MASK_DEGREE[self.edges & 15] == 1) & (_MASK_DEGREE[self.edges >> 4] == 1)
+
+    """The strands a stored node is walked from: itself, and in canonical mode its reverse complement as well
+    Input: INT node, as stored in self.nodes
+    Output: LIST of 2-bit encoded k-1 mers"""
+    def _orientations(self, node):
+        if self.canonical and reverse_complement_kmer(node, self.k - 1) != node:
+            return [node, reverse_complement_kmer(node, self.k - 1)]
+        return [node]
+
+    """Walk one unitig, from a node that is not internal (or a fold, see _unitig_start) along one of its outgoing edges to
+    the next node that is not internal or the next fold (or until the walk comes back on itself)
+    Input: INT start_node, a 2-bit encoded k-1 mer; INT base, the base of the edge to leave it by;
+            LIST internal, whether each node (by index) is internal
+    Output: STRING unitig; LIST path, the indices of the internal nodes walked through (and of the fold it ends at)"""
+    def _walk_unitig(self, start_node, base, internal):
+        suffix_mask = (1 << (2 * (self.k - 1))) - 1
+        bases = [base]
+        node = ((start_node << 2) | base) & suffix_mask
+        index, out_mask, _ = self._oriented_masks(node)
+        path = []
+        on_path = set()
+        # a unitig that starts at a fold starts with the k-mer that is its own reverse complement, and goes on past it
+        folded = self._folds(start_node, node) and node != reverse_complement_kmer(start_node, self.k - 1)
+        while internal[index] and index not in on_path and not folded:
+            path.append(index)
+            on_path.add(index)
+            base = _MASK_BASE_LIST[out_mask]
+            bases.append(base)
+            previous, node = node, ((node << 2) | base) & suffix_mask
+            index, out_mask, _ = self._oriented_masks(node)
+            folded = self._folds(previous, node)
+        if folded and internal[index] and index not in on_path:
+            path.append(index) # a fold the unitig ends at is walked through as well
+        return decode_kmer(start_node, self.k - 1) + "".join("ACGT"[b] for b in bases), path
+
+    """Walk an isolated cycle, where every node is internal, once around from a node
+    Input: INT start_node, a 2-bit encoded k-1 mer
+    Output: STRING unitig; LIST path, the indices of the nodes on the cycle"""
+    def _walk_cycle(self, start_node):
+        suffix_mask = (1 << (2 * (self.k - 1))) - 1
+        bases = []
+        node = start_node
+        path = [self._node_index(self._canonical_node(node))]
+        on_path = set(path)
+        while True:
+            base = _MASK_BASE_LIST[self._oriented_masks(node)[1]]
+            bases.append(base)
+            node = ((node << 2) | base) & suffix_mask
+            index = self._node_index(self._canonical_node(node))
+            if node == start_node or index in on_path: # in canonical mode the walk can turn onto the other strand
                 break
-        
-        # reverse the order of the right nodes
-        contig_nodes_right.reverse()
-        contig = contig_nodes_left[:-1] + first_kmer + contig_nodes_right[1:]
+            path.append(index)
+            on_path.add(index)
+        return decode_kmer(start_node, self.k - 1) + "".join("ACGT"[b] for b in bases), path
 
-        # join the nodes with the query to get the final contig
-        return ''.join(contig)
+    """Walk backward from a node through internal nodes to the node its unitig starts at
+    Input: INT node, a 2-bit encoded k-1 mer; NUMPY ARRAY internal (bool), whether each node (by index) is internal;
+            DICT known, the start found for every node walked through before, which is filled in as this walk goes
+    Output: INT the first node that is not internal or where the walk backward reaches a fold (see _folds; node itself
+            if it is either), or None if the walk goes around a cycle"""
+    def _unitig_start(self, node, internal, known):
+        suffix_mask = (1 << (2 * (self.k - 1))) - 1
+        top_shift = 2 * (self.k - 2)
+        path = []
+        on_path = set()
+        while node not in known:
+            index, out_mask, in_mask = self._oriented_masks(node)
+            if not internal[index] or self._folds(((node << 2) | _MASK_BASE_LIST[out_mask]) & suffix_mask, node):
+                known[node] = node
+                break
+            if index in on_path:
+                known[node] = None
+                break
+            path.append(node)
+            on_path.add(index)
+            node = (_MASK_BASE_LIST[in_mask] << top_shift) | (node >> 2)
+        for walked in path:
+            known[walked] = known[node]
+        return known[node]
+
+    """Bring the unitigs up to date after edges were added, walking again only the ones through the changed nodes. Edges
+    are only ever added, so a node that was not internal still isn't, and a unitig that has no changed node on it is
+    the same as before. The unitigs that do are dropped, and the unitigs through each changed node are walked, from the
+    node that starts them.
+    Input: NUMPY ARRAY changed, the nodes (as stored, sorted) that were added or gained edges"""
+    def _update_unitigs(self, changed):
+        # the unitigs holding an edge into or out of a changed node are out of date
+        bases = np.arange(4, dtype=np.uint64)
+        touching = np.concatenate(((changed[:, None] << np.uint64(2) | bases).ravel(),
+                                   ((bases << np.uint64(2 * (self.k - 1))) | changed[:, None]).ravel()))
+        if self.canonical:
+            touching = np.minimum(touching, reverse_complement_kmers(touching, self.k))
+        positions = np.searchsorted(self._index_kmers, touching)
+        hits = positions < len(self._index_kmers)
+        hits[hits] = self._index_kmers[positions[hits]] == touching[hits]
+        stale = np.zeros(len(self.unitigs), dtype=bool)
+        stale[self._index_unitigs[positions[hits]]] = True
+        # drop them, renumbering the unitigs that are kept
+        kept = np.cumsum(~stale) - 1
+        self.unitigs = [unitig for unitig, drop in zip(self.unitigs, stale.tolist()) if not drop]
+        self._unitig_is_cycle = [cycle for cycle, drop in zip(self._unitig_is_cycle, stale.tolist()) if not drop]
+        entries = ~stale[self._index_unitigs]
+        self._index_kmers = self._index_kmers[entries]
+        self._index_unitigs = kept[self._index_unitigs[entries]].astype(np.int32)
+        self._index_offsets = self._index_offsets[entries]
+
+        # walk the unitigs through the changed nodes
+        internal = self._internal_nodes()
+        top_shift = 2 * (self.k - 2)
+        starts = set()
+        known = {}
+        cycle_nodes = []
+        for node in changed.tolist():
+            for oriented in self._orientations(node):
+                # the unitig through the node, and (if the node starts unitigs) the ones that end at it
+                in_mask = self._oriented_masks(oriented)[2]
+                for predecessor in [oriented] + [(base << top_shift) | (oriented >> 2) for base in range(4)
+                                                 if (in_mask >> base) & 1]:
+                    start = self._unitig_start(predecessor, internal, known)
+                    if start is None:
+                        cycle_nodes.append(predecessor)
+                    else:
+                        starts.add(start)
+        new_unitigs = []
+        new_cycles = []
+        seen = set()
+        for start_node in starts:
+            start_out = self._oriented_masks(start_node)[1]
+            for base in range(4):
+                if not (start_out >> base) & 1:
+                    continue
+                unitig = self._walk_unitig(start_node, base, internal)[0]
+                key = min(unitig, reverse_complement(unitig)) if self.canonical else unitig
+                # skip the unitigs that were kept (every edge is in exactly one unitig)
+                if key in seen or self.unitig_of(int(kmer_array(unitig[:self.k], self.k)[0])) is not None:
+                    continue
+                seen.add(key)
+                new_unitigs.append(unitig)
+                new_cycles.append(False)
+        on_cycle = set()
+        for node in cycle_nodes:
+            if self._node_index(self._canonical_node(node)) in on_cycle:
+                continue
+            unitig, path = self._walk_cycle(node)
+            on_cycle.update(path)
+            new_unitigs.append(unitig)
+            new_cycles.append(True)
 
+        # add the new unitigs and merge their k-mers into the sorted index
+        kmers, ids, offsets = self._unitig_index_entries(new_unitigs, len(self.unitigs))
+        positions = np.searchsorted(self._index_kmers, kmers)
+        self._index_kmers = np.insert(self._index_kmers, positions, kmers)
+        self._index_unitigs = np.insert(self._index_unitigs, positions, ids)
+        self._index_offsets = np.insert(self._index_offsets, positions, offsets)
+        self.unitigs.extend(new_unitigs)
+        self._unitig_is_cycle.extend(new_cycles)
+        instrumentation.gauge("unitigs", len(self.unitigs))
 
+    """Index every k-mer of every unitig by its position, as three parallel arrays sorted by k-mer"""
+    def _build_unitig_index(self):
+        self._index_kmers, self._index_unitigs, self._index_offsets = self._unitig_index_entries(self.unitigs)
+
+    """Find every k-mer of a list of unitigs, with the unitig it is in and its offset there
+    Input: LIST unitigs; INT first_id, the id of the first unitig in the list
+    Output: NUMPY ARRAYS kmers (uint64, sorted), unitig ids (int32), offsets (int32)"""
+    def _unitig_index_entries(self, unitigs, first_id=0):
+        unitig_kmers = [kmer_array(unitig, self.k, self.canonical) for unitig in unitigs]
+        kmers = np.concatenate(unitig_kmers) if unitig_kmers else np.zeros(0, dtype=np.uint64)
+        ids = np.repeat(np.arange(first_id, first_id + len(unitig_kmers), dtype=np.int32),
+                        [len(x) for x in unitig_kmers])
+        offsets = np.concatenate([np.arange(len(x), dtype=np.int32) for x in unitig_kmers]) if unitig_kmers \
+            else np.zeros(0, dtype=np.int32)
+        order = np.argsort(kmers)
+        return kmers[order], ids[order], offsets[order]
+
+    """Find the unitig that holds a k-mer (only after compact() has been run). In canonical mode the unitig may hold the
+    k-mer's reverse complement instead.
+    Input: INT kmer, a 2-bit encoded k-mer
+    Output: TUPLE (unitig id, offset of the k-mer in the unitig's sequence), or None if the k-mer isn't in the graph"""
+    def unitig_of(self, kmer):
+        if self.canonical:
+            kmer = min(kmer, reverse_complement_kmer(kmer, self.k))
+        index = int(np.searchsorted(self._index_kmers, np.uint64(kmer)))
+        if index < len(self._index_kmers) and self._index_kmers[index] == kmer:
+            return int(self._index_unitigs[index]), int(self._index_offsets[index])
+        return None
+
+    """Construct the longest contig that contains the query sequence. The query is extended to the left from its first
+    k-1 mer and to the right from its last k-1 mer for as long as the graph has a single, unambiguous path.
+    Once the graph has been compacted, the extensions are read off the unitigs holding the query's first and last k-mers
+    (reverse complemented when a unitig holds the query's k-mer on the other strand).
+    Input: STRING query_seq, the query sequence
+    Output: STRING contig, the query with its unambiguous extensions on either side"""
+    def get_longest_contig(self, query_seq):
+        if len(query_seq) < self.k - 1:
+            return query_seq
+        left = right = None
+        if self.unitigs is not None and len(query_seq) >= self.k:
+            first_kmer = kmer_array(query_seq[:self.k], self.k)
+            last_kmer = kmer_array(query_seq[-self.k:], self.k)
+            first_hit = self.unitig_of(int(first_kmer[0])) if len(first_kmer) else None
+            last_hit = self.unitig_of(int(last_kmer[0])) if len(last_kmer) else None
+            # the part of the unitig before the first k-mer is everything the walk to the left would find
+            # (cycles have no natural start, so those are still walked)
+            if first_hit is not None and not self._unitig_is_cycle[first_hit[0]]:
+                unitig, offset = self.unitigs[first_hit[0]], first_hit[1]
+                if unitig[offset:offset + self.k] == query_seq[:self.k].upper():
+                    left = unitig[:offset]
+                else:
+                    left = reverse_complement(unitig[offset + self.k:])
+            if last_hit is not None and not self._unitig_is_cycle[last_hit[0]]:
+                unitig, offset = self.unitigs[last_hit[0]], last_hit[1]
+                if unitig[offset:offset + self.k] == query_seq[-self.k:].upper():
+                    right = unitig[offset + self.k:]
+                else:
+                    right = reverse_complement(unitig[:offset])
+            # a k-mer that is its own reverse complement reads the same on either strand of its unitig, but it is a fold
+            # (see _folds), so nothing extends the query past it
+            if self.canonical and len(first_kmer) and int(first_kmer[0]) == reverse_complement_kmer(int(first_kmer[0]),
+                                                                                                    self.k):
+                left = ""
+            if self.canonical and len(last_kmer) and int(last_kmer[0]) == reverse_complement_kmer(int(last_kmer[0]),
+                                                                                                  self.k):
+                right = ""
+        # otherwise start with the first and last k-1 mers of the query and walk the graph
+        if left is None:
+            first_node = kmer_array(query_seq[:self.k - 1], self.k - 1)
+            left = self._extend_left(int(first_node[0])) if len(first_node) else ""
+        if right is None:
+            last_node = kmer_array(query_seq[-(self.k - 1):], self.k - 1)
+            right = self._extend_right(int(last_node[0])) if len(last_node) else ""
+        # join the extensions with the query to get the final contig
+        return left + query_seq + right
@@ -0,0 +1,94 @@
+"""Description: Functions for filtering out sequencing errors before the de Bruijn graph is built.
+A k-mer that contains a sequencing error is usually seen only once or twice, while a k-mer from the genome is seen
+about as many times as the coverage. The k-mer abundance histogram therefore has a peak of error k-mers at low counts,
+a valley, and a peak around the coverage; k-mers below the valley are "weak" and the rest are "solid".
+The reads are counted in one streaming pass into a counting bloom filter (4 bits per counter) and the histogram is
+kept up to date as they go, then reads are trimmed to their solid k-mers (or dropped) on the way into the graph.
+"""
+import numpy as np
+from bloom_filter import CountingBloomFilter # import the counting filter from bloom_filter.py
+from kmers import kmer_array # import the k-mer encoding from kmers.py
+
+# counting bloom filter counters stop at 15, so this is the largest count the histogram can tell apart
+MAX_COUNT = 15
+
+'''Count the k-mers of a set of reads in one pass, and build their abundance histogram along the way
+Input: ITERABLE reads, of sequences (strings or base code arrays); INT k, the k-mer length;
+        INT array_size, the number of counters; INT num_hash_functions, number of hash functions for the counters;
+        BOOL canonical, whether to count a k-mer and its reverse complement together
+Output: CountingBloomFilter abundance, the k-mer counts; NUMPY ARRAY histogram, where histogram[c] is the
+        (estimated) number of distinct k-mers seen c times (the last entry holds everything seen MAX_COUNT or more times)
+'''
+def count_kmer_abundance(reads, k, array_size, num_hash_functions, canonical=False):
+    abundance = CountingBloomFilter(array_size, num_hash_functions)
+    histogram = np.zeros(MAX_COUNT + 1, dtype=np.int64)
+    for seq in reads:
+        update_abundance(abundance, histogram, kmer_array(seq, k, canonical))
+    return abundance, histogram
+
+'''Count a batch of keys (k-mers, or the hashes of whole reads) into a counting bloom filter and move each one to the
+bin of its new count in the abundance histogram
+Input: CountingBloomFilter abundance; NUMPY ARRAY histogram, updated in place (see count_kmer_abundance);
+        NUMPY ARRAY keys (uint64), repeats allowed
+'''
+def update_abundance(abundance, histogram, keys):
+    keys, occurrences = np.unique(keys, return_counts=True)
+    if len(keys) == 0:
+        return
+    # each key moves from the bin of its old count to the bin of its new count
+    old_counts = abundance.count_many(keys).astype(np.int64)
+    abundance.add_many(np.repeat(keys, occurrences))
+    new_counts = np.minimum(old_counts + occurrences, MAX_COUNT)
+    np.subtract.at(histogram, old_counts[old_counts > 0], 1)
+    np.add.at(histogram, new_counts, 1)
+
+'''Pick the count that separates weak k-mers from solid ones: the first valley of the abundance histogram
+Input: NUMPY ARRAY histogram (output of count_kmer_abundance)
+Output: INT cutoff, k-mers seen fewer times than this are weak (1 if the histogram has no valley, i.e. keep everything)
+'''
+def solid_kmer_cutoff(histogram):
+    for count in range(2, len(histogram) - 1):
+        if histogram[count] <= histogram[count - 1] and histogram[count] < histogram[count + 1]:
+            return count
+    return 1
+
+'''Trim a read to its longest stretch of solid k-mers
+Input: STRING seq; INT k, the k-mer length; CountingBloomFilter abundance; INT cutoff, the smallest solid count;
+        BOOL canonical, whether the abundance was counted with canonical k-mers
+Output: STRING, the longest part of the read made only of solid k-mers ("" if the read has none)
+'''
+def trim_read(seq, k, abundance, cutoff, canonical=False):
+    kmers, positions = kmer_array(seq, k, canonical, return_positions=True)
+    if len(kmers) == 0:
+        return ""
+    solid_positions = positions[abundance.check_many(kmers, cutoff)]
+    if len(solid_positions) == 0:
+        return ""
+    # runs of solid k-mers that start one base apart
+    run_breaks = np.flatnonzero(np.diff(solid_positions) != 1) + 1
+    run_starts = np.concatenate(([0], run_breaks))
+    run_ends = np.concatenate((run_breaks, [len(solid_positions)]))
+    longest = int(np.argmax(run_ends - run_starts))
+    start = int(solid_positions[run_starts[longest]])
+    end = int(solid_positions[run_ends[longest] - 1]) + k
+    return seq[start:end]
+
+'''Remove the sequencing errors from a set of reads, either by trimming each read to its longest solid stretch or by
+dropping every read that has a weak k-mer
+Input: ITERABLE reads, of (sequence ID, sequence) tuples; INT k, the k-mer length; CountingBloomFilter abundance;
+        INT cutoff, the smallest solid count; STRING mode, "trim" or "drop";
+        BOOL canonical, whether the abundance was counted with canonical k-mers
+Output: GENERATOR of (sequence ID, sequence) tuples for the reads that are kept
+'''
+def correct_reads(reads, k, abundance, cutoff, mode="trim", canonical=False):
+    if mode not in ("trim", "drop"):
+        raise ValueError("mode must be 'trim' or 'drop'")
+    for sequence_ID, sequence in reads:
+        if cutoff <= 1:
+            yield sequence_ID, sequence
+            continue
+        kept = trim_read(sequence, k, abundance, cutoff, canonical)
+        if mode == "drop" and len(kept) != len(sequence):
+            continue
+        if len(kept) >= k:
+            yield sequence_ID, kept
@@ -0,0 +1,90 @@
+"""Description: Class for a bounded, least-recently-used cache of the non-branching extensions walked in a de Bruijn
+graph. A walk from one node passes through a run of other nodes, and the extension from each of those is a slice of the
+same walk, so one walk is stored once and every node on it gets an entry pointing into it. Queries in the same region,
+or repeated queries, then find their extensions without walking the graph again.
+The memory used is the stored walks plus an estimated ENTRY_BYTES per entry; once it goes over the budget, the least
+recently used entries are evicted (a walk is dropped with its last entry).
+"""
+import sys
+from collections import OrderedDict
+import instrumentation # import the counters from instrumentation.py
+
+# bytes taken by one entry (its dictionary slot, key and value) on 64-bit CPython, not counting the walk it points into
+ENTRY_BYTES = 300
+# default memory budget of a cache
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+"""Class for ExtensionCache object. Maps keys (such as a node and a direction) to slices of stored walks.
+"""
+class ExtensionCache:
+    """Initialize the cache
+    Input: INT max_bytes, the memory budget
+    Output: ExtensionCache object"""
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # estimated memory in use
+        self.nbytes = 0
+        # key -> (walk, start, end), least recently used first; a walk is [sequence, number of entries pointing into it]
+        self._entries = OrderedDict()
+
+    """Look up the extension stored for a key
+    Input: key
+    Output: STRING extension, or None if it isn't in the cache"""
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            instrumentation.count("extension_cache_misses")
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        instrumentation.count("extension_cache_hits")
+        walk, start, end = entry
+        return walk[0][start:end]
+
+    """Store a walk and the extension of each key along it. A walk that doesn't fit in the budget on its own isn't stored.
+    Input: STRING sequence, the bases of the walk; LIST entries of (key, INT start, INT end) tuples, where
+            sequence[start:end] is the extension for that key"""
+    def add(self, sequence, entries):
+        size = sys.getsizeof(sequence)
+        if size + ENTRY_BYTES * len(entries) > self.max_bytes:
+            return
+        walk = [sequence, 0]
+        self.nbytes += size
+        for key, start, end in entries:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._release(old)
+            self._entries[key] = (walk, start, end)
+            walk[1] += 1
+            self.nbytes += ENTRY_BYTES
+        while self.nbytes > self.max_bytes:
+            self._release(self._entries.popitem(last=False)[1])
+            self.evictions += 1
+
+    """Account for an entry that was removed, dropping its walk if no other entry points into it
+    Input: TUPLE entry, (walk, start, end)"""
+    def _release(self, entry):
+        walk = entry[0]
+        walk[1] -= 1
+        self.nbytes -= ENTRY_BYTES
+        if walk[1] == 0:
+            self.nbytes -= sys.getsizeof(walk[0])
+
+    """Empty the cache (for example after the graph has changed); the counters are kept"""
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    """The counters and the memory in use
+    Output: DICT stats"""
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self._entries),
+                "bytes": self.nbytes, "max_bytes": self.max_bytes}
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,301 @@
+"""Description: Functions for simplifying a de Bruijn graph by removing the structures that sequencing errors leave
+behind, so that contigs run on past them instead of stopping at the first branch.
+An error near the end of a read makes a tip, a short dead-end path hanging off the true path; an error in the middle
+of a read makes a bubble, a short path that leaves the true path and rejoins it a little later. Tips are found with a
+walk of bounded length from a branching node, and bubbles with a search of bounded depth that goes on through the
+branches inside them, so bubbles within bubbles and overlapping bubbles are popped too. The k-mer counts decide which
+path is the error.
+Nodes are read on the strand they are reached on, so the same code works on canonical graphs.
+The graph is changed in place (see DeBruijnGraph.remove_edge), and after every change only the neighbourhood of the
+change is looked at again, so the whole pass stays close to linear in the size of the graph.
+"""
+import numpy as np
+from de_bruijn_graph import _MASK_DEGREE, _MASK_BASE_LIST # edge mask helpers from de_bruijn_graph.py
+from kmers import canonical_kmers, reverse_complement_kmers # import the k-mer encoding from kmers.py
+
+'''Follow a path forward from a node along one of its outgoing edges until it reaches a node that doesn't have exactly
+one incoming and one outgoing edge
+Input: DeBruijnGraph graph; INT node, a 2-bit encoded k-1 mer; INT base, the edge to leave by; INT max_length
+Output: LIST kmers, the edges of the path in order, and INT end, the node it reaches; or None if the path is longer
+        than max_length edges
+'''
+def _walk_forward(graph, node, base, max_length):
+    suffix_mask = (1 << (2 * (graph.k - 1))) - 1
+    kmers = []
+    while len(kmers) < max_length:
+        kmer = (node << 2) | base
+        kmers.append(kmer)
+        node = kmer & suffix_mask
+        _, out_mask, in_mask = graph._oriented_masks(node)
+        if _MASK_DEGREE[out_mask] != 1 or _MASK_DEGREE[in_mask] != 1:
+            return kmers, node
+        base = _MASK_BASE_LIST[out_mask]
+    return None
+
+'''Follow a path backward from a node along one of its incoming edges (see _walk_forward)
+Input: DeBruijnGraph graph; INT node, a 2-bit encoded k-1 mer; INT base, the edge to arrive by; INT max_length
+Output: LIST kmers, the edges of the path from the node backward, and INT end, the node it reaches; or None if the
+        path is longer than max_length edges
+'''
+def _walk_backward(graph, node, base, max_length):
+    top_shift = 2 * (graph.k - 1)
+    kmers = []
+    while len(kmers) < max_length:
+        kmer = (base << top_shift) | node
+        kmers.append(kmer)
+        node = kmer >> 2
+        _, out_mask, in_mask = graph._oriented_masks(node)
+        if _MASK_DEGREE[out_mask] != 1 or _MASK_DEGREE[in_mask] != 1:
+            return kmers, node
+        base = _MASK_BASE_LIST[in_mask]
+    return None
+
+'''Look up the counts of some edges
+Input: DeBruijnGraph graph; LIST kmers
+Output: NUMPY ARRAY (uint32) counts
+'''
+def _counts(graph, kmers):
+    kmers = np.array(kmers, dtype=np.uint64)
+    if graph.canonical:
+        kmers = canonical_kmers(kmers, graph.k)
+    return graph.kmer_table.count_many(kmers)
+
+'''Mean k-mer count along a path
+Input: DeBruijnGraph graph; LIST kmers
+Output: FLOAT coverage
+'''
+def _coverage(graph, kmers):
+    return float(np.mean(_counts(graph, kmers)))
+
+'''Clip the tip that starts (or ends) at a node, if the node is the loose end of one
+A tip is kept when it has more coverage than every other edge entering (or leaving) the junction it hangs off,
+since then it is more likely the true path than the error.
+Input: DeBruijnGraph graph; INT node; INT max_length, the longest tip (in edges) that is clipped
+Output: LIST of the nodes whose neighbourhood changed (empty if nothing was clipped)
+'''
+def _clip_tip(graph, node, max_length):
+    _, out_mask, in_mask = graph._oriented_masks(node)
+    if in_mask == 0 and _MASK_DEGREE[out_mask] == 1:
+        walk = _walk_forward(graph, node, _MASK_BASE_LIST[out_mask], max_length)
+        if walk is None:
+            return []
+        kmers, junction = walk
+        junction_mask = graph._oriented_masks(junction)[2]
+        # the other edges entering the junction
+        top_shift = 2 * (graph.k - 1)
+        others = [(base << top_shift) | junction for base in range(4)
+                  if (junction_mask >> base) & 1 and (base << top_shift) | junction != kmers[-1]]
+    elif out_mask == 0 and _MASK_DEGREE[in_mask] == 1:
+        walk = _walk_backward(graph, node, _MASK_BASE_LIST[in_mask], max_length)
+        if walk is None:
+            return []
+        kmers, junction = walk
+        junction_mask = graph._oriented_masks(junction)[1]
+        # the other edges leaving the junction
+        others = [(junction << 2) | base for base in range(4)
+                  if (junction_mask >> base) & 1 and (junction << 2) | base != kmers[-1]]
+    else:
+        return []
+    if not others: # a path with two loose ends, not a tip
+        return []
+    if _coverage(graph, kmers) > max(_counts(graph, others)):
+        return []
+    for kmer in kmers:
+        graph.remove_edge(kmer)
+    return [junction]
+
+'''Find the bubble that starts at a node: the part of the graph between the node and the first node every path out of
+it reaches again (a superbubble, Onodera et al. 2013), with no edges entering or leaving it in between. The search
+goes on through the branches inside, taking each node once all of the edges into it have been followed, and gives up
+once a path is longer than max_length edges.
+Input: DeBruijnGraph graph; INT source, a 2-bit encoded k-1 mer; INT max_length
+Output: INT end, the node where the paths meet, and LIST nodes, the source and the nodes inside in an order where each
+        comes after the nodes with edges into it; or None if there is no such bubble within max_length edges
+'''
+def _find_bubble(graph, source, max_length):
+    suffix_mask = (1 << (2 * (graph.k - 1))) - 1
+    top_shift = 2 * (graph.k - 1)
+    longest = {source: 0} # the length of the longest path from the source to each node found
+    taken = set()
+    nodes = []
+    # a node that is both a node of the bubble and the reverse complement of one would be read on both strands
+    strands = {graph._canonical_node(source)}
+    seen = set()
+    stack = [source]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        taken.add(node)
+        seen.discard(node)
+        out_mask = graph._oriented_masks(node)[1]
+        if out_mask == 0: # a dead end, which is a tip rather than a bubble
+            return None
+        for base in range(4):
+            if not (out_mask >> base) & 1:
+                continue
+            next_node = ((node << 2) | base) & suffix_mask
+            if next_node == source or (graph.canonical and graph._folds(node, next_node)):
+                return None
+            longest[next_node] = max(longest.get(next_node, 0), longest[node] + 1)
+            if longest[next_node] > max_length:
+                return None
+            seen.add(next_node)
+            in_mask = graph._oriented_masks(next_node)[2]
+            if all(((previous << top_shift) | next_node) >> 2 in taken for previous in range(4)
+                   if (in_mask >> previous) & 1):
+                if graph.canonical:
+                    stored = graph._canonical_node(next_node)
+                    if stored in strands:
+                        return None
+                    strands.add(stored)
+                stack.append(next_node)
+        # every path has reached the one node left
+        if len(stack) == 1 and seen == {stack[0]}:
+            end = stack.pop()
+            end_mask = graph._oriented_masks(end)[1]
+            if any(((end << 2) | base) & suffix_mask == source for base in range(4) if (end_mask >> base) & 1):
+                return None # the bubble is part of a cycle through the source
+            return end, nodes
+    return None
+
+'''The path through a bubble with the highest coverage (mean k-mer count), found exactly by keeping the best total
+count for each node and path length
+Input: DeBruijnGraph graph; INT end; LIST nodes, of the bubble (see _find_bubble)
+Output: LIST kmers, the edges of every path through the bubble; SET kept, the edges of the best path
+'''
+def _best_path(graph, end, nodes):
+    suffix_mask = (1 << (2 * (graph.k - 1))) - 1
+    kmers = [(node << 2) | base for node in nodes for base in range(4) if (graph._oriented_masks(node)[1] >> base) & 1]
+    counts = dict(zip(kmers, _counts(graph, kmers).tolist()))
+    # for each node, the best total count of a path to it of each length, and the edge the path arrived by
+    best = {nodes[0]: {0: (0, None)}}
+    for kmer in kmers:
+        node, next_node = kmer >> 2, kmer & suffix_mask
+        paths = best.setdefault(next_node, {})
+        for length, (total, _) in best[node].items():
+            if length + 1 not in paths or total + counts[kmer] > paths[length + 1][0]:
+                paths[length + 1] = (total + counts[kmer], kmer)
+    length = max(best[end], key=lambda length: best[end][length][0] / length)
+    kept = set()
+    node = end
+    while length > 0:
+        kmer = best[node][length][1]
+        kept.add(kmer)
+        node, length = kmer >> 2, length - 1
+    return kmers, kept
+
+'''Pop the bubbles that leave a node. If every path out of the node meets again within max_length edges, whatever
+branches they go through on the way, the path with the highest coverage is kept and the rest of the bubble is removed.
+Otherwise the unbranched paths out of the node that end at the same node are compared, and all but the one with the
+highest coverage are removed.
+Input: DeBruijnGraph graph; INT node; INT max_length, the longest bubble path (in edges) that is removed
+Output: LIST of the nodes whose neighbourhood changed (empty if nothing was removed)
+'''
+def _pop_bubbles(graph, node, max_length):
+    out_mask = graph._oriented_masks(node)[1]
+    if _MASK_DEGREE[out_mask] < 2:
+        return []
+    bubble = _find_bubble(graph, node, max_length)
+    if bubble is not None:
+        end, nodes = bubble
+        kmers, kept = _best_path(graph, end, nodes)
+        for kmer in kmers:
+            if kmer not in kept:
+                graph.remove_edge(kmer)
+        return [end, node]
+    paths_by_end = {}
+    for base in range(4):
+        if (out_mask >> base) & 1:
+            walk = _walk_forward(graph, node, base, max_length)
+            if walk is not None and walk[1] != node:
+                paths_by_end.setdefault(walk[1], []).append(walk[0])
+    changed = []
+    for end, paths in paths_by_end.items():
+        if len(paths) < 2:
+            continue
+        coverages = [_coverage(graph, kmers) for kmers in paths]
+        keep = int(np.argmax(coverages))
+        for i, kmers in enumerate(paths):
+            if i != keep:
+                for kmer in kmers:
+                    graph.remove_edge(kmer)
+        changed.append(end)
+    if changed:
+        changed.append(node)
+    return changed
+
+'''The branching nodes (and loose ends) within reach of a node, which are the ones that might have a new tip or bubble
+after the node's edges changed
+Input: DeBruijnGraph graph; INT node; INT max_length, how far to look
+Output: LIST of nodes
+'''
+def _neighbourhood(graph, node, max_length):
+    _, out_mask, in_mask = graph._oriented_masks(node)
+    nearby = [node]
+    for base in range(4):
+        if (out_mask >> base) & 1:
+            walk = _walk_forward(graph, node, base, max_length)
+            if walk is not None:
+                nearby.append(walk[1])
+        if (in_mask >> base) & 1:
+            walk = _walk_backward(graph, node, base, max_length)
+            if walk is not None:
+                nearby.append(walk[1])
+    return nearby
+
+'''Simplify a graph in place by clipping tips and popping bubbles until there are none left. Every node that isn't
+in the middle of a path is checked once, and after a change only the nodes around it are checked again.
+Any unitigs are dropped, so run compact() again afterwards.
+Input: DeBruijnGraph graph; INT max_tip_length, the longest tip to clip (default 2k, 0 to clip none);
+        INT max_bubble_length, the longest bubble path to remove (default 2k, 0 to pop none)
+Output: INT tips, the number of tips clipped; INT bubbles, the number of bubbles popped
+'''
+def simplify(graph, max_tip_length=None, max_bubble_length=None):
+    if max_tip_length is None:
+        max_tip_length = 2 * graph.k
+    if max_bubble_length is None:
+        max_bubble_length = 2 * graph.k
+    reach = max(max_tip_length, max_bubble_length)
+    # start from every node that has edges but isn't in the middle of a path
+    out_degrees = _MASK_DEGREE[graph.edges & 15]
+    in_degrees = _MASK_DEGREE[graph.edges >> 4]
+    branching = ((out_degrees != 1) | (in_degrees != 1)) & (graph.edges != 0)
+    worklist = graph.nodes[branching].tolist()
+    if graph.canonical:
+        # bubbles are only looked for forward from a node, so both strands of every node go on the list
+        worklist += reverse_complement_kmers(graph.nodes[branching], graph.k - 1).tolist()
+    queued = set(worklist)
+    tips = bubbles = 0
+    while worklist:
+        node = worklist.pop()
+        queued.discard(node)
+        changed = []
+        if max_tip_length > 0:
+            clipped = _clip_tip(graph, node, max_tip_length)
+            tips += len(clipped)
+            changed += clipped
+        if max_bubble_length > 0:
+            popped = _pop_bubbles(graph, node, max_bubble_length)
+            bubbles += max(0, len(popped) - 1)
+            changed += popped
+        for changed_node in changed:
+            for nearby in _neighbourhood(graph, changed_node, reach):
+                if nearby not in queued:
+                    queued.add(nearby)
+                    worklist.append(nearby)
+    graph.clear_unitigs()
+    return tips, bubbles
+
+'''Clip the tips of a graph in place (see simplify)
+Input: DeBruijnGraph graph; INT max_length, the longest tip to clip (default 2k)
+Output: INT the number of tips clipped
+'''
+def clip_tips(graph, max_length=None):
+    return simplify(graph, max_length, 0)[0]
+
+'''Pop the bubbles of a graph in place (see simplify)
+Input: DeBruijnGraph graph; INT max_length, the longest bubble path to remove (default 2k)
+Output: INT the number of bubbles popped
+'''
+def pop_bubbles(graph, max_length=None):
+    return simplify(graph, 0, max_length)[1]
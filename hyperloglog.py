@@ -0,0 +1,87 @@
+"""Description: Class for a HyperLogLog sketch (Flajolet et al., 2007) that estimates the number of distinct k-mers in a
+stream in a fixed, small amount of memory, so that the bloom filters and the k-mer table can be sized for the k-mers that
+will actually go into them before anything is built.
+Each k-mer is hashed; the top bits of the hash pick one of 2^precision registers and the register keeps the longest run of
+leading zeros seen in the rest of the hash. With 2^14 one-byte registers (16 KB) the standard error is about 0.8%.
+"""
+import math
+import numpy as np
+from bloom_filter import hash64 # import the stable hash from bloom_filter.py
+from kmers import iter_kmer_arrays # import the k-mer encoding from kmers.py
+
+# default number of index bits, 2^14 registers
+DEFAULT_PRECISION = 14
+
+
+''' Number of leading zero bits of each value in an array of 64-bit words
+Input: NUMPY ARRAY words (uint64), none of them 0
+Output: NUMPY ARRAY (int64) of counts
+'''
+def _leading_zeros(words):
+    high = (words >> np.uint64(32)).astype(np.float64)
+    low = (words & np.uint64(0xffffffff)).astype(np.float64)
+    # 32-bit halves convert to floats exactly, so the exponent frexp returns is the position of the highest set bit
+    high_exponent = np.frexp(high)[1]
+    low_exponent = np.frexp(low)[1]
+    return np.where(high_exponent > 0, 32 - high_exponent, 64 - low_exponent).astype(np.int64)
+
+
+""" Class for HyperLogLog object
+"""
+class HyperLogLog:
+    """Initialize an empty sketch
+    Input: INT precision, the number of hash bits used to pick a register (between 4 and 18; the standard error is
+            about 1.04 / sqrt(2^precision)); INT seed, the hash seed (only sketches with the same seed can be merged)
+    Output: HyperLogLog object"""
+    def __init__(self, precision=DEFAULT_PRECISION, seed=0):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.seed = seed
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    """Add an array of k-mers (or any other 64-bit keys) to the sketch
+    Input: NUMPY ARRAY kmers (uint64)"""
+    def add_many(self, kmers):
+        if len(kmers) == 0:
+            return
+        h = hash64(kmers, self.seed)
+        index = (h >> np.uint64(64 - self.precision)).astype(np.intp)
+        # the rest of the hash, with a bit set just below it so that the run of zeros stops there
+        rest = (h << np.uint64(self.precision)) | np.uint64(1 << (self.precision - 1))
+        rank = (_leading_zeros(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    """Add everything counted by another sketch (built with the same precision and seed) to this one
+    Input: HyperLogLog other"""
+    def merge(self, other):
+        if (other.precision, other.seed) != (self.precision, self.seed):
+            raise ValueError("only sketches with the same precision and seed can be merged")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    """Estimate the number of distinct keys added so far
+    Output: FLOAT estimate"""
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        empty = int(np.count_nonzero(self.registers == 0))
+        # with few keys most registers are still empty and counting them (linear counting) is more accurate
+        if raw <= 2.5 * m and empty > 0:
+            return m * math.log(m / empty)
+        return float(raw)
+
+    def __len__(self):
+        return int(round(self.estimate()))
+
+
+'''Estimate the number of distinct k-mers in a set of reads in one streaming pass
+Input: ITERABLE reads, of sequence strings (or base code arrays); INT k, the k-mer length;
+        BOOL canonical, whether a k-mer and its reverse complement count as one; INT precision, see HyperLogLog
+Output: INT estimated number of distinct k-mers
+'''
+def estimate_distinct_kmers(reads, k, canonical=False, precision=DEFAULT_PRECISION):
+    sketch = HyperLogLog(precision)
+    for kmers in iter_kmer_arrays(reads, k, canonical):
+        sketch.add_many(kmers)
+    return len(sketch)
@@ -0,0 +1,243 @@
+"""Description: Functions for saving the search and assembly index (the bloom filter search tree, the k-mer counts and
+the de Bruijn graph) to a binary file and loading it back with np.memmap, so that queries can start without rebuilding
+anything and several processes can share the same pages of the file.
+
+File layout: an 8-byte magic string, the format version and the header length (uint32 each), a JSON header with the
+build parameters and the dtype, shape and offset of every array, and then the raw arrays, each aligned to 64 bytes.
+"""
+import collections.abc
+import json
+import os
+import numpy as np
+from bloom_filter_search_tree import BloomFilterSearchTree # import the search tree from bloom_filter_search_tree.py
+from de_bruijn_graph import DeBruijnGraph # import the graph from de_bruijn_graph.py
+from kmer_counter import KmerCounter # import the k-mer counting table from kmer_counter.py
+
+MAGIC = b"SAIDX\0\0\0"
+INDEX_VERSION = 2
+_ALIGNMENT = 64
+
+'''Pack a list of strings into one byte array plus the offset where each string starts
+Input: LIST strings
+Output: NUMPY ARRAY data (uint8); NUMPY ARRAY offsets (int64), with one more entry than there are strings
+'''
+def _pack_strings(strings):
+    encoded = [string.encode() for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(string) for string in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+"""Class for PackedStrings object: a read-only list of the strings packed by _pack_strings, which keeps the packed
+bytes and offsets (memory-mapped from the index file) and only decodes a string when it is looked up.
+"""
+class PackedStrings(collections.abc.Sequence):
+    """Initialize from packed strings
+    Input: NUMPY ARRAY data (uint8); NUMPY ARRAY offsets (int64), with one more entry than there are strings
+    Output: PackedStrings object"""
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("string index out of range")
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode()
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.abc.Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+
+"""Class for LeafReads object: the read IDs of each leaf of a loaded search tree, as a mapping from leaf node to its list
+of read IDs. The saved IDs stay packed (see PackedStrings) and a leaf's list is decoded when it is looked up; leaves
+added to the tree after loading are kept as ordinary lists.
+"""
+class LeafReads(collections.abc.Mapping):
+    """Initialize from the saved leaves
+    Input: NUMPY ARRAY leaf_nodes (int64, sorted); NUMPY ARRAY leaf_read_counts (int64), the number of reads of each
+            leaf; PackedStrings read_IDs, the read IDs of every leaf, in leaf order
+    Output: LeafReads object"""
+    def __init__(self, leaf_nodes, leaf_read_counts, read_IDs):
+        self.leaf_nodes = leaf_nodes
+        self.read_IDs = read_IDs
+        # where each leaf's read IDs start in read_IDs
+        self._starts = np.zeros(len(leaf_read_counts) + 1, dtype=np.int64)
+        np.cumsum(leaf_read_counts, out=self._starts[1:])
+        self._added = {}
+
+    def _saved_index(self, leaf):
+        index = int(np.searchsorted(self.leaf_nodes, leaf))
+        if index < len(self.leaf_nodes) and self.leaf_nodes[index] == leaf:
+            return index
+        return None
+
+    def __getitem__(self, leaf):
+        if leaf in self._added:
+            return self._added[leaf]
+        index = self._saved_index(leaf)
+        if index is None:
+            raise KeyError(leaf)
+        return self.read_IDs[int(self._starts[index]):int(self._starts[index + 1])]
+
+    def __setitem__(self, leaf, read_IDs):
+        if self._saved_index(leaf) is not None:
+            raise ValueError("leaf " + str(leaf) + " was loaded from the index and can't be replaced")
+        self._added[leaf] = read_IDs
+
+    def __contains__(self, leaf):
+        return leaf in self._added or self._saved_index(leaf) is not None
+
+    def __iter__(self):
+        yield from self.leaf_nodes.tolist()
+        yield from self._added
+
+    def __len__(self):
+        return len(self.leaf_nodes) + len(self._added)
+
+'''Save an index to a file
+Input: STRING file_name; BloomFilterSearchTree search_tree; DeBruijnGraph graph (compacted or not)
+'''
+def save_index(file_name, search_tree, graph):
+    if search_tree.k != graph.k:
+        raise ValueError("the search tree and the graph were built with different k-mer lengths")
+    if search_tree.canonical != graph.canonical:
+        raise ValueError("only one of the search tree and the graph uses canonical k-mers")
+    search_tree.flush()
+    parameters = {
+        "k": search_tree.k,
+        "array_size": search_tree.array_size,
+        "num_hash_functions": search_tree.num_hash_functions,
+        "seed": search_tree.seed,
+        "reads_per_leaf": search_tree.reads_per_leaf,
+        "root": search_tree.root,
+        "num_reads": search_tree.num_reads,
+        "min_kmer_count": search_tree.min_kmer_count,
+        "canonical": search_tree.canonical,
+        "compacted": graph.unitigs is not None
+    }
+    # the read IDs of every leaf, in leaf order; IDs are stored as strings
+    leaf_nodes = sorted(search_tree.leaf_reads)
+    leaf_read_counts = [len(search_tree.leaf_reads[leaf]) for leaf in leaf_nodes]
+    read_ID_data, read_ID_offsets = _pack_strings([str(read_ID) for leaf in leaf_nodes
+                                                   for read_ID in search_tree.leaf_reads[leaf]])
+    arrays = {
+        "tree_filters": search_tree.filters[:search_tree.words_used],
+        "tree_offsets": np.array(search_tree.offsets, dtype=np.int64),
+        "tree_sizes": np.array(search_tree.sizes, dtype=np.int64),
+        "tree_left": np.array(search_tree.left, dtype=np.int64),
+        "tree_right": np.array(search_tree.right, dtype=np.int64),
+        "tree_parent": np.array(search_tree.parent, dtype=np.int64),
+        "leaf_nodes": np.array(leaf_nodes, dtype=np.int64),
+        "leaf_read_counts": np.array(leaf_read_counts, dtype=np.int64),
+        "read_ID_data": read_ID_data,
+        "read_ID_offsets": read_ID_offsets,
+        "kmers": graph.kmer_table.kmers,
+        "kmer_counts": graph.kmer_table.counts,
+        "graph_nodes": graph.nodes,
+        "graph_edges": graph.edges
+    }
+    if search_tree.abundance is not None:
+        arrays["tree_abundance"] = search_tree.abundance.array
+    if graph.unitigs is not None:
+        arrays["unitig_data"], arrays["unitig_offsets"] = _pack_strings(graph.unitigs)
+        arrays["unitig_is_cycle"] = np.array(graph._unitig_is_cycle, dtype=bool)
+        arrays["index_kmers"] = graph._index_kmers
+        arrays["index_unitigs"] = graph._index_unitigs
+        arrays["index_offsets"] = graph._index_offsets
+
+    # lay the arrays out one after another, each starting on an aligned offset (relative to the start of the data)
+    table = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        table[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+    header = json.dumps({"parameters": parameters, "arrays": table}).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // _ALIGNMENT) * _ALIGNMENT
+    # write a new file and move it into place, since the arrays may be mapped from the file being replaced (when a
+    # loaded index is saved again) and those mappings must keep seeing the old file
+    temp_name = file_name + ".tmp"
+    try:
+        with open(temp_name, "wb") as file:
+            file.write(MAGIC)
+            file.write(np.array([INDEX_VERSION, len(header)], dtype="<u4").tobytes())
+            file.write(header)
+            for name, array in arrays.items():
+                file.seek(data_start + table[name]["offset"])
+                file.write(array.tobytes())
+            file.truncate(data_start + offset)
+        os.replace(temp_name, file_name)
+    finally:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+
+'''Load an index saved by save_index. The arrays are memory-mapped copy-on-write, so the file's pages are read
+on demand and shared with every other process that has it open, and changes made in memory never reach the file.
+Input: STRING file_name
+Output: BloomFilterSearchTree search_tree; DeBruijnGraph graph
+'''
+def load_index(file_name):
+    with open(file_name, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(file_name + " is not an index file")
+        version, header_length = np.frombuffer(file.read(8), dtype="<u4").tolist()
+        if version != INDEX_VERSION:
+            raise ValueError(file_name + " has index format version " + str(version) +
+                             ", expected version " + str(INDEX_VERSION))
+        header = json.loads(file.read(header_length))
+    parameters = header["parameters"]
+    data_start = -(-(len(MAGIC) + 8 + header_length) // _ALIGNMENT) * _ALIGNMENT
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        shape = tuple(entry["shape"])
+        if np.prod(shape) == 0: # empty arrays can't be memory-mapped
+            arrays[name] = np.zeros(shape, dtype=entry["dtype"])
+        else:
+            arrays[name] = np.memmap(file_name, dtype=entry["dtype"], mode="c", offset=data_start + entry["offset"],
+                                     shape=shape)
+
+    k = parameters["k"]
+    canonical = parameters.get("canonical", False)
+    search_tree = BloomFilterSearchTree(k, parameters["array_size"], parameters["num_hash_functions"],
+                                        parameters["reads_per_leaf"], parameters["seed"],
+                                        parameters.get("min_kmer_count", 1), canonical)
+    search_tree.filters = arrays["tree_filters"]
+    search_tree.words_used = len(arrays["tree_filters"])
+    search_tree.offsets = arrays["tree_offsets"].tolist()
+    search_tree.sizes = arrays["tree_sizes"].tolist()
+    search_tree.num_nodes = len(search_tree.sizes)
+    search_tree.left = arrays["tree_left"].tolist()
+    search_tree.right = arrays["tree_right"].tolist()
+    search_tree.parent = arrays["tree_parent"].tolist()
+    if search_tree.abundance is not None:
+        search_tree.abundance.array = arrays["tree_abundance"]
+    search_tree.root = parameters["root"]
+    search_tree.num_reads = parameters["num_reads"]
+    # the read IDs and unitigs stay packed in the mapped file and are decoded one at a time when they are looked up
+    search_tree.leaf_reads = LeafReads(arrays["leaf_nodes"], arrays["leaf_read_counts"],
+                                       PackedStrings(arrays["read_ID_data"], arrays["read_ID_offsets"]))
+
+    kmer_table = KmerCounter(k)
+    kmer_table._kmers = arrays["kmers"]
+    kmer_table._counts = arrays["kmer_counts"]
+    # an empty table gives an empty graph, whose nodes and edges are then replaced by the saved ones
+    graph = DeBruijnGraph(None, k, kmer_table=KmerCounter(k), canonical=canonical)
+    graph.kmer_table = kmer_table
+    graph.nodes = arrays["graph_nodes"]
+    graph.edges = arrays["graph_edges"]
+    if parameters["compacted"]:
+        graph.unitigs = PackedStrings(arrays["unitig_data"], arrays["unitig_offsets"])
+        graph._unitig_is_cycle = arrays["unitig_is_cycle"].tolist()
+        graph._index_kmers = arrays["index_kmers"]
+        graph._index_unitigs = arrays["index_unitigs"]
+        graph._index_offsets = arrays["index_offsets"]
+    return search_tree, graph
@@ -0,0 +1,214 @@
+"""Description: Functions for measuring where a run spends its time and memory.
+Code is split into named stages with `with instrumentation.stage("name"):`, and counts (reads parsed, k-mers inserted,
+traversal steps...) and gauges (filter fill ratio, graph size...) are recorded along the way. Instrumentation is off
+until enable() is called; while it is off, stage() hands back one shared do-nothing context and count()/gauge() return
+straight away, so the calls can stay in the code at close to no cost.
+For each stage the report has the number of calls, the total time and the peak resident set size at its end, and
+optionally a cProfile summary or the tracemalloc peak of the allocations made inside it. The report can be written as
+JSON or in the Prometheus text format. cProfile, pstats and tracemalloc are only imported once a stage is profiled, so
+that importing this module (which every part of the program does) doesn't slow down the start of a run.
+"""
+import contextlib
+import io
+import json
+import sys
+import time
+try:
+    import resource # not available on Windows
+except ImportError:
+    resource = None
+
+# the metrics being collected, or None while instrumentation is off
+_metrics = None
+# what stage() returns while instrumentation is off
+_NULL_STAGE = contextlib.nullcontext()
+# number of functions listed in the cProfile summary of each stage
+PROFILE_LINES = 15
+
+'''Peak resident set size of this process so far
+Output: INT bytes (0 where the platform can't tell)
+'''
+def peak_rss():
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+"""Class for the metrics of one run.
+"""
+class Metrics:
+    """Initialize the metrics
+    Input: STRING profile, None, "cprofile" (profile the functions called in each stage) or "tracemalloc" (measure the
+            peak memory allocated in each stage); both slow the run down
+    Output: Metrics object"""
+    def __init__(self, profile=None):
+        if profile not in (None, "cprofile", "tracemalloc"):
+            raise ValueError("profile must be None, 'cprofile' or 'tracemalloc'")
+        self.profile = profile
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.profiles = {}
+        # stages that are currently running, innermost last; only the outermost one is profiled
+        self._active = []
+
+    """Record a finished stage
+    Input: STRING name; FLOAT seconds; INT traced_peak, the tracemalloc peak (None if not measured)"""
+    def add_stage(self, name, seconds, traced_peak=None):
+        entry = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "peak_rss_bytes": 0})
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        entry["peak_rss_bytes"] = peak_rss()
+        if traced_peak is not None:
+            entry["traced_peak_bytes"] = max(entry.get("traced_peak_bytes", 0), traced_peak)
+
+    """The metrics as a dictionary
+    Output: DICT report"""
+    def report(self):
+        report = {"stages": self.stages, "counters": self.counters, "gauges": self.gauges, "peak_rss_bytes": peak_rss()}
+        if self.profiles:
+            report["profiles"] = {name: _profile_summary(profile) for name, profile in self.profiles.items()}
+        return report
+
+
+"""Class for a running stage: times it and, if asked, profiles it.
+"""
+class _Stage:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.profiler = None
+        self.traced = False
+
+    def __enter__(self):
+        outermost = not self.metrics._active
+        self.metrics._active.append(self.name)
+        if outermost and self.metrics.profile == "cprofile":
+            import cProfile # the profiler, only loaded when a stage is profiled
+            self.profiler = self.metrics.profiles.setdefault(self.name, cProfile.Profile())
+            self.profiler.enable()
+        elif outermost and self.metrics.profile == "tracemalloc":
+            import tracemalloc # only loaded when a stage's allocations are measured
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.traced = True
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        traced_peak = None
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.traced:
+            import tracemalloc
+            traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.metrics._active.pop()
+        self.metrics.add_stage(self.name, seconds, traced_peak)
+        return False
+
+'''Summarize a stage's profile as the functions with the most cumulative time
+Input: cProfile.Profile profile
+Output: STRING summary
+'''
+def _profile_summary(profile):
+    import pstats # the profile statistics, only loaded when there are profiles to summarize
+    output = io.StringIO()
+    pstats.Stats(profile, stream=output).sort_stats("cumulative").print_stats(PROFILE_LINES)
+    return output.getvalue()
+
+'''Turn instrumentation on, starting a new set of metrics
+Input: STRING profile, None, "cprofile" or "tracemalloc" (see Metrics)
+Output: Metrics object
+'''
+def enable(profile=None):
+    global _metrics
+    _metrics = Metrics(profile)
+    return _metrics
+
+'''Turn instrumentation off
+Output: Metrics object, the metrics collected since enable() (None if it was off)
+'''
+def disable():
+    global _metrics
+    metrics, _metrics = _metrics, None
+    return metrics
+
+'''Check if instrumentation is on
+Output: BOOL
+'''
+def enabled():
+    return _metrics is not None
+
+'''Time a block of code as a named stage: `with stage("graph_build"): ...`
+Input: STRING name
+Output: context manager
+'''
+def stage(name):
+    if _metrics is None:
+        return _NULL_STAGE
+    return _Stage(_metrics, name)
+
+'''Add to a counter
+Input: STRING name; INT value
+'''
+def count(name, value=1):
+    if _metrics is None:
+        return
+    _metrics.counters[name] = _metrics.counters.get(name, 0) + value
+
+'''Set a gauge, a measurement that is replaced rather than added up (like a fill ratio)
+Input: STRING name; FLOAT value
+'''
+def gauge(name, value):
+    if _metrics is None:
+        return
+    _metrics.gauges[name] = value
+
+'''The metrics collected so far
+Output: DICT report (empty if instrumentation is off)
+'''
+def report():
+    return _metrics.report() if _metrics is not None else {}
+
+'''Format a report in the Prometheus text exposition format
+Input: DICT report; STRING prefix, put in front of every metric name
+Output: STRING
+'''
+def prometheus_text(report, prefix="search_"):
+    lines = []
+    def add(name, kind, samples):
+        lines.append("# TYPE " + prefix + name + " " + kind)
+        for labels, value in samples:
+            lines.append(prefix + name + labels + " " + repr(float(value)))
+    stages = report.get("stages", {})
+    if stages:
+        add("stage_calls_total", "counter", [('{stage="' + name + '"}', entry["calls"]) for name, entry in stages.items()])
+        add("stage_seconds_total", "counter", [('{stage="' + name + '"}', entry["seconds"]) for name, entry in stages.items()])
+    for name, value in report.get("counters", {}).items():
+        add(_metric_name(name) + "_total", "counter", [("", value)])
+    for name, value in report.get("gauges", {}).items():
+        add(_metric_name(name), "gauge", [("", value)])
+    if "peak_rss_bytes" in report:
+        add("peak_rss_bytes", "gauge", [("", report["peak_rss_bytes"])])
+    return "\n".join(lines) + "\n"
+
+def _metric_name(name):
+    return "".join(character if character.isalnum() else "_" for character in name)
+
+'''Write the metrics collected so far to a file
+Input: STRING file_name; STRING format, "json" or "prometheus" (by default, "prometheus" if the file name ends in .prom)
+'''
+def write_report(file_name, format=None):
+    if format is None:
+        format = "prometheus" if file_name.endswith(".prom") else "json"
+    with open(file_name, "w") as file:
+        if format == "prometheus":
+            file.write(prometheus_text(report()))
+        elif format == "json":
+            json.dump(report(), file, indent=2)
+        else:
+            raise ValueError("format must be 'json' or 'prometheus'")
@@ -0,0 +1,163 @@
+"""Description: Class for counting 2-bit encoded k-mers (see kmers.py) in NumPy arrays.
+The counts are kept as a sorted uint64 array of distinct k-mers next to a uint32 array of counts,
+about 12 bytes per distinct k-mer, and looked up with a binary search.
+"""
+import numpy as np
+import instrumentation # import the counters from instrumentation.py
+
+'''Combine two sets of (k-mer, count) arrays, adding up the counts of k-mers found in both. The k-mers of the second set
+are looked up in the first with a binary search and the new ones inserted in place, so merging a small batch into a large
+table costs a copy of the table rather than a sort.
+Input: NUMPY ARRAYS kmers_a, counts_a, kmers_b, counts_b (each set of k-mers sorted and distinct)
+Output: NUMPY ARRAY kmers (uint64, sorted and distinct); NUMPY ARRAY counts (uint32)
+'''
+def merge_counts(kmers_a, counts_a, kmers_b, counts_b):
+    positions = np.searchsorted(kmers_a, kmers_b)
+    found = positions < len(kmers_a)
+    found[found] = kmers_a[positions[found]] == kmers_b[found]
+    counts = counts_a.astype(np.uint32) # a copy, so the table's old array (which may be memory-mapped) is left alone
+    counts[positions[found]] += counts_b[found].astype(np.uint32)
+    new = ~found
+    return (np.insert(kmers_a, positions[new], kmers_b[new]).astype(np.uint64, copy=False),
+            np.insert(counts, positions[new], counts_b[new]).astype(np.uint32, copy=False))
+
+
+"""Class for KmerCounter object. K-mers are added in batches; each batch is buffered and, once enough k-mers are waiting,
+they are counted with a sort and merged into the table. Given a capacity (such as an estimate from hyperloglog.py), the
+table is allocated once, as two pairs of arrays that each merge writes from one into the other, instead of being copied
+into new arrays at every merge; it only grows if more distinct k-mers than that turn up. The arrays returned by kmers
+and counts are then overwritten by later merges, so copy them if the counter is still being added to.
+"""
+class KmerCounter:
+    """Initialize the k-mer counter
+    Input: INT k, the k-mer length; INT buffer_size, how many k-mers to collect before merging them into the table;
+            INT capacity, the number of distinct k-mers to allocate the table for up front (0 to grow it as needed)
+    Output: KmerCounter object"""
+    def __init__(self, k, buffer_size=1 << 22, capacity=0):
+        self.k = k
+        self.buffer_size = buffer_size
+        self.capacity = capacity
+        # number of times a table allocated up front turned out to be too small
+        self.reallocations = 0
+        # sorted distinct k-mers and their counts (views of the front of self._tables[self._current] if preallocated)
+        self._kmers = np.zeros(0, dtype=np.uint64)
+        self._counts = np.zeros(0, dtype=np.uint32)
+        self._tables = [(np.zeros(capacity, dtype=np.uint64), np.zeros(capacity, dtype=np.uint32)) for _ in range(2)]
+        self._current = 0
+        # k-mers that have been added but not yet counted
+        self._pending = []
+        self._pending_size = 0
+
+    """Add a batch of k-mers to the counter
+    Input: NUMPY ARRAY kmers (uint64)"""
+    def add(self, kmers):
+        if len(kmers) == 0:
+            return
+        self._pending.append(np.asarray(kmers, dtype=np.uint64))
+        self._pending_size += len(kmers)
+        if self._pending_size >= self.buffer_size:
+            self._flush()
+
+    """Count the buffered k-mers and merge them into the table"""
+    def _flush(self):
+        if not self._pending:
+            return
+        batch_kmers, batch_counts = np.unique(np.concatenate(self._pending), return_counts=True)
+        self._pending = []
+        self._pending_size = 0
+        self._merge(batch_kmers, batch_counts)
+
+    """Merge counted k-mers into the table, writing into the preallocated arrays if there are any
+    Input: NUMPY ARRAY kmers (uint64, sorted and distinct); NUMPY ARRAY counts (uint32)"""
+    def _merge(self, kmers, counts):
+        if not self.capacity:
+            self._kmers, self._counts = merge_counts(self._kmers, self._counts, kmers, counts)
+            return
+        counts = counts.astype(np.uint32, copy=False)
+        positions = np.searchsorted(self._kmers, kmers)
+        found = positions < len(self._kmers)
+        found[found] = self._kmers[positions[found]] == kmers[found]
+        new = ~found
+        num_new = int(np.count_nonzero(new))
+        size = len(self._kmers) + num_new
+        if size > self.capacity:
+            self.capacity = max(size, self.capacity + self.capacity // 4)
+            self.reallocations += 1
+            instrumentation.count("kmer_table_reallocations")
+        target = 1 - self._current
+        if len(self._tables[target][0]) < self.capacity:
+            self._tables[target] = (np.zeros(self.capacity, dtype=np.uint64), np.zeros(self.capacity, dtype=np.uint32))
+        out_kmers = self._tables[target][0][:size]
+        out_counts = self._tables[target][1][:size]
+        # each new k-mer lands after the old ones that sort before it and the new ones before it in the batch
+        is_new = np.zeros(size, dtype=bool)
+        new_slots = positions[new] + np.arange(num_new)
+        is_new[new_slots] = True
+        out_kmers[is_new] = kmers[new]
+        out_counts[is_new] = counts[new]
+        out_kmers[~is_new] = self._kmers
+        out_counts[~is_new] = self._counts
+        # an old k-mer moves right by the number of new k-mers inserted before it
+        old_positions = positions[found]
+        out_counts[old_positions + np.searchsorted(positions[new], old_positions, side="right")] += counts[found]
+        self._kmers, self._counts = out_kmers, out_counts
+        self._current = target
+
+    """Add k-mers that have already been counted (for example by another process) to the table
+    Input: NUMPY ARRAY kmers (uint64, sorted and distinct); NUMPY ARRAY counts, the count of each k-mer"""
+    def add_counts(self, kmers, counts):
+        self._flush()
+        self._merge(np.asarray(kmers, dtype=np.uint64), np.asarray(counts, dtype=np.uint32))
+
+    """Add all of the counts from another counter (built with the same k) to this one
+    Input: KmerCounter other"""
+    def merge(self, other):
+        self.add_counts(other.kmers, other.counts)
+
+    """Drop every k-mer that was seen fewer than min_count times (likely sequencing errors)
+    Input: INT min_count"""
+    def apply_threshold(self, min_count):
+        self._flush()
+        keep = self._counts >= min_count
+        self._kmers = self._kmers[keep]
+        self._counts = self._counts[keep]
+
+    """The distinct k-mers, sorted
+    Output: NUMPY ARRAY (uint64)"""
+    @property
+    def kmers(self):
+        self._flush()
+        return self._kmers
+
+    """The count of each k-mer in self.kmers
+    Output: NUMPY ARRAY (uint32)"""
+    @property
+    def counts(self):
+        self._flush()
+        return self._counts
+
+    """Look up the counts for an array of k-mers
+    Input: NUMPY ARRAY kmers (uint64)
+    Output: NUMPY ARRAY (uint32) of counts, 0 for k-mers that were never added"""
+    def count_many(self, kmers):
+        kmers = np.asarray(kmers, dtype=np.uint64)
+        table = self.kmers
+        if len(table) == 0:
+            return np.zeros(len(kmers), dtype=np.uint32)
+        index = np.searchsorted(table, kmers)
+        index[index == len(table)] = 0 # keep the index in range; these are misses anyway
+        return np.where(table[index] == kmers, self._counts[index], 0).astype(np.uint32)
+
+    """Number of k-mers with each count (the k-mer abundance spectrum)
+    Output: NUMPY ARRAY histogram, where histogram[c] is the number of distinct k-mers seen c times"""
+    def histogram(self):
+        return np.bincount(self.counts)
+
+    def __len__(self):
+        return len(self.kmers)
+
+    def __getitem__(self, kmer):
+        return int(self.count_many(np.array([kmer], dtype=np.uint64))[0])
+
+    def __contains__(self, kmer):
+        return self[kmer] > 0
@@ -0,0 +1,143 @@
+"""Description: Functions for encoding DNA sequences and their k-mers as 2-bit packed integers.
+Each base takes two bits (A=0, C=1, G=2, T=3), so any k-mer with k <= 32 fits in one uint64
+and whole sets of k-mers can be stored and hashed as NumPy arrays instead of Python strings.
+"""
+import numpy as np
+
+# largest k-mer that fits in a 64-bit integer
+MAX_K = 32
+# code given to anything that isn't A, C, G or T (N, IUPAC codes, read separators...)
+INVALID = 4
+
+# lookup table from ASCII byte to 2-bit code (lower case bases are accepted as well)
+_ENCODE_TABLE = np.full(256, INVALID, dtype=np.uint8)
+for _code, _base in enumerate("ACGT"):
+    _ENCODE_TABLE[ord(_base)] = _code
+    _ENCODE_TABLE[ord(_base.lower())] = _code
+_DECODE_TABLE = "ACGT"
+# complement of each base, for reverse complementing sequence strings
+_COMPLEMENT_TABLE = str.maketrans("ACGTacgt", "TGCAtgca")
+
+'''Encode a sequence into an array of base codes
+Input: STRING seq
+Output: NUMPY ARRAY (uint8) with one code per base, INVALID for anything that isn't A, C, G or T
+'''
+def encode(seq):
+    return _ENCODE_TABLE[np.frombuffer(seq.encode("ascii"), dtype=np.uint8)]
+
+'''Encode a single k-mer into a 2-bit packed integer
+Input: STRING kmer, of length at most MAX_K and containing only A, C, G and T
+Output: INTEGER value
+'''
+def encode_kmer(kmer):
+    if len(kmer) > MAX_K:
+        raise ValueError("k-mers longer than " + str(MAX_K) + " do not fit in 64 bits")
+    value = 0
+    for code in encode(kmer).tolist():
+        if code == INVALID:
+            raise ValueError("k-mer " + kmer + " contains a base other than A, C, G or T")
+        value = (value << 2) | code
+    return value
+
+'''Decode a 2-bit packed integer back into the k-mer string
+Input: INTEGER value; INT k, the k-mer length
+Output: STRING kmer
+'''
+def decode_kmer(value, k):
+    value = int(value)
+    bases = []
+    for _ in range(k):
+        bases.append(_DECODE_TABLE[value & 3])
+        value >>= 2
+    return "".join(reversed(bases))
+
+'''Reverse complement an array of 2-bit packed k-mers
+Input: NUMPY ARRAY kmers (uint64); INT k, the k-mer length
+Output: NUMPY ARRAY (uint64) of the reverse complement k-mers
+'''
+def reverse_complement_kmers(kmers, k):
+    x = ~np.asarray(kmers, dtype=np.uint64) # complementing a base is 3 - code, which is flipping both of its bits
+    # reverse the order of the 2-bit groups by swapping neighbours at every scale
+    x = ((x >> np.uint64(2)) & np.uint64(0x3333333333333333)) | ((x & np.uint64(0x3333333333333333)) << np.uint64(2))
+    x = ((x >> np.uint64(4)) & np.uint64(0x0F0F0F0F0F0F0F0F)) | ((x & np.uint64(0x0F0F0F0F0F0F0F0F)) << np.uint64(4))
+    x = ((x >> np.uint64(8)) & np.uint64(0x00FF00FF00FF00FF)) | ((x & np.uint64(0x00FF00FF00FF00FF)) << np.uint64(8))
+    x = ((x >> np.uint64(16)) & np.uint64(0x0000FFFF0000FFFF)) | ((x & np.uint64(0x0000FFFF0000FFFF)) << np.uint64(16))
+    x = (x >> np.uint64(32)) | (x << np.uint64(32))
+    # the k-mer now sits in the high bits
+    return x >> np.uint64(64 - 2 * k)
+
+'''Reverse complement a single 2-bit packed k-mer, with the same bit swaps as reverse_complement_kmers
+Input: INTEGER value; INT k, the k-mer length
+Output: INTEGER value of the reverse complement k-mer
+'''
+def reverse_complement_kmer(value, k):
+    x = ~int(value) & 0xFFFFFFFFFFFFFFFF
+    x = ((x >> 2) & 0x3333333333333333) | ((x & 0x3333333333333333) << 2)
+    x = ((x >> 4) & 0x0F0F0F0F0F0F0F0F) | ((x & 0x0F0F0F0F0F0F0F0F) << 4)
+    x = ((x >> 8) & 0x00FF00FF00FF00FF) | ((x & 0x00FF00FF00FF00FF) << 8)
+    x = ((x >> 16) & 0x0000FFFF0000FFFF) | ((x & 0x0000FFFF0000FFFF) << 16)
+    x = (x >> 32) | ((x << 32) & 0xFFFFFFFFFFFFFFFF)
+    return x >> (64 - 2 * k)
+
+'''Reverse complement a sequence string
+Input: STRING seq
+Output: STRING, the sequence of the other strand read in its own 5' to 3' direction
+'''
+def reverse_complement(seq):
+    return seq.translate(_COMPLEMENT_TABLE)[::-1]
+
+'''Canonical form of an array of 2-bit packed k-mers: the smaller of the k-mer and its reverse complement,
+so that a k-mer and its reverse complement (the same DNA, read from the other strand) get the same value
+Input: NUMPY ARRAY kmers (uint64); INT k, the k-mer length
+Output: NUMPY ARRAY (uint64) of canonical k-mers
+'''
+def canonical_kmers(kmers, k):
+    kmers = np.asarray(kmers, dtype=np.uint64)
+    return np.minimum(kmers, reverse_complement_kmers(kmers, k))
+
+'''Get all of the k-mers of a sequence as 2-bit packed integers. Every window is built with the rolling update
+x = (x << 2) | base, applied to all of the windows at once, and the reverse complement is rolled in from the
+other end at the same time when canonical k-mers are wanted. Windows that contain a base other than A, C, G or T are skipped.
+Input: STRING or NUMPY ARRAY seq, the sequence or its base codes (output of encode); INT k, the k-mer length;
+        BOOL canonical, whether to return each k-mer as the minimum of itself and its reverse complement;
+        BOOL return_positions, whether to also return where each k-mer starts in the sequence
+Output: NUMPY ARRAY (uint64) of k-mers in the order they appear in the sequence
+        (and NUMPY ARRAY (int64) of their start positions, if return_positions is True)
+'''
+def kmer_array(seq, k, canonical=False, return_positions=False):
+    if not 0 < k <= MAX_K:
+        raise ValueError("k must be between 1 and " + str(MAX_K))
+    codes = encode(seq) if isinstance(seq, str) else seq
+    num_windows = len(codes) - k + 1
+    if num_windows <= 0:
+        if return_positions:
+            return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+        return np.zeros(0, dtype=np.uint64)
+    # a window is valid if it has no invalid bases, which can be read off a running count of them
+    invalid_count = np.concatenate(([0], np.cumsum(codes == INVALID)))
+    valid = invalid_count[k:] == invalid_count[:num_windows]
+    bases = (codes & 3).astype(np.uint64)
+    forward = np.zeros(num_windows, dtype=np.uint64)
+    reverse = np.zeros(num_windows, dtype=np.uint64)
+    top_shift = np.uint64(2 * (k - 1))
+    for offset in range(k):
+        window_bases = bases[offset:offset + num_windows]
+        forward = (forward << np.uint64(2)) | window_bases
+        if canonical:
+            # the complement of each new base goes in at the most significant end of the reverse complement
+            reverse = (reverse >> np.uint64(2)) | ((np.uint64(3) - window_bases) << top_shift)
+    if canonical:
+        forward = np.minimum(forward, reverse)
+    if return_positions:
+        return forward[valid], np.flatnonzero(valid)
+    return forward[valid]
+
+'''Generate the k-mers of each read in turn, so that a read set can be streamed without building a
+string for every k-mer
+Input: ITERABLE reads, of sequence strings (or base code arrays); INT k, the k-mer length;
+        BOOL canonical, whether to return canonical k-mers
+Output: GENERATOR of NUMPY ARRAYS (uint64), the k-mers of one read at a time
+'''
+def iter_kmer_arrays(reads, k, canonical=False):
+    for seq in reads:
+        yield kmer_array(seq, k, canonical)
@@ -14,68 +14,152 @@ structure that can be used to assess if a given query exists in the set of reads
 """
 
 # Import statements
-import matplotlib.pyplot as plt 
-import numpy as np
-import time
-import random
-import math
-import pandas as pd
-import unittest
-import reading_input # import functions from read_input.py
-from bloom_filter import * # import functions from bloom_filter.py
-from bloom_filter_search_tree import * # import functions from bloom_filter_search_tree.py
-from de_bruijn_graph import *
+# only the standard library is imported up front, so that the program starts quickly (and --help answers at once);
+# the pipeline modules are imported in main(), and matplotlib only for --explore
+import argparse
+import os
+
+'''Parse the command line
+Input: LIST argv, the arguments (None to use sys.argv)
+Output: argparse.Namespace args
+'''
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Search a set of sequencing reads for query sequences and assemble "
+                                                 "the longest contig containing each one.")
+    parser.add_argument("--reads", default="READS_example.fasta",
+                        help="FASTA or FASTQ file with the sequencing reads, optionally gzipped (default: %(default)s)")
+    parser.add_argument("--queries", default="QUERY_example.fasta",
+                        help="FASTA file with the query sequences (default: %(default)s)")
+    parser.add_argument("--fpr", type=float, default=0.0001,
+                        help="target false positive rate of the bloom filters (default: %(default)s)")
+    parser.add_argument("-k", type=int, default=20, help="k-mer length (default: %(default)s)")
+    parser.add_argument("--reads-per-leaf", type=int,
+                        help="reads binned together into each leaf of the bloom filter search tree (default: 32)")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="worker processes used to build the index and answer the queries (default: %(default)s)")
+    parser.add_argument("--output", help="write the contigs to this FASTA file instead of printing them")
+    parser.add_argument("--targeted", action="store_true",
+                        help="build one de Bruijn graph per query from the reads that share minimizers with it, "
+                             "instead of one graph of all of the reads")
+    parser.add_argument("--max-rounds", type=int,
+                        help="with --targeted, the most times a query's set of reads is grown (default: until no "
+                             "new reads are found)")
+    parser.add_argument("--canonical", action="store_true",
+                        help="treat a k-mer and its reverse complement as the same (reads from both strands)")
+    parser.add_argument("--simplify", action="store_true", help="clip tips and pop bubbles in the graph")
+    parser.add_argument("--correct-errors", action="store_true",
+                        help="trim the reads to their solid k-mers before building the whole-read-set graph")
+    parser.add_argument("--min-score", type=float, default=1.0,
+                        help="fraction of a query's k-mers that have to be in the reads (default: %(default)s)")
+    parser.add_argument("--min-kmer-count", type=int, default=1,
+                        help="k-mers seen in the reads fewer times than this are treated as errors when a query is "
+                             "checked (default: %(default)s)")
+    parser.add_argument("--index", help="load the index from this file (saved with --save-index) instead of the reads")
+    parser.add_argument("--save-index", help="save the index to this file after the queries are answered")
+    parser.add_argument("--serve", action="store_true",
+                        help="keep the index in memory and answer queries sent over HTTP (see query_server.py) "
+                             "instead of reading them from --queries")
+    parser.add_argument("--host", default="127.0.0.1", help="address the server listens on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8765, help="port the server listens on (default: %(default)s)")
+    parser.add_argument("--socket", help="Unix socket the server listens on, instead of the port")
+    parser.add_argument("--stats", help="write read-set statistics (read lengths and N50, GC content, duplicate reads "
+                                        "and the k-mer spectrum) to this JSON file, from one streaming pass over --reads")
+    parser.add_argument("--explore", action="store_true",
+                        help="also plot the read-set statistics and the bloom filter parameters (needs matplotlib)")
+    parser.add_argument("--plot-dir", default=".", help="directory for the --explore plots (default: %(default)s)")
+    parser.add_argument("--metrics", help="write the time and memory of each stage to this file (.json, or .prom "
+                                          "for the Prometheus text format)")
+    parser.add_argument("--profile", choices=["cprofile", "tracemalloc"],
+                        help="with --metrics, also profile each stage")
+    return parser.parse_args(argv)
 
 # main function driver code
-## TODO: include command line arguments so the end user can input their own files as well as specify their desired false positive rate, output directories, and whether or not to produce the exploration plots
-def main():
+'''Run the search and assembly
+Input: LIST argv, the command line arguments (None to use sys.argv)
+'''
+def main(argv=None):
+    args = parse_args(argv)
+    import instrumentation # import the stage timers and counters from instrumentation.py
+    import reading_input # import functions from read_input.py
+    from bloom_filter import get_m, get_k # import functions from bloom_filter.py
+    from hyperloglog import estimate_distinct_kmers # import the distinct k-mer estimate from hyperloglog.py
+    from query_session import QuerySession, load_session # import the query session from query_session.py
+    from bloom_filter_search_tree import DEFAULT_READS_PER_LEAF # import the default bin size from bloom_filter_search_tree.py
+    if args.metrics:
+        instrumentation.enable(args.profile)
+
     # READ INPUT
-    #reads_file_name = "test_fasta.txt"
-    reads_file_name = "READS_example.fasta" 
-    # call the read_reads function which returns the sequencing reads in a dictionary data structure
-    sequence_dict = reading_input.read_reads(reads_file_name)
-    
-    query_file_name = "QUERY_example.fasta"
-    # call the read_query function which returns the query sequence(s) in a dictionary data structure
-    query_dict = reading_input.read_query(query_file_name)
+    with instrumentation.stage("read_input"):
+        # call the read_query function which returns the query sequence(s) in a dictionary data structure
+        query_dict = reading_input.read_query(args.queries) if not args.serve else None
+        # the reads aren't loaded: the session streams them from the file each time it builds a structure
 
     # EXPLORE
-    # 1. look at the read count distribution
-    #reading_input.assess_read_count_distribution(sequence_dict) # produces bar plot
+    if args.stats or args.explore:
+        import read_stats # import the read-set statistics from read_stats.py
+        with instrumentation.stage("read_stats"):
+            read_set_stats = read_stats.read_set_stats(args.reads, args.k, args.canonical)
+        if args.stats:
+            read_set_stats.write_json(args.stats)
+        stats = read_set_stats.to_dict()
+    if args.explore:
+        import plotting # import the plots from plotting.py (this is what loads matplotlib)
+        # 1. look at the read duplication levels
+        plotting.plot_duplication_levels(stats, os.path.join(args.plot_dir, "read_count_dist_plot.pdf"))
+        # 2. look at the read length distribution
+        plotting.plot_read_lengths(stats, os.path.join(args.plot_dir, "read_length_dist_plot.pdf"))
+        # 3. look at the GC content and the k-mer spectrum
+        plotting.plot_gc_content(stats, os.path.join(args.plot_dir, "gc_content_plot.pdf"))
+        plotting.plot_kmer_spectrum(stats, os.path.join(args.plot_dir, "kmer_spectrum_plot.pdf"))
+        # 4. look at different false discovery rates at range of array sizes and number of hash functions, for the
+        # distinct k-mers that go into the root filter
+        plotting.evaluate_m(stats["distinct_kmers"], os.path.join(args.plot_dir, "FPR_array_size_plot.pdf"))
+        plotting.evaluate_k(stats["distinct_kmers"], os.path.join(args.plot_dir, "num_hash_array_size_plot.pdf"))
 
-    # 2. look at the read length distribution
-    #reading_input.assess_read_length_distribution(sequence_dict) #produces bar plot
-
-    ## CREATE BLOOM FILTER
-    # EXPLORE
-    # look at different false discovery rates at range of array sizes and number of hash functions
-    num_seq = len(sequence_dict) # get the number of sequences that will be added to the bloom filter
-    evaluate_m(num_seq)
-    evaluate_k(num_seq)
+    ## CREATE THE QUERY SESSION
+    # the bloom filter search tree is built from the reads the first time it is needed, and each query's contig is
+    # read off one graph of all of the reads (or, with --targeted, assembled from only the reads that share
+    # minimizers with it)
+    if args.index is not None:
+        session = load_session(args.index)
+        session.min_score = args.min_score
+    else:
+        # the filters hold k-mers, not reads: estimate how many distinct k-mers go into the root filter (and the
+        # k-mer table), allowing for about four standard errors of the estimate so that neither is undersized. Only
+        # the root is sized from the estimate; the tree sizes each leaf for the k-mers of its own bin of reads, and
+        # the internal nodes between them by depth
+        with instrumentation.stage("estimate_kmers"):
+            batches = (codes for _, codes in reading_input.read_batches(args.reads))
+            num_kmers = max(1, int(estimate_distinct_kmers(batches, args.k, args.canonical) * 1.03))
+        # get optimal array size of the root filter
+        array_size = get_m(num_kmers, args.fpr)
+        # get optimal number of hash functions (the same for every node, so that a query is hashed once)
+        num_functions = get_k(num_kmers, array_size)
+        session = QuerySession(args.reads, args.k, array_size, num_functions, build_processes=args.threads,
+                               correct_errors=args.correct_errors, simplify=args.simplify, canonical=args.canonical,
+                               targeted=args.targeted, min_score=args.min_score, kmer_capacity=num_kmers,
+                               reads_per_leaf=args.reads_per_leaf or DEFAULT_READS_PER_LEAF, max_rounds=args.max_rounds,
+                               min_kmer_count=args.min_kmer_count)
 
-    # set desired false positive rate
-    false_positive_rate = 0.0001
-    # get optimal array size
-    array_size = get_m(num_seq, false_positive_rate)
-    # get optimal number of hash functions
-    num_functions = get_k(num_seq, num_seq)
+    if args.serve:
+        import query_server # import the server from query_server.py
+        query_server.serve(session, args.host, args.port, args.socket, processes=args.threads)
+        return
 
-    # initialize bloom filter search tree object
-    bloom_filter_search_tree = BloomFilterSearchTree(20, array_size, num_functions)
-    # add the read sequences to the bloom filter search tree
-    for sequence in sequence_dict.values():
-        bloom_filter_search_tree.add(sequence)
+    # check if each query is in the sequencing reads and, if so, construct its longest contig
+    contigs = session.query_all(query_dict, processes=args.threads)
+    if args.output is None:
+        for query_ID, longest_contig in contigs.items():
+            print(longest_contig)
+    else:
+        with open(args.output, "w") as file:
+            for query_ID, longest_contig in contigs.items():
+                file.write(">" + query_ID + "\n" + longest_contig + "\n")
+    if args.save_index is not None:
+        session.save_index(args.save_index)
 
-    # check if the query is in the sequencing reads
-    longest_contig = ""
-    for query in query_dict.values():
-        query_result = bloom_filter_search_tree.check(query)
-        if query_result == True:
-            # if the sequence is found then use the de bruijn graph class to construct the contig
-            graph = DeBruijnGraph(sequence_dict, 20)
-            longest_contig = graph.get_longest_contig(query)
-        print(longest_contig)
-        #TODO: implement the method for returning the results to the user
+    if args.metrics:
+        instrumentation.write_report(args.metrics)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,159 @@
+"""Description: Class for a minimizer index of a read set, and functions for assembling a query's contig from only the
+reads that overlap it.
+The (w,k)-minimizer of a window of w consecutive k-mers is the k-mer with the smallest hash; two sequences that share
+a stretch of at least w + k - 1 bases share that stretch's minimizers. The index keeps the minimizers of every read in
+a sorted uint64 array next to the read each one came from, so the reads sharing minimizers with a sequence are found
+with a binary search. Starting from the query, the reads sharing its minimizers are recruited, a small de Bruijn graph
+is built from them, and the reads overlapping the ends the contig grew by are recruited in turn, until no new reads are
+found.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from bloom_filter import hash64 # import the hash function from bloom_filter.py
+from kmers import kmer_array # import the k-mer encoding from kmers.py
+from de_bruijn_graph import DeBruijnGraph # import the graph from de_bruijn_graph.py
+import graph_simplification # import the tip clipping and bubble popping from graph_simplification.py
+
+'''Get the distinct (w,k)-minimizers of a sequence. K-mers are ranked by their hash rather than their value, so that
+low-complexity k-mers like AAAA... aren't picked in every window.
+Input: STRING or NUMPY ARRAY seq, the sequence or its base codes; INT k, the k-mer length; INT w, the window size
+        (in k-mers); BOOL canonical, whether to use canonical k-mers, so both strands have the same minimizers
+Output: NUMPY ARRAY (uint64) of the sorted, distinct minimizer hashes
+'''
+def minimizers(seq, k, w, canonical=False):
+    hashes = hash64(kmer_array(seq, k, canonical))
+    if len(hashes) <= w: # a sequence shorter than one window has one minimizer
+        return hashes[np.argsort(hashes)[:1]]
+    return np.unique(sliding_window_view(hashes, w).min(axis=1))
+
+
+"""Class for MinimizerIndex object. Maps the minimizers of every read to the reads that hold them.
+"""
+class MinimizerIndex:
+    """Initialize the minimizer index
+    Input: INT k, the minimizer k-mer length; INT w, the window size (in k-mers);
+            BOOL canonical, whether reads match sequences from the other strand
+    Output: MinimizerIndex object"""
+    def __init__(self, k, w, canonical=False):
+        self.k = k
+        self.w = w
+        self.canonical = canonical
+        # the ID of each read, in the order they were added; the index refers to reads by their position in this list
+        self.read_IDs = []
+        # minimizer hashes (sorted) and the read each one came from
+        self._keys = np.zeros(0, dtype=np.uint64)
+        self._reads = np.zeros(0, dtype=np.int32)
+        # minimizers that have been added but not yet sorted into the index
+        self._pending = []
+
+    """Add a read to the index
+    Input: STRING seq, the read sequence; read_ID, the ID returned for the read"""
+    def add(self, seq, read_ID):
+        keys = minimizers(seq, self.k, self.w, self.canonical)
+        self._pending.append((keys, np.full(len(keys), len(self.read_IDs), dtype=np.int32)))
+        self.read_IDs.append(read_ID)
+
+    """Sort the pending minimizers into the index"""
+    def _flush(self):
+        if not self._pending:
+            return
+        keys = np.concatenate([self._keys] + [keys for keys, _ in self._pending])
+        reads = np.concatenate([self._reads] + [reads for _, reads in self._pending])
+        self._pending = []
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._reads = reads[order]
+
+    """Find the reads that share minimizers with a sequence
+    Input: STRING seq; INT min_shared, the fewest minimizers a read has to share with the sequence
+    Output: NUMPY ARRAY (int32) of read numbers (positions in self.read_IDs), sorted"""
+    def read_numbers(self, seq, min_shared=1):
+        return self.reads_with(minimizers(seq, self.k, self.w, self.canonical), min_shared)
+
+    """Find the reads that hold some of a set of minimizers
+    Input: NUMPY ARRAY keys (uint64), distinct minimizer hashes; INT min_shared, the fewest of them a read has to hold
+    Output: NUMPY ARRAY (int32) of read numbers (positions in self.read_IDs), sorted"""
+    def reads_with(self, keys, min_shared=1):
+        self._flush()
+        starts = np.searchsorted(self._keys, keys, side="left")
+        lengths = np.searchsorted(self._keys, keys, side="right") - starts
+        # the positions of every matching entry, one run per minimizer
+        run_offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        hits = self._reads[np.arange(int(lengths.sum())) + run_offsets]
+        reads, shared = np.unique(hits, return_counts=True)
+        return reads[shared >= min_shared]
+
+    """Find the reads that share minimizers with a sequence
+    Input: STRING seq; INT min_shared, the fewest minimizers a read has to share with the sequence
+    Output: LIST of read IDs"""
+    def query(self, seq, min_shared=1):
+        return [self.read_IDs[read] for read in self.read_numbers(seq, min_shared).tolist()]
+
+    def __len__(self):
+        return len(self.read_IDs)
+
+'''Build a minimizer index of a set of reads
+Input: DICT reads, where the key is the sequence ID and the value is the sequence (or any iterable of (sequence ID,
+        sequence) tuples, such as reading_input.parse_sequences streaming a file); INT k; INT w; BOOL canonical
+Output: MinimizerIndex object
+'''
+def build_minimizer_index(reads, k, w, canonical=False):
+    index = MinimizerIndex(k, w, canonical)
+    for read_ID, sequence in (reads.items() if hasattr(reads, "items") else reads):
+        index.add(sequence, read_ID)
+    return index
+
+'''The parts of a contig that hold minimizers it didn't have before it grew: each end it grew by, along with the
+bases of the old contig that a window reaching into the new bases covers
+Input: STRING previous, the contig before; STRING contig, the contig after; INT overlap, the number of old bases a
+        window with new bases in it can cover (w + k - 2)
+Output: LIST of STRING regions (the whole contig if it didn't just grow at its ends)
+'''
+def _grown_ends(previous, contig, overlap):
+    start = contig.find(previous)
+    if start < 0:
+        return [contig]
+    end = start + len(previous)
+    regions = []
+    if start > 0:
+        regions.append(contig[:start + overlap])
+    if end < len(contig):
+        regions.append(contig[max(0, end - overlap):])
+    return regions
+
+'''Assemble the longest contig of a query from only the reads around it. Reads sharing minimizers with the query are
+recruited and a de Bruijn graph is built from them; then the reads sharing minimizers with the ends the contig grew by
+are recruited and added to the graph, until no new reads are found (or max_rounds is reached). Only minimizers that
+haven't been looked up before are looked up.
+Input: MinimizerIndex index; DICT reads, the sequences of the indexed reads by ID; STRING query;
+        INT k, the k-mer length of the graph; INT max_rounds, the most times the read set is grown (None for no limit);
+        BOOL simplify, whether to clip tips and pop bubbles in the graph (see graph_simplification.py; the graph is
+        then built again from every recruited read each round, since the simplified graph has lost edges)
+Output: STRING contig, the longest contig containing the query; LIST of the IDs of the reads it was built from
+'''
+def targeted_contig(index, reads, query, k, max_rounds=None, simplify=False):
+    recruited = np.zeros(0, dtype=np.int32)
+    looked_up = np.zeros(0, dtype=np.uint64)
+    contig = query
+    regions = [query]
+    graph = None
+    rounds = 0
+    while regions and (max_rounds is None or rounds < max_rounds):
+        keys = [minimizers(region, index.k, index.w, index.canonical) for region in regions]
+        keys = np.setdiff1d(np.concatenate(keys), looked_up)
+        looked_up = np.union1d(looked_up, keys)
+        new_reads = np.setdiff1d(index.reads_with(keys), recruited)
+        if len(new_reads) == 0:
+            break
+        rounds += 1
+        recruited = np.union1d(recruited, new_reads)
+        if graph is None or simplify:
+            local_reads = {index.read_IDs[read]: reads[index.read_IDs[read]] for read in recruited.tolist()}
+            graph = DeBruijnGraph(local_reads, k, canonical=index.canonical)
+            if simplify:
+                graph_simplification.simplify(graph)
+        else:
+            graph.add_reads({index.read_IDs[read]: reads[index.read_IDs[read]] for read in new_reads.tolist()})
+        previous, contig = contig, graph.get_longest_contig(query)
+        regions = _grown_ends(previous, contig, index.w + index.k - 2)
+    return contig, [index.read_IDs[read] for read in recruited.tolist()]
@@ -0,0 +1,176 @@
+"""Description: Functions for building the k-mer counts and the bloom filter search tree on several processes.
+The reads are streamed (from a dictionary or straight from a FASTA/FASTQ file) in shards of whole leaf bins, and each
+worker hashes the k-mers of every leaf of its shard into a full-size filter and counts the k-mers of the shard. The
+filter words that aren't zero and the partial counts are written into a shared-memory buffer, so they aren't pickled
+back to the parent. The parent merges the partial counts by adding them up and splices each leaf's words into the tree
+in read order, so the tree is the same as one built on a single process. Only a few shards are in flight at a time, so
+the reads are never all in memory at once.
+"""
+import collections
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from bloom_filter import BloomFilter, num_words # import the bloom filter from bloom_filter.py
+from bloom_filter_search_tree import BloomFilterSearchTree, DEFAULT_READS_PER_LEAF # import the search tree from bloom_filter_search_tree.py
+from kmer_counter import KmerCounter # import the k-mer counting table from kmer_counter.py
+from kmers import kmer_array # import the k-mer encoding from kmers.py
+import reading_input # import the FASTA/FASTQ parsing from reading_input.py
+
+# number of leaf bins in each shard of reads sent to a worker
+LEAVES_PER_SHARD = 64
+
+'''Views of a shard's shared memory: the k-mers and counts of the shard, the positions and values of the filter words
+of its leaves, and the positions and increments of the abundance counters its k-mers hash to
+Input: SharedMemory memory; TUPLE capacities, of INT the most k-mers the counts can hold, INT the most filter words and
+        INT the most abundance counters (0 when the tree doesn't count abundance)
+Output: NUMPY ARRAY kmers (uint64); NUMPY ARRAY counts (uint32); NUMPY ARRAY positions (uint64), of each word in the
+        full-size filter; NUMPY ARRAY words (uint64); NUMPY ARRAY counter_positions (uint64);
+        NUMPY ARRAY increments (uint32)
+'''
+def _shard_arrays(memory, capacities):
+    capacity, word_capacity, counter_capacity = capacities
+    sizes = [(capacity, np.uint64), (word_capacity, np.uint64), (word_capacity, np.uint64),
+             (counter_capacity, np.uint64), (capacity, np.uint32), (counter_capacity, np.uint32)]
+    arrays = []
+    offset = 0
+    for size, dtype in sizes:
+        arrays.append(np.ndarray(size, dtype=dtype, buffer=memory.buf, offset=offset))
+        offset += size * np.dtype(dtype).itemsize
+    kmers, positions, words, counter_positions, counts, increments = arrays
+    return kmers, counts, positions, words, counter_positions, increments
+
+'''Size in bytes of a shard's shared memory (see _shard_arrays)
+Input: TUPLE capacities
+Output: INT bytes
+'''
+def _shard_bytes(capacities):
+    capacity, word_capacity, counter_capacity = capacities
+    return 12 * capacity + 16 * word_capacity + 12 * counter_capacity
+
+'''Hash the leaves and count the k-mers of one shard of reads (runs in a worker process)
+Input: TUPLE of LIST sequences, the reads of the shard; INT k; INT reads_per_leaf; BOOL canonical; INT array_size,
+        INT num_hash_functions and INT seed, of the tree's full-size filter; STRING memory_name, the shared memory for
+        this shard; TUPLE capacities (see _shard_arrays)
+Output: LIST of (INT number of distinct k-mers, INT number of filter words) for each leaf, whose words are written one
+        leaf after another; INT number of distinct k-mers written to the counts; INT number of abundance counters
+        written
+'''
+def _build_shard(args):
+    sequences, k, reads_per_leaf, canonical, array_size, num_hash_functions, seed, memory_name, capacities = args
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        shard_kmers, shard_counts, positions, words, counter_positions, increments = _shard_arrays(memory, capacities)
+        counter = KmerCounter(k)
+        bits = np.zeros(num_words(array_size), dtype=np.uint64)
+        bloom_filter = BloomFilter(array_size, num_hash_functions, seed, array=bits)
+        leaves = []
+        used = 0
+        for first in range(0, len(sequences), reads_per_leaf):
+            kmers = [kmer_array(sequence, k, canonical) for sequence in sequences[first:first + reads_per_leaf]]
+            for read_kmers in kmers:
+                counter.add(read_kmers)
+            kmers = np.sort(np.concatenate(kmers))
+            distinct = np.ones(len(kmers), dtype=bool)
+            distinct[1:] = kmers[1:] != kmers[:-1]
+            kmers = kmers[distinct]
+            bloom_filter.add_many(kmers)
+            set_words = np.flatnonzero(bits)
+            positions[used:used + len(set_words)] = set_words
+            words[used:used + len(set_words)] = bits[set_words]
+            bits[set_words] = 0 # clear the filter for the next leaf
+            used += len(set_words)
+            leaves.append((len(kmers), len(set_words)))
+        num_distinct = len(counter)
+        shard_kmers[:num_distinct] = counter.kmers
+        shard_counts[:num_distinct] = counter.counts
+        num_counters = 0
+        if capacities[2] > 0:
+            # every probe of a k-mer adds the k-mer's count to its counter (which stops at 15, see CountingBloomFilter)
+            probes, owners = np.unique(bloom_filter._hash(counter.kmers).ravel(), return_inverse=True)
+            sums = np.bincount(owners.ravel(), weights=np.repeat(counter.counts, num_hash_functions))
+            num_counters = len(probes)
+            counter_positions[:num_counters] = probes
+            increments[:num_counters] = np.minimum(sums, 15)
+        del shard_kmers, shard_counts, positions, words, counter_positions, increments # release the views first
+        return leaves, num_distinct, num_counters
+    finally:
+        memory.close()
+
+'''Add the results of one shard to the tree and the k-mer counts, and free its shared memory
+Input: BloomFilterSearchTree search_tree; KmerCounter kmer_table; FUTURE future, of the shard's _build_shard call;
+        LIST read_IDs, the IDs of the shard's reads; SharedMemory memory, the shard's shared memory; TUPLE capacities
+'''
+def _add_shard(search_tree, kmer_table, future, read_IDs, memory, capacities):
+    try:
+        leaves, num_distinct, num_counters = future.result()
+        shard_kmers, shard_counts, positions, words, counter_positions, increments = _shard_arrays(memory, capacities)
+        # merge the partial counts by adding them up
+        kmer_table.add_counts(shard_kmers[:num_distinct].copy(), shard_counts[:num_distinct].copy())
+        if search_tree.abundance is not None:
+            search_tree.abundance.add_to_counters(counter_positions[:num_counters], increments[:num_counters])
+        # splice each leaf's words into a full-size filter and insert the leaves in read order, as a build on one
+        # process would
+        reads_per_leaf = search_tree.reads_per_leaf
+        used = 0
+        for leaf, (num_kmers, num_set) in enumerate(leaves):
+            bits = np.zeros(num_words(search_tree.array_size), dtype=np.uint64)
+            bits[positions[used:used + num_set].astype(np.intp)] = words[used:used + num_set]
+            used += num_set
+            search_tree.add_leaf_filter(bits, num_kmers, read_IDs[leaf * reads_per_leaf:(leaf + 1) * reads_per_leaf])
+        del shard_kmers, shard_counts, positions, words, counter_positions, increments
+    finally:
+        memory.close()
+        memory.unlink()
+
+'''Build the bloom filter search tree and the k-mer counts of a set of reads using a pool of worker processes
+Input: DICT reads, dictionary of sequencing reads where the key is the sequence ID and the value is the sequence (or
+        STRING, the name of a FASTA/FASTQ file that is streamed, or any iterable of (sequence ID, sequence) tuples);
+        INT k, the k-mer length; INT array_size, the size of the root bloom filter (see BloomFilterSearchTree);
+        INT num_hash_functions, the number of hash functions; INT processes, the number of worker processes;
+        INT reads_per_leaf, the number of reads in each leaf of the tree; INT seed, the hash seed;
+        BOOL canonical, whether the k-mers are counted and stored in canonical form;
+        INT kmer_capacity, the number of distinct k-mers to allocate the k-mer table for up front (see KmerCounter);
+        INT leaves_per_shard, the number of leaves in each shard of reads sent to a worker;
+        INT min_kmer_count, k-mers seen fewer times than this are left out of searches (see BloomFilterSearchTree)
+Output: BloomFilterSearchTree search_tree; KmerCounter kmer_table, the summed counts of every k-mer in the reads
+'''
+def parallel_build(reads, k, array_size, num_hash_functions, processes, reads_per_leaf=DEFAULT_READS_PER_LEAF, seed=0,
+                   canonical=False, kmer_capacity=0, leaves_per_shard=LEAVES_PER_SHARD, min_kmer_count=1):
+    if isinstance(reads, str):
+        reads = reading_input.parse_sequences(reads)
+    elif isinstance(reads, dict):
+        reads = iter(reads.items())
+    search_tree = BloomFilterSearchTree(k, array_size, num_hash_functions, reads_per_leaf, seed, min_kmer_count,
+                                        canonical)
+    kmer_table = KmerCounter(k, capacity=kmer_capacity)
+    # the shards that have been sent to the workers, oldest first: (future, read IDs, shared memory, capacities)
+    pending = collections.deque()
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for shard in iter(lambda: list(itertools.islice(reads, reads_per_leaf * leaves_per_shard)), []):
+                sequences = [sequence for _, sequence in shard]
+                # the shard can't have more distinct k-mers than it has k-mers, and a leaf can't set more words (or
+                # the shard more abundance counters) than its k-mers have probes
+                leaf_kmers = [sum(max(0, len(sequence) - k + 1) for sequence in sequences[first:first + reads_per_leaf])
+                              for first in range(0, len(sequences), reads_per_leaf)]
+                capacity = max(1, sum(leaf_kmers))
+                word_capacity = max(1, sum(min(num_kmers * num_hash_functions, num_words(search_tree.array_size))
+                                           for num_kmers in leaf_kmers))
+                counter_capacity = capacity * num_hash_functions if search_tree.abundance is not None else 0
+                capacities = (capacity, word_capacity, counter_capacity)
+                memory = shared_memory.SharedMemory(create=True, size=_shard_bytes(capacities))
+                pending.append((executor.submit(_build_shard, (sequences, k, reads_per_leaf, canonical,
+                                                               search_tree.array_size, num_hash_functions, seed,
+                                                               memory.name, capacities)),
+                                [read_ID for read_ID, _ in shard], memory, capacities))
+                # keep every worker busy, but only a few shards of reads in memory at a time
+                if len(pending) >= 2 * processes:
+                    _add_shard(search_tree, kmer_table, *pending.popleft())
+            while pending:
+                _add_shard(search_tree, kmer_table, *pending.popleft())
+    finally:
+        for _, _, memory, _ in pending:
+            memory.close()
+            memory.unlink()
+    return search_tree, kmer_table
@@ -0,0 +1,113 @@
+"""Description: Functions for exploring the read set and the bloom filter parameters with plots.
+These need matplotlib, which is only imported when this module is (main.py does so for --explore), so that a plain
+search doesn't pay for loading it.
+"""
+import numpy as np
+import matplotlib.pyplot as plt
+
+# EXPLORE THE BLOOM FILTER PARAMETERS
+# 1. evaluate the appropriate array size and number of hash functions
+''' Plot a range of solutions for the equation to find the optimal array size, m
+Input: INTEGER n, number of items/sequences that are to be added to the bloom filter; STRING file_name, for the plot
+Output: plot showing relationship between false positive rate and array size
+'''
+def evaluate_m(n, file_name='FPR_array_size_plot.pdf'):
+    plt.figure()
+    # get a range of p (false positive rate); a few hundred points spaced evenly on a log scale trace the same curve
+    # as a fine linear grid, without allocating millions of them
+    p_range = np.logspace(-10, -3, 500)
+    # use the range of p to calculate possible solutions to the array size equation
+    m_range = (-(n * np.log(p_range))) / np.log(2)**2
+    plt.plot(m_range, p_range)
+    plt.title(label = "False Positive Rate v. Array size")
+    #plt.ylim([1e-10, 1e-3])
+    #plt.xlim(1, 1e6)
+    plt.ylabel("False Positive Rate")
+    plt.xlabel("Array size")
+    plt.savefig(file_name)
+
+''' Plot a range of solutions for the equation to find the optimal number of hash functions, k
+Input: INTEGER n, number of items/sequences that are to be added to the bloom filter; STRING file_name, for the plot
+Output: plot showing relationship between array size and number of has functions
+'''
+def evaluate_k(n, file_name='num_hash_array_size_plot.pdf'):
+    plt.figure()
+    k_range = ((np.arange(1e6, 1e7, 5e5))/n) * np.log(2)
+    plt.plot((np.arange(1e6, 1e7, 5e5)), k_range)
+    plt.title(label = "Number of Hash Functions v. Array size")
+    #plt.ylim([1e-10, 1e-3])
+    #plt.xlim(1, 1e6)
+    plt.ylabel("Number of Hash Functions")
+    plt.xlabel("Array size")
+    plt.savefig(file_name)
+
+# EXPLORE THE READS
+# the plots are drawn from the histograms in the statistics computed by read_stats.py (ReadStats.to_dict), never from the
+# reads themselves, so they take the same time for any number of reads
+# 1. report the duplication levels
+# could also help to choose a threshold for the filtering step during error correction later
+'''
+Plot how many distinct reads are seen once, twice, ... (the last bar holds the reads seen that many times or more)
+Input: DICT stats (output of ReadStats.to_dict); STRING file_name, for the plot
+Output: bar plot
+'''
+def plot_duplication_levels(stats, file_name='read_count_dist_plot.pdf'):
+    _plot_counts(stats["duplication_levels"], "Times a Read is Seen", "Distinct Reads", "Read Duplication Levels",
+                 file_name)
+
+# 2. report read length distribution
+# could help to also establish a read length threshold to further filter the reads
+'''
+Plot the read length histogram
+Input: DICT stats (output of ReadStats.to_dict); STRING file_name, for the plot
+Output: bar plot
+'''
+def plot_read_lengths(stats, file_name='read_length_dist_plot.pdf'):
+    plt.figure()
+    plt.bar(stats["length_histogram"]["lengths"], stats["length_histogram"]["counts"], 1.0, color='g')
+    plt.axvline(stats["n50"], color='k', linestyle='dashed', linewidth=1, label="N50")
+    plt.legend()
+    plt.title(label="Read Length Frequency")
+    plt.ylabel("Frequency")
+    plt.xlabel("Read Length")
+    plt.savefig(file_name)
+
+# 3. report the GC content of the reads
+'''
+Plot the histogram of the GC content of the reads, by whole percent
+Input: DICT stats (output of ReadStats.to_dict); STRING file_name, for the plot
+Output: bar plot
+'''
+def plot_gc_content(stats, file_name='gc_content_plot.pdf'):
+    plt.figure()
+    plt.bar(np.arange(len(stats["gc_histogram"])), stats["gc_histogram"], 1.0, color='g')
+    plt.title(label="GC Content")
+    plt.ylabel("Reads")
+    plt.xlabel("GC (%)")
+    plt.savefig(file_name)
+
+# 4. report the k-mer abundance spectrum (see error_correction.py)
+'''
+Plot the number of distinct k-mers seen once, twice, ... (the last bar holds the k-mers seen that many times or more)
+Input: DICT stats (output of ReadStats.to_dict); STRING file_name, for the plot
+Output: bar plot
+'''
+def plot_kmer_spectrum(stats, file_name='kmer_spectrum_plot.pdf'):
+    _plot_counts(stats["kmer_spectrum"], "Times a k-mer is Seen", "Distinct k-mers",
+                 "k-mer Abundance Spectrum (k = " + str(stats["k"]) + ")", file_name, log=True)
+
+'''
+Bar plot of a count histogram, leaving out the empty bin for count 0 and labelling the last bin as "or more"
+Input: LIST histogram, where histogram[c] is the number of items seen c times; STRING xlabel, ylabel, title;
+        STRING file_name, for the plot; BOOL log, whether to use a log scale for the y axis
+Output: bar plot
+'''
+def _plot_counts(histogram, xlabel, ylabel, title, file_name, log=False):
+    plt.figure()
+    counts = np.arange(1, len(histogram))
+    plt.bar(counts, histogram[1:], 1.0, color='g', log=log)
+    plt.xticks(counts, [str(count) for count in counts[:-1]] + [str(counts[-1]) + "+"])
+    plt.title(label=title)
+    plt.ylabel(ylabel)
+    plt.xlabel(xlabel)
+    plt.savefig(file_name)
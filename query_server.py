@@ -0,0 +1,226 @@
+"""Description: Long-running query server that keeps one query session (the search tree and the graph or minimizer
+index) in memory, so that each batch of queries only pays for the search and the contig extension.
+Queries are sent as HTTP requests, over a localhost port or a Unix socket:
+    POST /query    with a JSON object of query IDs and sequences, answered with a JSON object of query IDs and contigs
+                   ("" for a query that is not in the reads)
+    GET /health    answered with {"status": "ok"}
+    GET /metrics   the instrumentation report (see instrumentation.py) in the Prometheus text format
+Connections are kept open between requests. Every query is put on one queue, whichever request it came in; the queries
+waiting on the queue are checked against the search tree together in one vectorized lookup (in a thread of its own), and
+the queries that are found are extended into contigs in a pool of worker processes, so the event loop is never held up
+by a large batch or a long extension.
+Usage: python main.py --serve [--port 8765 | --socket /tmp/search.sock] (with the options that load or build the index)
+"""
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import instrumentation # import the counters and the report from instrumentation.py
+import query_session # import the worker set-up from query_session.py
+
+# most queries checked against the search tree in one batch
+MAX_BATCH = 1024
+# most bytes accepted in one request body
+MAX_BODY = 64 * 1024 * 1024
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+            500: "Internal Server Error"}
+
+
+"""Class for QueryServer object. Answers queries against a session that is built once and kept in memory.
+"""
+class QueryServer:
+    """Initialize the server. Nothing is built or listened on until start() is called.
+    Input: QuerySession session; INT processes, the number of worker processes the contigs are extended in (with 1,
+            they are extended in a thread of this process); INT max_batch, the most queries checked in one batch
+    Output: QueryServer object"""
+    def __init__(self, session, processes=1, max_batch=MAX_BATCH):
+        self.session = session
+        self.processes = processes
+        self.max_batch = max_batch
+        self._queue = None
+        self._batcher = None
+        self._executor = None
+        self._check_executor = None
+        self._extend = None
+        self._server = None
+        # the open connections (and the tasks serving them), closed with the server
+        self._connections = {}
+
+    """Build the session (if it wasn't loaded from an index file), start the workers and listen for connections
+    Input: STRING host; INT port (0 to pick a free one); STRING socket_path, a Unix socket to listen on instead of the port"""
+    async def start(self, host="127.0.0.1", port=8765, socket_path=None):
+        self.session.build()
+        if self.processes > 1:
+            # the workers get their copy of the session once, when they start
+            self._executor = ProcessPoolExecutor(max_workers=self.processes, initializer=query_session._init_worker,
+                                                 initargs=(self.session,))
+            self._extend = query_session._extend_in_worker
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+            self._extend = self.session.extend
+        # the batches are checked one at a time, against the session's search tree in this process
+        self._check_executor = ThreadPoolExecutor(max_workers=1)
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._check_batches())
+        if socket_path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path=socket_path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+
+    """The addresses the server is listening on
+    Output: LIST of (host, port) tuples, or of socket paths"""
+    @property
+    def addresses(self):
+        return [listener.getsockname() for listener in self._server.sockets]
+
+    """Serve until the task is cancelled"""
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    """Stop listening and shut the workers down"""
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            handlers = list(self._connections.values())
+            for writer in self._connections:
+                writer.close()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await self._server.wait_closed()
+        if self._batcher is not None:
+            self._batcher.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+        if self._check_executor is not None:
+            self._check_executor.shutdown(cancel_futures=True)
+
+    """Find the longest contig for one query. The query waits on the queue to be checked with the others that came in
+    at the same time, and is then extended in the worker pool if it was found.
+    Input: STRING query
+    Output: STRING contig ("" if the query is not in the reads)"""
+    async def query(self, query):
+        found = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, found))
+        if not await found:
+            return ""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._extend, query)
+
+    """Answer a set of queries concurrently
+    Input: DICT queries, where the key is the query ID and the value is the query sequence
+    Output: DICT contigs, where the key is the query ID and the value is its longest contig"""
+    async def query_all(self, queries):
+        contigs = await asyncio.gather(*(self.query(query) for query in queries.values()))
+        return dict(zip(queries.keys(), contigs))
+
+    """Take the queries off the queue and check them against the search tree in batches: each batch is everything that
+    queued up while the previous one was being checked (up to max_batch), so a lone query is checked straight away. The
+    check runs in a thread, so other requests are still served while it does"""
+    async def _check_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                results = await loop.run_in_executor(self._check_executor, self.session.check_all,
+                                                     [query for query, _ in batch])
+            except Exception as error:
+                for _, found in batch:
+                    if not found.done():
+                        found.set_exception(error)
+                continue
+            instrumentation.count("server_batches")
+            instrumentation.count("server_queries", len(batch))
+            for (_, found), result in zip(batch, results):
+                if not found.done():
+                    found.set_result(result)
+
+    """Serve the HTTP requests of one connection, until the client closes it"""
+    async def _handle(self, reader, writer):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, close=True)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0) or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "request body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length)
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                status, payload = await self._route(method, path, body)
+                await self._respond(writer, status, payload, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    """Answer one request
+    Input: STRING method; STRING path; BYTES body
+    Output: INT status; DICT payload (sent as JSON) or STRING (sent as plain text)"""
+    async def _route(self, method, path, body):
+        if path == "/query":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            try:
+                queries = json.loads(body)
+            except ValueError:
+                return 400, {"error": "the body must be a JSON object of query IDs and sequences"}
+            if not isinstance(queries, dict) or not all(isinstance(query, str) for query in queries.values()):
+                return 400, {"error": "the body must be a JSON object of query IDs and sequences"}
+            try:
+                return 200, await self.query_all(queries)
+            except Exception as error:
+                return 500, {"error": str(error)}
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, instrumentation.prometheus_text(instrumentation.report())
+        return 404, {"error": "unknown path " + path}
+
+    """Write a response
+    Input: StreamWriter writer; INT status; DICT or STRING payload; BOOL close, whether the connection is closed after it"""
+    async def _respond(self, writer, status, payload, close=False):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        head = ("HTTP/1.1 " + str(status) + " " + _REASONS[status] + "\r\n" +
+                "Content-Type: " + content_type + "\r\n" +
+                "Content-Length: " + str(len(body)) + "\r\n" +
+                "Connection: " + ("close" if close else "keep-alive") + "\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+'''Serve a session until interrupted
+Input: QuerySession session; STRING host; INT port; STRING socket_path (see QueryServer.start);
+        INT processes, the number of worker processes the contigs are extended in
+'''
+def serve(session, host="127.0.0.1", port=8765, socket_path=None, processes=1):
+    async def run():
+        server = QueryServer(session, processes)
+        await server.start(host, port, socket_path)
+        print("serving queries on " + ", ".join(str(address) for address in server.addresses), flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,366 @@
+"""Description: Class for a query session, which answers any number of queries against one read set.
+The bloom filter search tree and the (compacted) de Bruijn graph are each built the first time they are needed
+and then reused for every query, instead of being rebuilt for each one. In targeted mode there is no graph of the
+whole read set: each query gets a small graph of only the reads around it (see minimizer_index.py).
+"""
+import collections
+import itertools
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from bloom_filter_search_tree import BloomFilterSearchTree, DEFAULT_READS_PER_LEAF # import the search tree from bloom_filter_search_tree.py
+from de_bruijn_graph import DeBruijnGraph # import the graph from de_bruijn_graph.py
+from parallel_build import parallel_build # import the multiprocess build from parallel_build.py
+import index_file # import the on-disk index format from index_file.py
+import error_correction # import the solid k-mer filtering from error_correction.py
+import graph_simplification # import the tip clipping and bubble popping from graph_simplification.py
+import minimizer_index # import the read recruitment from minimizer_index.py
+import instrumentation # import the stage timers from instrumentation.py
+import reading_input # import the FASTA/FASTQ parsing from reading_input.py
+from kmers import kmer_array # import the k-mer encoding from kmers.py
+
+# minimizer k-mer length (at most) and window size used in targeted mode
+MINIMIZER_K = 15
+MINIMIZER_W = 10
+# default number of query results a session keeps
+DEFAULT_MAX_RESULTS = 10000
+
+# the session of a worker process when queries are answered in parallel
+_worker_session = None
+
+'''Set up a worker process with its copy of the session (done once per worker, not once per query)
+Input: QuerySession session
+'''
+def _init_worker(session):
+    global _worker_session
+    _worker_session = session
+
+'''Answer one query in a worker process
+Input: STRING query
+Output: STRING contig
+'''
+def _query_in_worker(query):
+    return _worker_session.query(query)
+
+'''Extend one query that was already found in the reads, in a worker process
+Input: STRING query
+Output: STRING contig
+'''
+def _extend_in_worker(query):
+    return _worker_session.extend(query)
+
+'''Load a query session from an index file saved by QuerySession.save_index. Nothing has to be rebuilt, and the
+index arrays are memory-mapped so several processes can share them.
+Input: STRING file_name
+Output: QuerySession object
+'''
+def load_session(file_name):
+    search_tree, graph = index_file.load_index(file_name)
+    session = QuerySession(None, search_tree.k, search_tree.array_size, search_tree.num_hash_functions,
+                           canonical=search_tree.canonical, reads_per_leaf=search_tree.reads_per_leaf,
+                           min_kmer_count=search_tree.min_kmer_count)
+    session._search_tree = search_tree
+    session._graph = graph
+    return session
+
+
+"""Class for QuerySession object. Holds the reads and lazily builds the structures used to answer queries.
+"""
+class QuerySession:
+    """Initialize the query session. Nothing is built until the first query comes in.
+    Input: DICT reads, dictionary of sequencing reads where the key is the sequence ID and the value is the sequence
+            (or STRING, the name of a FASTA/FASTQ file that is streamed each time a structure is built);
+            INT k, the k-mer length; INT array_size, the size of the bloom filters that hold every k-mer of the reads
+            (the root of the search tree, whose other nodes are sized for their own k-mers, and the error correction counts);
+            INT num_hash_functions, the number of hash functions used by the bloom filters;
+            INT build_processes, the number of worker processes used to build the search tree and count the k-mers;
+            BOOL correct_errors, whether to trim the reads to their solid
+            k-mers (see error_correction.py) before the graph is built; BOOL simplify, whether to clip the tips and
+            pop the bubbles of the graph (see graph_simplification.py) before it is compacted; BOOL canonical, whether
+            to treat a k-mer and its reverse complement as the same, for reads and queries from either strand;
+            BOOL targeted, whether to build each query's contig from only the reads recruited by a minimizer index
+            instead of from a graph of all of the reads (correct_errors is not used in this mode);
+            INT max_rounds, the most times targeted mode grows a query's set of recruited reads (None to keep growing
+            it until no new reads are found);
+            INT min_kmer_count, k-mers seen in the reads fewer times than this are left out when the search tree
+            checks a query (see BloomFilterSearchTree);
+            FLOAT min_score, the fraction of a query's k-mers that have to be in the reads for it to be reported as found
+            (below 1.0, queries with a few mismatches against the reads are still assembled);
+            INT kmer_capacity, the number of distinct k-mers to allocate the k-mer table for up front (such as an
+            estimate from hyperloglog.py; 0 to grow it as needed);
+            INT reads_per_leaf, the number of reads binned together into one leaf of the search tree;
+            INT max_results, the number of query results kept to answer repeated queries (the least recently used are
+            dropped first; 0 keeps none)
+    Output: QuerySession object"""
+    def __init__(self, reads, k, array_size, num_hash_functions, build_processes=1, correct_errors=False,
+                 simplify=False, canonical=False, targeted=False, min_score=1.0, kmer_capacity=0,
+                 reads_per_leaf=DEFAULT_READS_PER_LEAF, max_results=DEFAULT_MAX_RESULTS, max_rounds=None,
+                 min_kmer_count=1):
+        self.reads = reads
+        self.k = k
+        self.array_size = array_size
+        self.num_hash_functions = num_hash_functions
+        self.build_processes = build_processes
+        self.correct_errors = correct_errors
+        self.simplify = simplify
+        self.canonical = canonical
+        self.targeted = targeted
+        self.min_score = min_score
+        self.kmer_capacity = kmer_capacity
+        self.reads_per_leaf = reads_per_leaf
+        self.max_results = max_results
+        self.max_rounds = max_rounds
+        self.min_kmer_count = min_kmer_count
+        # the k-mer count below which k-mers were treated as errors, set when the graph is built with correct_errors
+        self.solid_cutoff = None
+        self._search_tree = None
+        self._graph = None
+        self._minimizer_index = None
+        # the reads by ID, since targeted mode looks recruited reads up by ID (for a file, a reading_input.IndexedReads
+        # that only keeps where each read is in the file)
+        self._read_dict = reads if isinstance(reads, dict) else None
+        # k-mer counts left over from a parallel build, used to build the graph without another pass over the reads
+        self._kmer_table = None
+        # reads added with add_reads after the session was created
+        self._added_reads = {}
+        # the contig found for each of the most recent queries, least recently used first, kept until reads that touch
+        # it are added
+        self._results = collections.OrderedDict()
+        self._results_lock = threading.Lock()
+        # queries answered on several threads must not build the same structure twice
+        self._build_lock = threading.Lock()
+
+    """Iterate over the reads, from the dictionary or streamed from the file
+    Output: GENERATOR of (sequence ID, sequence) tuples"""
+    def _iter_reads(self):
+        if isinstance(self.reads, str):
+            reads = reading_input.parse_sequences(self.reads)
+        else:
+            reads = iter(self.reads.items())
+        return itertools.chain(reads, self._added_reads.items()) if self._added_reads else reads
+
+    """The reads by ID, including the ones added with add_reads (targeted mode looks recruited reads up by ID)
+    Output: DICT (or ChainMap) of sequences by read ID"""
+    def _all_reads(self):
+        return collections.ChainMap(self._read_dict, self._added_reads) if self._added_reads else self._read_dict
+
+    """Count the k-mers of the reads, pick the solid k-mer cutoff from their abundance histogram and trim the reads to
+    their solid k-mers
+    Output: GENERATOR of (sequence ID, sequence) tuples for the corrected reads"""
+    def _corrected_reads(self):
+        abundance, histogram = error_correction.count_kmer_abundance(
+            (sequence for _, sequence in self._iter_reads()), self.k, self.array_size, self.num_hash_functions,
+            self.canonical)
+        self.solid_cutoff = error_correction.solid_kmer_cutoff(histogram)
+        return error_correction.correct_reads(self._iter_reads(), self.k, abundance, self.solid_cutoff,
+                                              canonical=self.canonical)
+
+    """The bloom filter search tree of the reads, built on first use
+    Output: BloomFilterSearchTree object"""
+    @property
+    def search_tree(self):
+        with self._build_lock:
+            if self._search_tree is None:
+                with instrumentation.stage("search_tree_build"):
+                    if self.build_processes > 1:
+                        self._search_tree, self._kmer_table = parallel_build(
+                            self._iter_reads(), self.k, self.array_size, self.num_hash_functions, self.build_processes,
+                            self.reads_per_leaf, canonical=self.canonical, kmer_capacity=self.kmer_capacity,
+                            min_kmer_count=self.min_kmer_count)
+                    else:
+                        search_tree = BloomFilterSearchTree(self.k, self.array_size, self.num_hash_functions,
+                                                            self.reads_per_leaf, min_kmer_count=self.min_kmer_count,
+                                                            canonical=self.canonical)
+                        for read_ID, sequence in self._iter_reads():
+                            search_tree.add(sequence, read_ID)
+                        search_tree.flush()
+                        self._search_tree = search_tree
+                if instrumentation.enabled() and self._search_tree.root != -1:
+                    instrumentation.gauge("filter_fill_ratio",
+                                          self._search_tree.node_filter(self._search_tree.root).fill_ratio())
+        return self._search_tree
+
+    """The compacted de Bruijn graph of the reads, built on first use
+    Output: DeBruijnGraph object"""
+    @property
+    def graph(self):
+        with self._build_lock:
+            if self._graph is None:
+                with instrumentation.stage("graph_build"):
+                    self._graph = self._build_graph()
+        return self._graph
+
+    """Build the compacted de Bruijn graph of the reads (see graph)
+    Output: DeBruijnGraph object"""
+    def _build_graph(self):
+        if self.correct_errors:
+            graph = DeBruijnGraph((sequence for _, sequence in self._corrected_reads()), self.k,
+                                  canonical=self.canonical, kmer_capacity=self.kmer_capacity)
+        elif self._kmer_table is not None:
+            graph = DeBruijnGraph(None, self.k, kmer_table=self._kmer_table, canonical=self.canonical)
+            self._kmer_table = None
+        elif isinstance(self.reads, str):
+            graph = DeBruijnGraph(itertools.chain((codes for _, codes in reading_input.read_batches(self.reads)),
+                                                  self._added_reads.values()), self.k, canonical=self.canonical,
+                                  kmer_capacity=self.kmer_capacity)
+        else:
+            graph = DeBruijnGraph((sequence for _, sequence in self._iter_reads()), self.k, canonical=self.canonical,
+                                  kmer_capacity=self.kmer_capacity)
+        if self.simplify:
+            with instrumentation.stage("simplify"):
+                graph_simplification.simplify(graph)
+        with instrumentation.stage("compact"):
+            graph.compact()
+        return graph
+
+    """The minimizer index of the reads, built on first use (targeted mode only)
+    Output: MinimizerIndex object"""
+    @property
+    def minimizer_index(self):
+        with self._build_lock:
+            if self._minimizer_index is None:
+                if self._read_dict is None:
+                    # the index is built while the file is read, and the read lookup keeps only the reads' offsets
+                    read_dict = reading_input.IndexedReads(self.reads)
+                    reads = itertools.chain(read_dict.scan(), self._added_reads.items())
+                else:
+                    read_dict = self._read_dict
+                    reads = self._all_reads()
+                self._minimizer_index = minimizer_index.build_minimizer_index(
+                    reads, min(self.k, MINIMIZER_K), MINIMIZER_W, self.canonical)
+                self._read_dict = read_dict
+        return self._minimizer_index
+
+    """Find the longest contig for one query. The graph is only built if a query is found in the reads. The contig is
+    kept, so asking for the same query again (until reads are added near it) returns straight away.
+    Input: STRING query, the query sequence
+    Output: STRING contig, the longest contig containing the query, or "" if the query is not in the reads"""
+    def query(self, query):
+        with self._results_lock:
+            contig = self._results.get(query)
+            if contig is not None:
+                self._results.move_to_end(query)
+        if contig is None:
+            with instrumentation.stage("query"):
+                contig = self._query(query)
+            self._keep_results([(query, contig)])
+        return contig
+
+    """Keep query results, dropping the least recently used ones beyond max_results
+    Input: LIST of (STRING query, STRING contig) tuples"""
+    def _keep_results(self, results):
+        with self._results_lock:
+            for query, contig in results:
+                self._results[query] = contig
+                self._results.move_to_end(query)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+
+    def _query(self, query):
+        if not self.search_tree.check(query, self.min_score):
+            return ""
+        return self.extend(query)
+
+    """Check a batch of queries against the reads at once (see BloomFilterSearchTree.check_batch)
+    Input: LIST queries, the query sequences
+    Output: LIST of BOOL, whether each query is (likely) in the reads"""
+    def check_all(self, queries):
+        return self.search_tree.check_batch(queries, self.min_score)
+
+    """Find the longest contig for a query that is already known to be in the reads, without checking it again
+    Input: STRING query, the query sequence
+    Output: STRING contig, the longest contig containing the query"""
+    def extend(self, query):
+        if self.targeted:
+            index = self.minimizer_index
+            return minimizer_index.targeted_contig(index, self._all_reads(), query, self.k, max_rounds=self.max_rounds,
+                                                   simplify=self.simplify)[0]
+        return self.graph.get_longest_contig(query)
+
+    """Build everything queries need up front, for example so that worker processes receive it ready-made rather than
+    each building their own"""
+    def build(self):
+        self.search_tree
+        if self.targeted:
+            self.minimizer_index
+        else:
+            self.graph
+
+    """Answer a set of queries
+    Input: DICT queries, dictionary where the key is the query ID and the value is the query sequence;
+            INT processes, the number of worker processes to answer the queries on (1 answers them in this process)
+    Output: DICT contigs, where the key is the query ID and the value is its longest contig ("" if not found)"""
+    def query_all(self, queries, processes=1):
+        if processes <= 1 or len(queries) <= 1:
+            return {query_ID: self.query(query) for query_ID, query in queries.items()}
+        self.build()
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(self,)) as executor:
+            contigs = list(executor.map(_query_in_worker, queries.values(),
+                                        chunksize=max(1, len(queries) // (4 * processes))))
+        self._keep_results(zip(queries.values(), contigs))
+        return dict(zip(queries.keys(), contigs))
+
+    """Add reads to the session. Whatever has been built is updated in place rather than rebuilt: the reads get new
+    leaves in the search tree and are added to the minimizer index, and the graph gets their k-mers (see
+    DeBruijnGraph.add_reads). Only the kept contigs that touch a node of the graph that changed are dropped, so
+    queries elsewhere are still answered straight away. With correct_errors the graph is built again on next use,
+    since the solid k-mer cutoff depends on every read.
+    Input: DICT reads, where the key is the sequence ID and the value is the sequence (or STRING, a FASTA/FASTQ file)"""
+    def add_reads(self, reads):
+        if isinstance(reads, str):
+            reads = reading_input.read_reads(reads)
+        with self._build_lock, instrumentation.stage("add_reads"):
+            self._added_reads.update(reads)
+            if self._search_tree is not None:
+                for read_ID, sequence in reads.items():
+                    self._search_tree.add(sequence, read_ID)
+            if self._minimizer_index is not None:
+                for read_ID, sequence in reads.items():
+                    self._minimizer_index.add(sequence, read_ID)
+            if self._graph is not None and self.correct_errors:
+                self._graph = None
+                with self._results_lock:
+                    self._results.clear()
+                return
+            if self._graph is not None:
+                changed = self._graph.add_reads(reads)
+            else:
+                if self._kmer_table is not None:
+                    for sequence in reads.values():
+                        self._kmer_table.add(kmer_array(sequence, self.k, self.canonical))
+                # without a graph, every node of the new reads counts as changed
+                nodes = [kmer_array(sequence, self.k - 1, self.canonical) for sequence in reads.values()]
+                changed = np.unique(np.concatenate(nodes)) if nodes else np.zeros(0, dtype=np.uint64)
+            self._invalidate(changed)
+        instrumentation.count("reads_added", len(reads))
+
+    """Drop the kept contigs (or, for queries that weren't found, the queries) that hold any of the changed nodes
+    Input: NUMPY ARRAY changed, the changed nodes (k-1 mers, canonical in canonical mode), sorted"""
+    def _invalidate(self, changed):
+        with self._results_lock:
+            if not self._results or len(changed) == 0:
+                return
+            queries = list(self._results)
+            nodes = [kmer_array(self._results[query] or query, self.k - 1, self.canonical) for query in queries]
+            owners = np.repeat(np.arange(len(queries)), [len(query_nodes) for query_nodes in nodes])
+            touched = np.isin(np.concatenate(nodes), changed)
+            for owner in np.unique(owners[touched]).tolist():
+                del self._results[queries[owner]]
+
+    """Save the search tree and the compacted graph to an index file (building them first if needed), so that later
+    runs can load them with load_session instead of going back to the reads
+    Input: STRING file_name"""
+    def save_index(self, file_name):
+        index_file.save_index(file_name, self.search_tree, self.graph)
+
+    """Drop the locks when a session is sent to a worker process (locks can't be pickled); the worker gets new ones"""
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_build_lock"]
+        del state["_results_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_lock = threading.Lock()
+        self._results_lock = threading.Lock()
@@ -0,0 +1,158 @@
+"""Description: Streaming quality control statistics of a read set: the read length histogram and N50, the GC content,
+duplicate reads and the k-mer abundance spectrum. The reads are taken in batches and every statistic is kept in a NumPy
+histogram or a fixed-size sketch, so the memory used doesn't grow with the number of reads, and the result is a small
+JSON document (plotting.py draws its histograms).
+Duplicate reads are found by hashing each read: a HyperLogLog sketch (hyperloglog.py) estimates the number of distinct
+reads, and a counting bloom filter of the read hashes gives the duplication levels, the same way error_correction.py
+counts k-mers. The k-mer spectrum can be taken from a sample of the distinct k-mers to keep its counters from filling up.
+"""
+import itertools
+import json
+import numpy as np
+from bloom_filter import CountingBloomFilter, hash64, string_key # import the filters and hashes from bloom_filter.py
+from error_correction import MAX_COUNT, update_abundance # import the abundance counting from error_correction.py
+from hyperloglog import HyperLogLog # import the distinct count sketch from hyperloglog.py
+from kmers import encode, kmer_array, INVALID # import the k-mer encoding from kmers.py
+import reading_input # import the file parser from reading_input.py
+
+# default number of 4-bit counters in each counting bloom filter (32 MB)
+DEFAULT_COUNTERS = 1 << 26
+# number of hash functions of the counting bloom filters
+NUM_HASH_FUNCTIONS = 3
+# the GC content of each read is binned by whole percent
+GC_BINS = 101
+# seed of the hash that picks the sampled k-mers, different from the seeds used by the filters
+_SAMPLE_SEED = 0x5eed
+
+
+"""Class for ReadStats object. Reads are added in batches and every statistic is updated as they go.
+"""
+class ReadStats:
+    """Initialize empty statistics
+    Input: INT k, the k-mer length of the spectrum; BOOL canonical, whether a k-mer and its reverse complement are counted
+            together; INT counters, the number of counters in each counting bloom filter;
+            FLOAT kmer_sample, the fraction of the distinct k-mers (picked by hash, so a k-mer is always or never
+            counted) that go into the spectrum, which is scaled back up by 1 / kmer_sample
+    Output: ReadStats object"""
+    def __init__(self, k, canonical=False, counters=DEFAULT_COUNTERS, kmer_sample=1.0):
+        if not 0 < kmer_sample <= 1:
+            raise ValueError("kmer_sample must be above 0 and at most 1")
+        self.k = k
+        self.canonical = canonical
+        self.kmer_sample = kmer_sample
+        self.num_reads = 0
+        # length_histogram[n] is the number of reads of length n
+        self.length_histogram = np.zeros(1, dtype=np.int64)
+        # gc_histogram[p] is the number of reads with p% GC (of their A, C, G and T bases)
+        self.gc_histogram = np.zeros(GC_BINS, dtype=np.int64)
+        self.gc_bases = 0
+        self.acgt_bases = 0
+        self._read_sketch = HyperLogLog()
+        self._read_counts = CountingBloomFilter(counters, NUM_HASH_FUNCTIONS)
+        # duplication_levels[c] is the (estimated) number of distinct reads seen c times
+        self.duplication_levels = np.zeros(MAX_COUNT + 1, dtype=np.int64)
+        self._kmer_sketch = HyperLogLog()
+        self._kmer_counts = CountingBloomFilter(counters, NUM_HASH_FUNCTIONS)
+        # kmer_spectrum[c] is the (estimated) number of sampled distinct k-mers seen c times; the distinct k-mers are
+        # estimated from the sample as well
+        self.kmer_spectrum = np.zeros(MAX_COUNT + 1, dtype=np.int64)
+
+    """Add a batch of reads
+    Input: LIST sequences, of sequence strings"""
+    def add(self, sequences):
+        if not sequences:
+            return
+        self.num_reads += len(sequences)
+        lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+        batch_lengths = np.bincount(lengths)
+        if len(batch_lengths) > len(self.length_histogram):
+            self.length_histogram = np.concatenate((self.length_histogram,
+                                                    np.zeros(len(batch_lengths) - len(self.length_histogram), np.int64)))
+        self.length_histogram[:len(batch_lengths)] += batch_lengths
+
+        # the reads are encoded together with an INVALID code between them, as in reading_input.read_batches
+        codes = encode("N".join(sequences))
+        starts = np.concatenate(([0], np.cumsum(lengths[:-1] + 1)))
+        gc = np.concatenate(([0], np.cumsum((codes == 1) | (codes == 2))))
+        acgt = np.concatenate(([0], np.cumsum(codes != INVALID)))
+        read_gc = gc[starts + lengths] - gc[starts]
+        read_acgt = acgt[starts + lengths] - acgt[starts]
+        self.gc_bases += int(read_gc.sum())
+        self.acgt_bases += int(read_acgt.sum())
+        has_bases = read_acgt > 0
+        # nearest whole percent, rounding halves up
+        percent = (200 * read_gc[has_bases] + read_acgt[has_bases]) // (2 * read_acgt[has_bases])
+        self.gc_histogram += np.bincount(percent, minlength=GC_BINS)
+
+        read_keys = np.concatenate([string_key(sequence) for sequence in sequences])
+        self._read_sketch.add_many(read_keys)
+        update_abundance(self._read_counts, self.duplication_levels, read_keys)
+
+        kmers = kmer_array(codes, self.k, self.canonical)
+        if self.kmer_sample < 1:
+            kmers = kmers[hash64(kmers, _SAMPLE_SEED) < np.uint64(self.kmer_sample * 2.0**64)]
+        self._kmer_sketch.add_many(kmers)
+        update_abundance(self._kmer_counts, self.kmer_spectrum, kmers)
+
+    """N50 of the reads: the length such that reads at least that long hold half of the bases
+    Output: INT n50 (0 if there are no bases)"""
+    def n50(self):
+        bases = self.length_histogram * np.arange(len(self.length_histogram))
+        total = int(bases.sum())
+        if total == 0:
+            return 0
+        # bases in reads of each length or longer
+        from_longest = np.cumsum(bases[::-1])[::-1]
+        return int(np.flatnonzero(2 * from_longest >= total)[-1])
+
+    """The statistics, as plain lists and numbers
+    Output: DICT stats"""
+    def to_dict(self):
+        lengths = np.flatnonzero(self.length_histogram)
+        num_bases = int((self.length_histogram * np.arange(len(self.length_histogram))).sum())
+        distinct_reads = min(len(self._read_sketch), self.num_reads)
+        return {
+            "reads": self.num_reads,
+            "bases": num_bases,
+            "min_length": int(lengths[0]) if len(lengths) else 0,
+            "max_length": int(lengths[-1]) if len(lengths) else 0,
+            "mean_length": num_bases / self.num_reads if self.num_reads else 0.0,
+            "n50": self.n50(),
+            # only the lengths that occur, to keep the output small
+            "length_histogram": {"lengths": lengths.tolist(), "counts": self.length_histogram[lengths].tolist()},
+            "gc_content": self.gc_bases / self.acgt_bases if self.acgt_bases else 0.0,
+            "gc_histogram": self.gc_histogram.tolist(),
+            "distinct_reads": distinct_reads,
+            "duplicate_reads": self.num_reads - distinct_reads,
+            "duplication_levels": self.duplication_levels.tolist(),
+            "k": self.k,
+            "canonical": self.canonical,
+            "distinct_kmers": int(round(self._kmer_sketch.estimate() / self.kmer_sample)),
+            "kmer_sample": self.kmer_sample,
+            "kmer_spectrum": np.rint(self.kmer_spectrum / self.kmer_sample).astype(np.int64).tolist()
+        }
+
+    """Write the statistics to a JSON file
+    Input: STRING file_name"""
+    def write_json(self, file_name):
+        with open(file_name, "w") as file:
+            json.dump(self.to_dict(), file, separators=(",", ":"))
+
+
+'''Compute the statistics of a read set in one streaming pass
+Input: DICT reads, of sequences by read ID (or STRING, the name of a FASTA/FASTQ file, or any iterable of sequences);
+        INT k, the k-mer length of the spectrum; BOOL canonical; INT batch_size, the number of reads per batch;
+        INT counters; FLOAT kmer_sample (see ReadStats)
+Output: ReadStats stats
+'''
+def read_set_stats(reads, k, canonical=False, batch_size=10000, counters=DEFAULT_COUNTERS, kmer_sample=1.0):
+    if isinstance(reads, str):
+        sequences = (sequence for _, sequence in reading_input.parse_sequences(reads))
+    else:
+        sequences = iter(reads.values() if isinstance(reads, dict) else reads)
+    stats = ReadStats(k, canonical, counters, kmer_sample)
+    while True:
+        batch = list(itertools.islice(sequences, batch_size))
+        if not batch:
+            return stats
+        stats.add(batch)
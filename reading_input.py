@@ -1,27 +1,160 @@
-"""Description: Functions related to reading input as well as exploring the read 
-count and length distributions.
+"""Description: Functions related to reading input (the statistics of a read set are computed in read_stats.py and
+plotted in plotting.py).
 """
 
-import matplotlib.pyplot as plt 
+import collections.abc
+import gzip
+import io
 import numpy as np
-import pandas as pd
+from kmers import encode # 2-bit base encoding from kmers.py
+import instrumentation # stage timers and counters from instrumentation.py
 
 # module 1: read in fasta file and query file
+# size of the read buffer used for the input files
+BUFFER_SIZE = 1 << 20
+
+'''
+Open an input file for reading as text. Gzip-compressed files are recognized by their magic number,
+so they don't need a .gz extension.
+Input: STRING file_name
+Output: FILE object
+'''
+def open_input(file_name):
+    if is_gzipped(file_name):
+        return io.TextIOWrapper(io.BufferedReader(gzip.open(file_name, "rb"), BUFFER_SIZE))
+    return open(file_name, buffering=BUFFER_SIZE)
+
+'''
+Check whether a file is gzip-compressed, by its magic number
+Input: STRING file_name
+Output: BOOL
+'''
+def is_gzipped(file_name):
+    with open(file_name, "rb") as file:
+        return file.read(2) == b"\x1f\x8b"
+
+"""Class for _LineReader object. Reads the lines of a binary file as text, keeping the byte offset where the last line
+read starts, so that the parsers can tell where each record starts in the file.
+"""
+class _LineReader:
+    def __init__(self, file):
+        self._file = file
+        # the offset of the next line, and of the line that was read last
+        self.offset = 0
+        self.line_offset = 0
+
+    def readline(self):
+        line = self._file.readline()
+        self.line_offset = self.offset
+        self.offset += len(line)
+        return line.decode()
+
+    def __iter__(self):
+        return iter(self.readline, "")
+
+'''
+Parse a FASTA or FASTQ file (optionally gzipped) one record at a time. FASTA sequences may be split over
+any number of lines, and FASTQ records may have multi-line sequences and qualities. Blank lines are skipped
+and records with an empty sequence are kept.
+Input: STRING file_name
+Output: GENERATOR of (sequence ID, sequence) tuples, in file order
+'''
+def parse_sequences(file_name):
+    with open_input(file_name) as file:
+        for sequence_ID, sequence, _ in _parse_records(file, file_name):
+            yield sequence_ID, sequence
+
+'''
+Parse the records of an open FASTA or FASTQ file
+Input: FILE file (or _LineReader); STRING file_name, for the error message
+Output: GENERATOR of (sequence ID, sequence, INT offset) tuples, where offset is the byte offset of the record's header
+        line when the file is a _LineReader (and None otherwise)
+'''
+def _parse_records(file, file_name):
+    line = file.readline()
+    while line and not line.strip():
+        line = file.readline()
+    if not line:
+        return
+    if line[0] == ">":
+        records = _parse_fasta(file, line)
+    elif line[0] == "@":
+        records = _parse_fastq(file, line)
+    else:
+        raise ValueError(file_name + " is not in FASTA or FASTQ format")
+    for record in records:
+        instrumentation.count("reads_parsed")
+        yield record
+
+'''
+Parse the records of a FASTA file
+Input: FILE file; STRING header, the first header line (already read)
+Output: GENERATOR of (sequence ID, sequence, offset) tuples (see _parse_records)
+'''
+def _parse_fasta(file, header):
+    sequence_ID = header.strip()[1:]
+    offset = getattr(file, "line_offset", None)
+    lines = []
+    for line in file:
+        if line[0] == ">":
+            yield sequence_ID, "".join(lines), offset
+            sequence_ID = line.strip()[1:]
+            offset = getattr(file, "line_offset", None)
+            lines = []
+        else:
+            lines.append(line.strip())
+    yield sequence_ID, "".join(lines), offset
+
+'''
+Parse the records of a FASTQ file. The quality lines are read (and discarded) until they are as long as the
+sequence, since a quality line can start with '@' too.
+Input: FILE file; STRING header, the first header line (already read)
+Output: GENERATOR of (sequence ID, sequence, offset) tuples (see _parse_records)
+'''
+def _parse_fastq(file, header):
+    while header:
+        if not header.strip():
+            header = file.readline()
+            continue
+        if header[0] != "@":
+            raise ValueError("expected a FASTQ header but found: " + header.strip())
+        sequence_ID = header.strip()[1:]
+        offset = getattr(file, "line_offset", None)
+        lines = []
+        line = file.readline()
+        while line and line[0] != "+":
+            lines.append(line.strip())
+            line = file.readline()
+        sequence = "".join(lines)
+        quality_length = 0
+        while quality_length < len(sequence):
+            line = file.readline()
+            if not line:
+                raise ValueError("FASTQ record " + sequence_ID + " is missing quality values")
+            quality_length += len(line.strip())
+        yield sequence_ID, sequence, offset
+        header = file.readline()
+
+'''
+Read a FASTA or FASTQ file into a dictionary
+Input: STRING file_name
+Output: DICTIONARY sequence_dictionary, where key is a sequence ID and value is corresponding sequence
+'''
+def _read_dictionary(file_name):
+    sequence_dictionary = {}
+    for sequence_ID, sequence in parse_sequences(file_name):
+        if sequence_ID in sequence_dictionary:
+            raise ValueError("duplicate sequence ID " + sequence_ID + " in " + file_name)
+        sequence_dictionary[sequence_ID] = sequence
+    return sequence_dictionary
+
 '''
 Read in FASTA file contatining the sequencing reads
 Input: STRING reads_file_name
 Output: DICTIONARY sequence_dictionary, where key is a sequence ID and value is corresponding sequence
 '''
 def read_reads(reads_file_name):
-    sequence_dictionary = {}
-    with open(reads_file_name) as file:
-        while True:
-            sequence_ID = file.readline().strip()[1:]
-            sequence = file.readline().strip()
-            if sequence_ID != "": # don't add an empty string to the dictionary
-                sequence_dictionary[sequence_ID] = sequence # break when there aren't anymore seqeunces in the file
-            if not sequence: break
-    return sequence_dictionary
+    return _read_dictionary(reads_file_name)
 
 '''
 Read in FASTA file contatining the initial query
@@ -29,85 +162,92 @@ Input: STRING query_file_name
 Output: DICTIONARY query_dictionary, where key is a sequence ID and value is corresponding sequence
 '''
 def read_query(query_file_name):
-    query_dictionary = {}
-    with open(query_file_name) as file:
-        while True:
-            query_ID = file.readline().strip()[1:]
-            query = file.readline().strip()
-            if query_ID != "": # don't add an empty string to the dictionary
-                query_dictionary[query_ID] = query # break when there aren't anymore sequences in the file
-            if not query: break
-    return query_dictionary
-
-# EXPLORE
-# 1. report the count distribution 
-# could also help to choose a threshold for the filtering step during error correction later
-'''
-Record the frequency of each read and store in a dictionary
-Then plot the read count on a barplot
-Input: DICTIONARY read_dict (output from read_reads function)
-Output: bar plot
-'''
-def assess_read_count_distribution(read_dict):
-    # first get a dictionary that records the number of times each unique sequence appears in the reads dictionary
-    read_count = {} # where each key is a read and the value is the count (MAYBE THE KEY SHOULD BE THE ID?)
-    for read_ID in read_dict.keys():
-        sequence = read_dict[read_ID]
-        if sequence in read_count:
-            read_count[sequence] +=1
-        else:
-            read_count[sequence] = 1
-
-    # look at the read count distribution (before error correction if applicable)
-    # sort the dictionary entries by ascending read count
-    read_count_dict_sorted = dict(sorted(read_count.items(),key=lambda x:x[1]))
-    # plot the read count distribution
-    ##plt.bar(list(read_count_dict_sorted.keys()), read_count_dict_sorted.values(), 1.0, color='g', tick_label = None)
-    read_count_sorted_list = [key for key, val in read_count_dict_sorted.items() for _ in range(val)] # need a list for the hist function
-    df = pd.DataFrame(list(read_count_dict_sorted.items()), columns=['Sequence', 'Frequency'])
-    plot = df.plot(kind='bar', x='Sequence', ylabel="Frequency", legend = False, title="Sequence Frequency")
-    plot.tick_params(axis="x", which="both", top = False, bottom = False, labelbottom=False)
-    fig = plot.get_figure()
-    fig.savefig('read_count_dist_plot.pdf')
-    #plt.hist(read_count_sorted_list, bins=100)
-    ##plt.tick_params(axis="x", which="both", top = False, bottom = False, labelbottom=False)
-    #plt.ylabel("Read Frequency")
-    #plt.axvline(np.mean(list(read_count_dict_sorted.values())), color='k', linestyle='dashed', linewidth=1)
-    #plt.savefig('read_count_distribution_plot.pdf')  
-    
-
-# 2. report read length distribution 
-# could help to also establish a read length threshold to further filter the reads
-'''
-Record the frequency of each read unique read lengthand store in a dictionary
-Then plot the read length on a barplot.
-Input: DICTIONARY read_dict (output from read_reads function)
-Output: bar plot
-'''
-def assess_read_length_distribution(read_dict):
-    read_length_dict = {}
-    for key in read_dict.keys():
-        read_length = len(read_dict[key])
-        if read_length in read_length_dict:
-            read_length_dict[read_length] += 1
+    return _read_dictionary(query_file_name)
+
+'''
+Read a FASTA or FASTQ file in batches of encoded reads (see kmers.py). The reads of a batch are concatenated
+into one array of base codes with an INVALID code between them, so kmers.kmer_array can get the k-mers of the
+whole batch at once without any k-mer spanning two reads.
+Input: STRING file_name; INT batch_size, the number of reads per batch
+Output: GENERATOR of (LIST sequence IDs, NUMPY ARRAY base codes) tuples
+'''
+def read_batches(file_name, batch_size=10000):
+    sequence_IDs = []
+    sequences = []
+    for sequence_ID, sequence in parse_sequences(file_name):
+        sequence_IDs.append(sequence_ID)
+        sequences.append(sequence)
+        if len(sequences) == batch_size:
+            yield sequence_IDs, encode("N".join(sequences))
+            sequence_IDs = []
+            sequences = []
+    if sequences:
+        yield sequence_IDs, encode("N".join(sequences))
+
+"""Class for IndexedReads object: the reads of a FASTA/FASTQ file, looked up by ID without holding them in memory.
+The file is read once (with scan) to record where each read's record starts, and a read is parsed from its record when
+it is looked up. A gzipped file can't be read from the middle without decompressing everything before it, so the
+sequences of a gzipped file are kept instead, packed one after another in a byte array.
+"""
+class IndexedReads(collections.abc.Mapping):
+    """Initialize the index. Nothing is read until scan is called.
+    Input: STRING file_name
+    Output: IndexedReads object"""
+    def __init__(self, file_name):
+        self.file_name = file_name
+        # the number of each read ID, in file order
+        self._numbers = {}
+        # read i is at bytes offsets[i]:offsets[i + 1] of the file (or of the packed sequences)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._sequences = None
+
+    """Read the file, recording where each read is, and hand each read on as it is read (so whatever else is built
+    from the reads is built in the same pass)
+    Output: GENERATOR of (sequence ID, sequence) tuples"""
+    def scan(self):
+        self._numbers = {}
+        offsets = []
+        if is_gzipped(self.file_name):
+            self._sequences = bytearray()
+            for sequence_ID, sequence in parse_sequences(self.file_name):
+                self._add(sequence_ID)
+                offsets.append(len(self._sequences))
+                self._sequences += sequence.encode()
+                yield sequence_ID, sequence
+            offsets.append(len(self._sequences))
         else:
-            read_length_dict[read_length] = 1
-    
-    # look at the read length distribution (before error correction if applicable)
-    # sort the dictionary entries by read length
-    read_length_dict_sorted = dict(sorted(read_length_dict.items(),key=lambda x:x[1], reverse = True))
-    
-    #read_length_sorted_list = [val for key, val in read_length_dict_sorted.items() for _ in range(val)]
-
-    #plt.hist(read_length_sorted_list, bins=100)
-    #plt.bar(list(read_length_dict_sorted.keys()), read_length_dict_sorted.values(), 1.0, color='g', tick_label = None)
-    df = pd.DataFrame(list(read_length_dict_sorted.items()), columns=['Read Length', 'Frequency'])
-    plot = df.plot(kind='bar', x='Read Length', ylabel="Frequency", legend = False, title="Read Length Frequency")
-    fig = plot.get_figure()
-    fig.savefig('read_length_dist_plot.pdf')
-
-
-    ##plt.tick_params(axis="x", which="both", top = False, bottom = False, labelbottom=False)
-    #plt.ylabel("Read Length")
-    #plt.savefig('read_length_distribution_plot.pdf') 
+            with open(self.file_name, "rb", buffering=BUFFER_SIZE) as file:
+                reader = _LineReader(file)
+                for sequence_ID, sequence, offset in _parse_records(reader, self.file_name):
+                    self._add(sequence_ID)
+                    offsets.append(offset)
+                    yield sequence_ID, sequence
+                offsets.append(reader.offset)
+        self._offsets = np.array(offsets, dtype=np.int64)
+
+    """Number a new read ID
+    Input: STRING sequence_ID"""
+    def _add(self, sequence_ID):
+        if sequence_ID in self._numbers:
+            raise ValueError("duplicate sequence ID " + sequence_ID + " in " + self.file_name)
+        self._numbers[sequence_ID] = len(self._numbers)
+
+    """Look up a read's sequence
+    Input: STRING sequence_ID
+    Output: STRING sequence"""
+    def __getitem__(self, sequence_ID):
+        number = self._numbers[sequence_ID]
+        start, end = self._offsets[number:number + 2].tolist()
+        if self._sequences is not None:
+            return self._sequences[start:end].decode()
+        with open(self.file_name, "rb") as file:
+            file.seek(start)
+            record = io.StringIO(file.read(end - start).decode())
+        header = record.readline()
+        return next(_parse_fasta(record, header) if header[0] == ">" else _parse_fastq(record, header))[1]
+
+    def __iter__(self):
+        return iter(self._numbers)
 
+    def __len__(self):
+        return len(self._numbers)
@@ -0,0 +1,64 @@
+""" Description: Unit tests for the benchmark suite and read simulator.
+"""
+import unittest
+import os
+import tempfile
+from benchmark import *
+
+class TestInput(unittest.TestCase):
+    def test_simulate_genome(self):
+        genome = simulate_genome(1000, num_repeats=3, repeat_length=100, seed=4)
+        self.assertEqual(len(genome), 1000)
+        self.assertEqual(genome, simulate_genome(1000, num_repeats=3, repeat_length=100, seed=4))
+        self.assertNotEqual(genome, simulate_genome(1000, num_repeats=3, repeat_length=100, seed=5))
+        self.assertTrue(set(genome) <= set("ACGT"))
+
+    def test_simulate_reads(self):
+        genome = simulate_genome(1000, seed=4)
+        reads = simulate_reads(genome, 50, 10, seed=4)
+        self.assertEqual(len(reads), 200)
+        self.assertTrue(all(sequence in genome for sequence in reads.values()))
+        self.assertEqual(reads, simulate_reads(genome, 50, 10, seed=4))
+        noisy = simulate_reads(genome, 50, 10, error_rate=0.05, seed=4)
+        self.assertTrue(any(sequence not in genome for sequence in noisy.values()))
+        both = simulate_reads(genome, 50, 10, seed=4, both_strands=True)
+        self.assertTrue(all(sequence in genome or reverse_complement(sequence) in genome for sequence in both.values()))
+
+    def test_false_positive_rate(self):
+        kmers = np.unique(kmer_array(simulate_genome(5000, seed=1), 15))
+        rates = measure_false_positive_rate(kmers, 15, 0.01, num_trials=20000)
+        self.assertAlmostEqual(rates["predicted"], 0.01, delta=0.005)
+        self.assertLess(rates["measured"], 0.02)
+
+    def test_run_tiers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "results.json")
+            results = run_tiers(["tiny"], file_name)
+            with open(file_name) as file:
+                self.assertEqual(json.load(file), results)
+        result = results["tiny"]
+        self.assertEqual(list(result["stages"]), ["read_reads", "filter_build", "check", "kmer_table", "graph_build",
+                                                  "get_longest_contig"])
+        self.assertTrue(all(stage["seconds"] >= 0 and stage["peak_bytes"] > 0 for stage in result["stages"].values()))
+        self.assertEqual(result["counts"]["reads"], 200)
+        self.assertGreater(result["counts"]["queries_found"], 0)
+        # the tree is sized for the whole read set, so neither the root nor the leaves fill up past the target rate
+        tree_rates = result["tree_false_positive_rate"]
+        self.assertLess(tree_rates["root"]["measured"], 2 * 0.01)
+        self.assertAlmostEqual(tree_rates["root"]["predicted"], 0.01, delta=0.005)
+        self.assertEqual(tree_rates["leaves"]["num_leaves"], 7)
+        self.assertLess(tree_rates["leaves"]["measured_max"], 2 * 0.01)
+        result = run_benchmark(1000, 50, 5, num_queries=3, memory=False)
+        self.assertTrue(all(stage["peak_bytes"] is None for stage in result["stages"].values()))
+
+    def test_tree_false_positive_rate(self):
+        # many small leaves, each sized for its own bin of reads
+        result = run_benchmark(20000, 100, 10, num_queries=3, false_positive_rate=0.001, memory=False)
+        tree_rates = result["tree_false_positive_rate"]
+        self.assertGreater(tree_rates["leaves"]["num_leaves"], 50)
+        self.assertLess(tree_rates["leaves"]["mean_array_size"], tree_rates["root"]["array_size"] / 4)
+        self.assertLess(tree_rates["root"]["measured"], 2 * 0.001)
+        self.assertLess(tree_rates["leaves"]["measured_mean"], 2 * 0.001)
+
+if __name__ == '__main__':
+    unittest.main()
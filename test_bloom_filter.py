@@ -2,6 +2,7 @@
 """
 import unittest
 from bloom_filter import *
+from kmers import kmer_array
 
 class TestInput(unittest.TestCase):
     ''' Verify that the calculations are as expected.
@@ -29,5 +30,54 @@ class TestInput(unittest.TestCase):
 
         #self.assertFalse(bf.check("7711"))
 
+    '''The bits are packed into 64-bit words and the hashes do not depend on the process
+    '''
+    def test_bloom_filter_packed_and_deterministic(self):
+        bf = BloomFilter(959, 7)
+        self.assertEqual(bf.array.dtype, np.uint64)
+        self.assertEqual(len(bf.array), 15)
+        self.assertEqual(bf._hash(string_key("SEQUENCE")).tolist(),
+                         BloomFilter(959, 7)._hash(string_key("SEQUENCE")).tolist())
+        # all of the probes for one item should not be bunched together
+        self.assertEqual(len(set(bf._hash(string_key("SEQUENCE"))[0].tolist())), 7)
+
+    '''The measured false positive rate should match what get_m and get_k were sized for
+    '''
+    def test_false_positive_rate(self):
+        n, p = 2000, 0.01
+        m = get_m(n, p)
+        bf = BloomFilter(m, get_k(n, m))
+        for i in range(n):
+            bf.add("added_" + str(i))
+        false_positives = sum(bf.check("absent_" + str(i)) for i in range(20000))
+        self.assertLess(false_positives / 20000, 2 * p)
+        self.assertAlmostEqual(bf.estimated_false_positive_rate(), p, delta=p)
+
+    def test_add_many_check_many(self):
+        bf = BloomFilter(get_m(100, 0.001), get_k(100, get_m(100, 0.001)))
+        seen = kmer_array("ACGTTGCATGCAAGTCCGATGCAAATGCGT", 8)
+        bf.add_many(seen)
+        self.assertTrue(bf.check_many(seen).all())
+        unseen = kmer_array("TTTTTTTTTTGGGGGGGGGG", 8)
+        self.assertEqual(bf.check_many(unseen).shape, unseen.shape)
+        self.assertFalse(bf.check_many(unseen).all())
+
+    def test_counting_bloom_filter(self):
+        cbf = CountingBloomFilter(get_m(100, 0.001), get_k(100, get_m(100, 0.001)))
+        kmers = kmer_array("ACGTTGCATGCAAGTCCGATGCAAATGCGT", 8)
+        cbf.add_many(kmers)
+        cbf.add_many(kmers[:5])
+        self.assertEqual(cbf.count_many(kmers[:5]).tolist(), [2] * 5)
+        self.assertTrue(cbf.check_many(kmers).all())
+        self.assertEqual(cbf.check_many(kmers, min_count=2).tolist(), [True] * 5 + [False] * (len(kmers) - 5))
+        cbf.remove_many(kmers[5:])
+        self.assertFalse(cbf.check_many(kmers[5:]).any())
+        self.assertTrue(cbf.check_many(kmers[:5]).all())
+        # counters saturate at 15 and then stay there
+        for _ in range(20):
+            cbf.add("SEQUENCE")
+        cbf.remove("SEQUENCE")
+        self.assertEqual(cbf.count_many(string_key("SEQUENCE")).tolist(), [15])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
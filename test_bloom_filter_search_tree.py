@@ -2,13 +2,14 @@
 """
 import unittest
 from bloom_filter_search_tree import *
+from kmers import encode_kmer
 
 class TestInput(unittest.TestCase):
     def test_get_kmers(self):
-        expected = ["ACT", "CTG", "TGC", "GCT", "CTA"]
+        expected = [encode_kmer(kmer) for kmer in ["ACT", "CTG", "TGC", "GCT", "CTA"]]
         temp = BloomFilterSearchTree(3, 20, 2)
         observed = temp._get_kmers("ACTGCTA")
-        self.assertEqual(expected, observed)
+        self.assertEqual(expected, observed.tolist())
 
     def test_check(self):
         temp = BloomFilterSearchTree(3, 20, 2)
@@ -17,6 +18,120 @@ class TestInput(unittest.TestCase):
         self.assertFalse(temp.check("JADE"))
         #self.assertTrue(temp.check("GTC"))
 
+    def test_query(self):
+        reads = {
+            "SEQ1": "ACGTTGCATGCAAGTC",
+            "SEQ2": "TTTTGGGGCCCCAAAA",
+            "SEQ3": "GCATGCAAGTCCGATG",
+            "SEQ4": "CGCGATATCGCGATAT"
+        }
+        temp = BloomFilterSearchTree(5, get_m(50, 0.001), 7, reads_per_leaf=1)
+        for read_ID, sequence in reads.items():
+            temp.add(sequence, read_ID)
+        # a tree with four leaves has three internal nodes
+        self.assertEqual(temp.num_nodes, 7)
+        self.assertEqual(sorted(temp.query("GCATGCAAGTC")), ["SEQ1", "SEQ3"])
+        self.assertEqual(temp.query("GGGGCCCC"), ["SEQ2"])
+        self.assertEqual(temp.query("ACGTTGCATGCAAGTCCGATG"), [])
+        self.assertEqual(sorted(temp.query("ACGTTGCATGCAAGTCCGATG", theta=0.5)), ["SEQ1", "SEQ3"])
+        # the query spans two reads, but all of its k-mers are in the read set
+        self.assertTrue(temp.check("ACGTTGCATGCAAGTCCGATG"))
+
+    def test_reads_per_leaf(self):
+        temp = BloomFilterSearchTree(5, get_m(50, 0.001), 7, reads_per_leaf=2)
+        for read_ID, sequence in [("A", "ACGTTGCATG"), ("B", "TTTTGGGGCC"), ("C", "CGCGATATCG")]:
+            temp.add(sequence, read_ID)
+        # the second bin only becomes a leaf when the tree is searched
+        self.assertEqual(temp.num_nodes, 1)
+        temp.flush()
+        self.assertEqual(temp.num_nodes, 3)
+        self.assertEqual(temp.query("GGGGCC"), ["A", "B"])
+        self.assertEqual(temp.query("CGATAT"), ["C"])
+
+    def test_scored_search(self):
+        reads = {
+            "SEQ1": "ACGTTGCATGCAAGTC",
+            "SEQ2": "TTTTGGGGCCCCAAAA",
+            "SEQ3": "GCATGCAAGTCCGATG"
+        }
+        temp = BloomFilterSearchTree(5, get_m(50, 0.001), 7, reads_per_leaf=1)
+        for read_ID, sequence in reads.items():
+            temp.add(sequence, read_ID)
+        # SEQ1 with one base changed in the middle: 5 of its 12 k-mers hold the change
+        query = "ACGTTGCGTGCAAGTC"
+        self.assertFalse(temp.check(query))
+        self.assertTrue(temp.check(query, theta=0.5))
+        self.assertFalse(temp.check(query, theta=0.7))
+        batch = [query, "GCATGCAAG", "GGGGGGGGG", "ACG", "CCGATG"]
+        for theta in [1.0, 0.5]:
+            self.assertEqual(temp.check_batch(batch, theta), [temp.check(seq, theta) for seq in batch])
+        self.assertEqual(temp.check_batch(batch), [False, True, False, False, True])
+        self.assertAlmostEqual(temp.score(query), 7 / 12)
+        fraction, coverage = temp.score(query, positional=True)
+        self.assertAlmostEqual(fraction, 7 / 12)
+        self.assertAlmostEqual(coverage, 15 / 16) # only the changed base isn't covered
+        self.assertEqual(temp.score("ACGTTGCATG"), 1.0)
+        matches = temp.scored_query(query, theta=0.5)
+        self.assertEqual([read_ID for read_ID, _ in matches], ["SEQ1"])
+        self.assertAlmostEqual(matches[0][1], 7 / 12)
+        matches = temp.scored_query("GCATGCAAGTCCG", theta=0.5, positional=True)
+        self.assertEqual([match[0] for match in matches], ["SEQ3", "SEQ1"])
+        self.assertEqual(matches[0][1:], (1.0, 1.0))
+        self.assertEqual(temp.scored_query(query, theta=0.9), [])
+
+    def test_early_stop(self):
+        temp = BloomFilterSearchTree(5, get_m(50, 0.001), 7)
+        temp.add("ACGTTGCATGCAAGTC" * 40, "SEQ1")
+        query = "TTTTGGGGCCCCAAAA" * 40
+        temp.flush()
+        positions = temp._hasher._hash(temp._get_kmers(query))
+        solid = np.ones(len(positions), dtype=bool)
+        # no k-mer is found, so after the first chunk the threshold of half of them is out of reach
+        self.assertEqual(temp._count_found(temp.root, positions, solid, 0.5 * len(positions)), 0)
+        positions = temp._hasher._hash(temp._get_kmers("ACGTTGCATGCAAGTC" * 40))
+        self.assertEqual(temp._count_found(temp.root, positions, solid, 10), SCORE_CHUNK)
+        self.assertEqual(temp._count_found(temp.root, positions, solid, 10, exact=True), len(positions))
+
+    def test_canonical(self):
+        temp = BloomFilterSearchTree(5, get_m(50, 0.001), 7, reads_per_leaf=1, canonical=True)
+        for read_ID, sequence in [("A", "ACGTTGCATG"), ("B", "TTTTGGGGCC")]:
+            temp.add(sequence, read_ID)
+        # the reverse complement of part of read A
+        self.assertTrue(temp.check("CATGCAACG"))
+        self.assertEqual(temp.query("CATGCAACG"), ["A"])
+        self.assertFalse(BloomFilterSearchTree(5, get_m(50, 0.001), 7).check("CATGCAACG"))
+
+    def test_min_kmer_count(self):
+        temp = BloomFilterSearchTree(5, get_m(50, 0.001), 7, reads_per_leaf=1, min_kmer_count=2)
+        for read_ID, sequence in [("A", "ACGTTGCATG"), ("B", "ACGTTGCATG"), ("C", "ACGTAGCATG")]:
+            temp.add(sequence, read_ID)
+        self.assertTrue(temp.check("ACGTTGCATG"))
+        # the k-mers of read C were only seen once
+        self.assertFalse(temp.check("ACGTAGCATG"))
+        self.assertEqual(temp.query("ACGTAGCATG", theta=0.5), [])
+        self.assertEqual(sorted(temp.query("GTTGCATG")), ["A", "B"])
+
+    def test_node_sizes(self):
+        rng = np.random.default_rng(1)
+        reads = {"read_%d" % i: "".join(rng.choice(list("ACGT"), 100)) for i in range(300)}
+        num_kmers = 300 * 80
+        temp = BloomFilterSearchTree(21, get_m(num_kmers, 0.01), get_k(num_kmers, get_m(num_kmers, 0.01)))
+        for read_ID, sequence in reads.items():
+            temp.add(sequence, read_ID)
+        temp.flush()
+        # one leaf per bin of reads, and one internal node fewer than the leaves
+        num_leaves = -(-len(reads) // DEFAULT_READS_PER_LEAF)
+        self.assertEqual(len(temp.leaf_reads), num_leaves)
+        self.assertEqual(temp.num_nodes, 2 * num_leaves - 1)
+        self.assertEqual(temp.sizes[temp.root], temp.array_size)
+        # the leaves are sized for their own reads, so all of the filters together are only a few times the root
+        self.assertTrue(all(temp.sizes[leaf] < temp.array_size for leaf in temp.leaf_reads))
+        self.assertLess(temp.words_used, 6 * num_words(temp.array_size))
+        # every read is still found, in its own leaf
+        for read_ID in ["read_0", "read_150", "read_299"]:
+            self.assertIn(read_ID, temp.query(reads[read_ID]))
+            self.assertLess(len(temp.query(reads[read_ID])), 2 * DEFAULT_READS_PER_LEAF)
+        self.assertEqual(temp.query("".join(rng.choice(list("ACGT"), 100))), [])
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,6 +1,7 @@
 """ Description: Unit tests for the de Bruijn Graph class.
 """
 import unittest
+import random
 from de_bruijn_graph import *
 
 class TestInput(unittest.TestCase):
@@ -56,6 +57,20 @@ class TestInput(unittest.TestCase):
     #    self.assertEqual(expected_kmer_table, observed_kmer_table)
     #    self.assertEqual(expected_graph, observed_graph)
 
+    def test_kmer_table(self):
+        reads = {
+            "SEQ1": "ATGCTA",
+            "SEQ2": "GCTAGC",
+            "SEQ3": "TAGCAC"
+        }
+        temp = DeBruijnGraph(reads, 3)
+        self.assertEqual(len(temp.kmer_table), 8)
+        self.assertEqual(temp.kmer_table[encode_kmer("GCT")], 2)
+        self.assertEqual(temp.kmer_table[encode_kmer("AGC")], 2)
+        # dropping k-mers that were only seen once
+        temp = DeBruijnGraph(reads, 3, min_count=2)
+        self.assertEqual(sorted(decode_kmer(kmer, 3) for kmer in temp.kmer_table.kmers), ["AGC", "CTA", "GCT", "TAG"])
+
     def test_get_longest_contig(self):
         reads = {
             "SEQ1": "ATGCTA",
@@ -66,9 +81,165 @@ class TestInput(unittest.TestCase):
         }
         k = 3
         temp = DeBruijnGraph(reads, k)
+        # these reads come from a repeat: GC and CA each have two successors, so the query can't be extended
+        # unambiguously in either direction
         observed_contig = temp.get_longest_contig("GCTAGC")
-        expected_contig = "ATGCTAGCACATGC"
+        expected_contig = "GCTAGC"
         self.assertEqual(expected_contig, observed_contig)
 
+        # reads tiling ATGGCGTACCTTAGCCAAGT, which has no repeated 4-mers
+        reads = {
+            "SEQ1": "ATGGCGTA",
+            "SEQ2": "CGTACCTT",
+            "SEQ3": "CCTTAGCC",
+            "SEQ4": "AGCCAAGT"
+        }
+        temp = DeBruijnGraph(reads, 5)
+        self.assertEqual(temp.get_longest_contig("TACCTTAG"), "ATGGCGTACCTTAGCCAAGT")
+        # a query whose ends aren't in the graph is returned as it is
+        self.assertEqual(temp.get_longest_contig("GGGGGGGG"), "GGGGGGGG")
+
+    def test_degrees(self):
+        reads = {
+            "SEQ1": "ATGCTA",
+            "SEQ2": "GCTAGC",
+            "SEQ3": "TAGCAC",
+            "SEQ4": "GCACAT",
+            "SEQ5": "ACATGC"
+        }
+        temp = DeBruijnGraph(reads, 3)
+        self.assertEqual(len(temp.nodes), 8)
+        self.assertEqual(temp.out_degree(encode_kmer("GC")), 2)
+        self.assertEqual(temp.in_degree(encode_kmer("GC")), 2)
+        self.assertEqual(temp.out_degree(encode_kmer("TA")), 1)
+        self.assertEqual(temp.out_mask(encode_kmer("CA")), 0b1010) # followed by C and T
+        self.assertEqual(temp.in_degree(encode_kmer("GG")), 0)
+
+    def test_compact(self):
+        reads = {
+            "SEQ1": "ATGCTA",
+            "SEQ2": "GCTAGC",
+            "SEQ3": "TAGCAC",
+            "SEQ4": "GCACAT",
+            "SEQ5": "ACATGC"
+        }
+        temp = DeBruijnGraph(reads, 3)
+        unitigs = temp.compact()
+        self.assertEqual(sorted(unitigs), ["CACA", "CATGC", "GCA", "GCTAGC"])
+        # every k-mer is in exactly one unitig
+        self.assertEqual(sum(len(unitig) - 2 for unitig in unitigs), len(temp.kmer_table))
+        unitig_id, offset = temp.unitig_of(encode_kmer("TAG"))
+        self.assertEqual(unitigs[unitig_id][offset:offset + 3], "TAG")
+        self.assertIsNone(temp.unitig_of(encode_kmer("GGG")))
+        self.assertEqual(temp.get_longest_contig("GCTAGC"), "GCTAGC")
+        self.assertEqual(temp.get_longest_contig("ATG"), "CATGC")
+
+    def test_compact_matches_walk(self):
+        # the unitig lookups should give the same contigs as walking the graph
+        random.seed(7712)
+        genome = "".join(random.choice("ACGT") for _ in range(300))
+        genome = genome + genome[40:70] + genome # add repeats so that there are branches
+        reads = {str(i): genome[i:i + 40] for i in range(0, len(genome) - 40, 7)}
+        temp = DeBruijnGraph(reads, 9)
+        queries = [genome[i:i + 25] for i in range(0, len(genome) - 25, 13)]
+        walked = [temp.get_longest_contig(query) for query in queries]
+        temp.compact()
+        self.assertEqual(walked, [temp.get_longest_contig(query) for query in queries])
+
+    def test_canonical(self):
+        # reads from both strands of ATGGCGTACCTTAGCCAAGTTCAGGA
+        reads = {
+            "SEQ1": "ATGGCGTACCTT",
+            "SEQ2": "TTGGCTAAGGTA",
+            "SEQ3": "GCCAAGTTCA",
+            "SEQ4": "TCCTGAACT"
+        }
+        genome = "ATGGCGTACCTTAGCCAAGTTCAGGA"
+        temp = DeBruijnGraph(reads, 6)
+        self.assertEqual(temp.get_longest_contig("CGTACC"), "ATGGCGTACCTT")
+        temp = DeBruijnGraph(reads, 6, canonical=True)
+        self.assertEqual(len(temp.kmer_table), len(genome) - 5)
+        self.assertEqual(temp.get_longest_contig("CGTACC"), genome)
+        self.assertEqual(temp.get_longest_contig("GGTACG"), reverse_complement(genome))
+        self.assertEqual(temp.compact(), [genome])
+        self.assertEqual(temp.get_longest_contig("CGTACC"), genome)
+        self.assertEqual(temp.get_longest_contig("GGTACG"), reverse_complement(genome))
+
+    def test_canonical_folds(self):
+        # GCCACGTGGC is its own reverse complement, so past it the walk would turn back along the other strand
+        read = "GCCACGTGGCACTCCCTAGCAAATCCAAGAAGTGA"
+        temp = DeBruijnGraph({"SEQ1": read}, 10, canonical=True)
+        self.assertEqual(temp.get_longest_contig("GTGGCACTCCCTA"), read)
+        self.assertEqual([min(unitig, reverse_complement(unitig)) for unitig in temp.compact()], [read])
+        self.assertEqual(temp.get_longest_contig("GTGGCACTCCCTA"), read)
+        # nothing extends a query past a palindrome at its end, on either strand
+        self.assertEqual(temp.get_longest_contig(read[:14]), read)
+        self.assertEqual(temp.get_longest_contig(reverse_complement(read[:14])), reverse_complement(read))
+
+    def test_canonical_folds_random(self):
+        # genomes with palindromes (k-mers for even k, k-1 mers for odd k) and reads from both strands: walking the
+        # graph, the unitigs and unitigs updated as reads are added should all give the same contigs, and every k-mer
+        # should be in exactly one unitig
+        random.seed(1509)
+        for k in [10, 11]:
+            for _ in range(12):
+                parts = []
+                for _ in range(random.randint(1, 4)):
+                    half = "".join(random.choice("ACGT") for _ in range(random.choice([k, k + 2]) // 2))
+                    parts += ["".join(random.choice("ACGT") for _ in range(random.randint(5, 40))),
+                              half + reverse_complement(half)]
+                genome = "".join(parts)
+                reads = []
+                for _ in range(random.randint(3, 12)):
+                    start = random.randint(0, len(genome) - k)
+                    read = genome[start:start + random.randint(k, 40)]
+                    reads.append(reverse_complement(read) if random.random() < 0.5 else read)
+                walked = DeBruijnGraph(reads, k, canonical=True)
+                compacted = DeBruijnGraph(reads, k, canonical=True)
+                compacted.compact()
+                updated = DeBruijnGraph(reads[:len(reads) // 2], k, canonical=True)
+                updated.compact()
+                for i in range(len(reads) // 2, len(reads), 2):
+                    updated.add_reads(reads[i:i + 2])
+                for temp in [compacted, updated]:
+                    self.assertEqual(temp._index_kmers.tolist(), temp.kmer_table.kmers.tolist())
+                queries = [genome[i:i + random.randint(k, k + 8)] for i in range(len(genome) - k + 1)]
+                for query in queries + [reverse_complement(query) for query in queries]:
+                    contig = walked.get_longest_contig(query)
+                    self.assertEqual(compacted.get_longest_contig(query), contig)
+                    self.assertEqual(updated.get_longest_contig(query), contig)
+
+    def test_compact_cycle(self):
+        # a circular sequence gives a graph where every node has one edge in and one out
+        reads = {"SEQ1": "ACGGTCACGG"}
+        temp = DeBruijnGraph(reads, 4)
+        walked = temp.get_longest_contig("CGGTC")
+        self.assertEqual(temp.compact(), ["ACGGTCACG"])
+        self.assertEqual(temp.get_longest_contig("CGGTC"), walked)
+
+    def test_add_reads(self):
+        # adding reads to a compacted graph should give the same graph as building it from all of the reads
+        random.seed(3301)
+        genome = "".join(random.choice("ACGT") for _ in range(400))
+        genome = genome + genome[100:130] + genome[:200] # repeats, so the new reads add branches
+        reads = [genome[i:i + 40] for i in range(0, len(genome) - 40, 5)]
+        reads.append(genome[50:70] + "T" + genome[71:90]) # and an error, which adds a bubble
+        random.shuffle(reads)
+        for canonical in [False, True]:
+            temp = DeBruijnGraph(reads[:20], 9, canonical=canonical)
+            temp.compact()
+            changed = temp.add_reads(reads[20:])
+            self.assertGreater(len(changed), 0)
+            full = DeBruijnGraph(reads, 9, canonical=canonical)
+            full.compact()
+            self.assertEqual(temp.nodes.tolist(), full.nodes.tolist())
+            self.assertEqual(temp.edges.tolist(), full.edges.tolist())
+            self.assertEqual(temp.kmer_table.counts.tolist(), full.kmer_table.counts.tolist())
+            key = (lambda unitig: min(unitig, reverse_complement(unitig))) if canonical else (lambda unitig: unitig)
+            self.assertEqual(sorted(map(key, temp.unitigs)), sorted(map(key, full.unitigs)))
+            for i in range(0, len(genome) - 25, 11):
+                self.assertEqual(temp.get_longest_contig(genome[i:i + 25]), full.get_longest_contig(genome[i:i + 25]))
+            self.assertEqual(len(temp.add_reads(reads[:10])), 0) # nothing new
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
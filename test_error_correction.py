@@ -0,0 +1,55 @@
+""" Description: Unit tests for the solid k-mer filtering.
+"""
+import unittest
+import random
+from error_correction import *
+from bloom_filter import get_m, get_k
+from de_bruijn_graph import DeBruijnGraph
+
+class TestInput(unittest.TestCase):
+    def setUp(self):
+        # reads at about 20x coverage of a random genome, with one sequencing error in every fourth read
+        random.seed(7712)
+        self.genome = "".join(random.choice("ACGT") for _ in range(400))
+        self.reads = {}
+        for i in range(200):
+            start = random.randrange(0, len(self.genome) - 40)
+            read = list(self.genome[start:start + 40])
+            if i % 4 == 0:
+                position = random.randrange(40)
+                read[position] = random.choice([base for base in "ACGT" if base != read[position]])
+            self.reads["read_" + str(i)] = "".join(read)
+        self.array_size = get_m(10000, 0.001)
+        self.num_hash_functions = get_k(10000, self.array_size)
+
+    def test_histogram_and_cutoff(self):
+        abundance, histogram = count_kmer_abundance(self.reads.values(), 15, self.array_size, self.num_hash_functions)
+        self.assertEqual(len(histogram), MAX_COUNT + 1)
+        # the error k-mers pile up at a count of 1
+        self.assertGreater(histogram[1], histogram[2])
+        cutoff = solid_kmer_cutoff(histogram)
+        self.assertGreater(cutoff, 1)
+        self.assertLess(cutoff, 8)
+        self.assertEqual(solid_kmer_cutoff(np.array([0, 50, 20, 10, 5, 1])), 1)
+        self.assertEqual(solid_kmer_cutoff(np.array([0, 50, 20, 10, 30, 1])), 3)
+
+    def test_correct_reads(self):
+        abundance, histogram = count_kmer_abundance(self.reads.values(), 15, self.array_size, self.num_hash_functions)
+        cutoff = solid_kmer_cutoff(histogram)
+        trimmed = dict(correct_reads(self.reads.items(), 15, abundance, cutoff))
+        dropped = dict(correct_reads(self.reads.items(), 15, abundance, cutoff, mode="drop"))
+        self.assertLess(len(dropped), len(trimmed))
+        # every kept read (or trimmed part of one) is error-free
+        for sequence in trimmed.values():
+            self.assertIn(sequence, self.genome)
+        # the error-free reads are kept whole
+        self.assertEqual(trimmed["read_1"], self.reads["read_1"])
+        # the graph of the corrected reads has no error k-mers left
+        raw_graph = DeBruijnGraph(self.reads, 15)
+        corrected_graph = DeBruijnGraph(trimmed, 15)
+        genome_kmers = set(DeBruijnGraph({"genome": self.genome}, 15).kmer_table.kmers.tolist())
+        self.assertTrue(set(corrected_graph.kmer_table.kmers.tolist()) <= genome_kmers)
+        self.assertLess(len(corrected_graph.nodes), len(raw_graph.nodes))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+""" Description: Unit tests for the extension cache.
+"""
+import unittest
+import sys
+import random
+from extension_cache import *
+from de_bruijn_graph import DeBruijnGraph
+from kmers import kmer_array
+
+class TestInput(unittest.TestCase):
+    def test_get(self):
+        cache = ExtensionCache()
+        cache.add("ACGTTG", [("a", 0, 6), ("b", 2, 6), ("c", 6, 6)])
+        self.assertEqual(cache.get("a"), "ACGTTG")
+        self.assertEqual(cache.get("b"), "GTTG")
+        self.assertEqual(cache.get("c"), "")
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+        self.assertEqual(cache.nbytes, sys.getsizeof("ACGTTG") + 3 * ENTRY_BYTES)
+
+    def test_eviction(self):
+        walk_bytes = sys.getsizeof("ACGT")
+        cache = ExtensionCache(2 * walk_bytes + 3 * ENTRY_BYTES)
+        cache.add("ACGT", [("a", 0, 4), ("b", 1, 4)])
+        cache.add("TTTT", [("c", 0, 4)])
+        self.assertEqual(cache.get("a"), "ACGT") # a is now more recently used than b
+        cache.add("GGGG", [("d", 0, 4)])
+        # b goes first, but a still holds the first walk, so c has to go too
+        self.assertEqual([cache.get(key) for key in "abcd"], ["ACGT", None, None, "GGGG"])
+        self.assertEqual(cache.evictions, 2)
+        self.assertEqual(cache.nbytes, 2 * walk_bytes + 2 * ENTRY_BYTES)
+        # a walk that can't fit on its own is not stored
+        cache.add("A" * 1000, [("e", 0, 1000)])
+        self.assertIsNone(cache.get("e"))
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+    def test_graph(self):
+        random.seed(2217)
+        genome = "".join(random.choice("ACGT") for _ in range(300))
+        genome = genome + genome[40:70] + genome # add repeats so that there are branches
+        reads = {str(i): genome[i:i + 40] for i in range(0, len(genome) - 40, 7)}
+        queries = [genome[i:i + 25] for i in range(0, len(genome) - 25, 13)]
+        uncached = DeBruijnGraph(reads, 9, cache_bytes=0)
+        expected = [uncached.get_longest_contig(query) for query in queries]
+        graph = DeBruijnGraph(reads, 9)
+        self.assertEqual([graph.get_longest_contig(query) for query in queries], expected)
+        # queries in the same region reuse each other's walks, and repeated queries only hit the cache
+        self.assertGreater(graph.extension_cache.hits, 0)
+        misses = graph.extension_cache.misses
+        self.assertEqual([graph.get_longest_contig(query) for query in queries], expected)
+        self.assertEqual(graph.extension_cache.misses, misses)
+        graph.remove_edge(int(kmer_array(genome[100:109], 9)[0]))
+        self.assertEqual(len(graph.extension_cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
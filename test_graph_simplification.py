@@ -0,0 +1,88 @@
+""" Description: Unit tests for the de Bruijn graph simplification functions.
+"""
+import unittest
+import random
+from graph_simplification import *
+from de_bruijn_graph import *
+
+class TestInput(unittest.TestCase):
+    def setUp(self):
+        # three copies of reads tiling the genome
+        self.genome = "ATGGCGTACCTTAGCCAAGTTCAGGA"
+        self.reads = {"SEQ" + str(copy) + "_" + str(i): self.genome[i:i + 10]
+                      for copy in range(3) for i in range(0, len(self.genome) - 7, 3)}
+
+    def test_pop_bubbles(self):
+        # a read with a base error in the middle makes a bubble
+        self.reads["error"] = "GCGTACGTTAGCCA"
+        graph = DeBruijnGraph(self.reads, 5)
+        self.assertEqual(graph.get_longest_contig("CGTAC"), "ATGGCGTAC")
+        self.assertEqual(pop_bubbles(graph), 1)
+        self.assertEqual(graph.get_longest_contig("CGTAC"), self.genome)
+
+    def test_clip_tips(self):
+        # a read with a base error at its end makes a tip
+        self.reads["error"] = "CCTTAGCCAAGA"
+        graph = DeBruijnGraph(self.reads, 5)
+        self.assertEqual(graph.get_longest_contig("TTAGC"), "ATGGCGTACCTTAGCCAAG")
+        self.assertEqual(clip_tips(graph), 1)
+        self.assertEqual(graph.get_longest_contig("TTAGC"), self.genome)
+
+    def test_keep_covered_path(self):
+        # the tip is clipped, never the path that more reads agree on
+        self.reads["error"] = "CCTTAGCCAAGA"
+        graph = DeBruijnGraph(self.reads, 5)
+        clip_tips(graph)
+        self.assertEqual(graph.in_degree(encode_kmer("AAGT")), 1)
+        self.assertEqual(graph.in_degree(encode_kmer("AAGA")), 0)
+
+    def test_simplify_then_compact(self):
+        self.reads["error1"] = "GCGTACGTTAGCCA"
+        self.reads["error2"] = "CCTTAGCCAAGA"
+        graph = DeBruijnGraph(self.reads, 5)
+        graph.compact()
+        self.assertEqual(simplify(graph), (1, 1))
+        self.assertIsNone(graph.unitigs)
+        self.assertEqual(graph.compact(), [self.genome])
+        self.assertEqual(graph.get_longest_contig("CCAAG"), self.genome)
+
+    def test_canonical(self):
+        # the reads with errors come from the other strand
+        self.reads["error1"] = reverse_complement("GCGTACATTAGCCA")
+        self.reads["error2"] = reverse_complement("CCTTAGCCAAGA")
+        graph = DeBruijnGraph(self.reads, 6, canonical=True)
+        self.assertEqual(simplify(graph), (1, 1))
+        self.assertEqual(graph.compact(), [self.genome])
+
+    def test_nested_bubbles(self):
+        # bubbles that branch inside: a second error on a read that has the first (a bubble within a bubble), and
+        # errors close enough that the bubbles overlap. Neither is a pair of unbranched paths, so the search has to go
+        # on through the branches
+        random.seed(2207)
+        genome = "".join(random.choice("ACGT") for _ in range(80))
+        reads = {"SEQ" + str(copy) + "_" + str(i): genome[i:i + 20] for copy in range(3) for i in range(0, 61, 4)}
+        def mutate(seq, positions):
+            return "".join({"A": "C", "C": "G", "G": "T", "T": "A"}[base] if i in positions else base
+                           for i, base in enumerate(seq))
+        nested = [mutate(genome[20:50], [10]), mutate(genome[20:50], [10, 13]), mutate(genome[20:50], [10, 13])]
+        overlapping = [mutate(genome[20:50], [10]), mutate(genome[20:50], [15])]
+        for errors in [nested, overlapping]:
+            for canonical in [False, True]:
+                # in canonical mode every other read with errors comes from the other strand
+                error_reads = {"error" + str(i): reverse_complement(error) if canonical and i % 2 else error
+                               for i, error in enumerate(errors)}
+                graph = DeBruijnGraph({**reads, **error_reads}, 9, canonical=canonical)
+                self.assertNotEqual(graph.get_longest_contig(genome[:15]), genome)
+                self.assertEqual(pop_bubbles(graph), 1)
+                self.assertEqual(graph.get_longest_contig(genome[:15]), genome)
+                # paths longer than max_length are kept
+                graph = DeBruijnGraph({**reads, **error_reads}, 9, canonical=canonical)
+                self.assertEqual(pop_bubbles(graph, 6), 0)
+
+    def test_nothing_to_simplify(self):
+        graph = DeBruijnGraph(self.reads, 5)
+        self.assertEqual(simplify(graph), (0, 0))
+        self.assertEqual(graph.compact(), [self.genome])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+""" Description: Unit tests for the HyperLogLog distinct k-mer estimate.
+"""
+import unittest
+import random
+import numpy as np
+from hyperloglog import *
+from kmer_counter import KmerCounter
+from kmers import iter_kmer_arrays
+
+class TestInput(unittest.TestCase):
+    def test_estimate(self):
+        rng = np.random.default_rng(2217)
+        for n in [10, 1000, 50000, 1000000]:
+            kmers = rng.integers(0, 1 << 62, n, dtype=np.uint64)
+            sketch = HyperLogLog()
+            sketch.add_many(kmers)
+            sketch.add_many(kmers[:n // 2]) # adding the same k-mers again doesn't change the estimate
+            # about four standard errors
+            self.assertLess(abs(sketch.estimate() - n), 0.035 * n + 1)
+        self.assertEqual(len(HyperLogLog()), 0)
+        self.assertEqual(HyperLogLog().registers.nbytes, 16384)
+
+    def test_merge(self):
+        rng = np.random.default_rng(7)
+        kmers = rng.integers(0, 1 << 62, 20000, dtype=np.uint64)
+        whole, first, second = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        whole.add_many(kmers)
+        first.add_many(kmers[:12000])
+        second.add_many(kmers[8000:])
+        first.merge(second)
+        self.assertEqual(first.estimate(), whole.estimate())
+        with self.assertRaises(ValueError):
+            first.merge(HyperLogLog(seed=1))
+
+    def test_reads(self):
+        random.seed(2217)
+        genome = "".join(random.choice("ACGT") for _ in range(5000))
+        reads = [genome[i:i + 100] for i in range(0, len(genome) - 100, 10)]
+        for canonical in [False, True]:
+            counter = KmerCounter(15)
+            for kmers in iter_kmer_arrays(reads, 15, canonical):
+                counter.add(kmers)
+            estimate = estimate_distinct_kmers(reads, 15, canonical)
+            self.assertLess(abs(estimate - len(counter)), 0.035 * len(counter))
+
+if __name__ == '__main__':
+    unittest.main()
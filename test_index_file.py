@@ -0,0 +1,93 @@
+""" Description: Unit tests for saving and loading the index file.
+"""
+import unittest
+import os
+import tempfile
+from index_file import *
+
+class TestInput(unittest.TestCase):
+    def setUp(self):
+        # reads tiling ATGGCGTACCTTAGCCAAGT
+        self.reads = {
+            "SEQ1": "ATGGCGTA",
+            "SEQ2": "CGTACCTT",
+            "SEQ3": "CCTTAGCC",
+            "SEQ4": "AGCCAAGT"
+        }
+        self.search_tree = BloomFilterSearchTree(5, 959, 7, reads_per_leaf=2, seed=3)
+        for read_ID, sequence in self.reads.items():
+            self.search_tree.add(sequence, read_ID)
+        self.graph = DeBruijnGraph(self.reads, 5)
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, "reads.idx")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        self.graph.compact()
+        save_index(self.file_name, self.search_tree, self.graph)
+        search_tree, graph = load_index(self.file_name)
+        self.assertIsInstance(search_tree.filters, np.memmap)
+        self.assertEqual(search_tree.filters.tolist(), self.search_tree.filters[:self.search_tree.words_used].tolist())
+        self.assertEqual(search_tree.sizes, self.search_tree.sizes)
+        self.assertEqual((search_tree.seed, search_tree.reads_per_leaf, search_tree.num_reads), (3, 2, 4))
+        self.assertEqual(search_tree.leaf_reads, self.search_tree.leaf_reads)
+        self.assertEqual(search_tree.query("CCTTAG"), ["SEQ3", "SEQ4"])
+        self.assertTrue(search_tree.check("TACCTTAG"))
+        self.assertEqual(graph.kmer_table.counts.tolist(), self.graph.kmer_table.counts.tolist())
+        self.assertEqual(graph.unitigs, ["ATGGCGTACCTTAGCCAAGT"])
+        self.assertEqual(graph.get_longest_contig("TACCTTAG"), "ATGGCGTACCTTAGCCAAGT")
+        # the loaded tree can still grow; the file is not changed
+        search_tree.add("GGGGGGGG", "SEQ5")
+        self.assertEqual(load_index(self.file_name)[0].num_reads, 4)
+
+    def test_packed_strings(self):
+        self.graph.compact()
+        save_index(self.file_name, self.search_tree, self.graph)
+        search_tree, graph = load_index(self.file_name)
+        # the read IDs and unitigs are decoded on lookup, straight from the mapped file
+        self.assertIsInstance(graph.unitigs, PackedStrings)
+        self.assertIsInstance(graph.unitigs.data, np.memmap)
+        self.assertEqual((len(graph.unitigs), graph.unitigs[0], graph.unitigs[-1]), (1, "ATGGCGTACCTTAGCCAAGT",
+                                                                                     "ATGGCGTACCTTAGCCAAGT"))
+        self.assertRaises(IndexError, graph.unitigs.__getitem__, 1)
+        self.assertIsInstance(search_tree.leaf_reads, LeafReads)
+        self.assertEqual(search_tree.leaf_reads[search_tree.left[search_tree.root]], ["SEQ1", "SEQ2"])
+        self.assertNotIn(search_tree.root, search_tree.leaf_reads)
+        self.assertRaises(KeyError, search_tree.leaf_reads.__getitem__, search_tree.root)
+        # leaves added after loading are kept alongside the saved ones, and the tree can be saved again
+        for read_ID, sequence in [("SEQ5", "GGGGGGGG"), ("SEQ6", "TTTTTTTT")]:
+            search_tree.add(sequence, read_ID)
+        search_tree.flush()
+        self.assertEqual(len(search_tree.leaf_reads), 3)
+        self.assertEqual(search_tree.query("GGGGG"), ["SEQ5", "SEQ6"])
+        save_index(self.file_name, search_tree, graph)
+        reloaded, regraph = load_index(self.file_name)
+        self.assertEqual(dict(reloaded.leaf_reads), dict(search_tree.leaf_reads))
+        self.assertEqual(list(regraph.unitigs), ["ATGGCGTACCTTAGCCAAGT"])
+
+    def test_not_compacted(self):
+        save_index(self.file_name, self.search_tree, self.graph)
+        search_tree, graph = load_index(self.file_name)
+        self.assertIsNone(graph.unitigs)
+        self.assertEqual(graph.get_longest_contig("TACCTTAG"), "ATGGCGTACCTTAGCCAAGT")
+
+    def test_canonical(self):
+        search_tree = BloomFilterSearchTree(5, 959, 7, canonical=True)
+        search_tree.add("ATGGCGTA", "SEQ1")
+        self.assertRaises(ValueError, save_index, self.file_name, search_tree, self.graph)
+        save_index(self.file_name, search_tree, DeBruijnGraph(self.reads, 5, canonical=True))
+        search_tree, graph = load_index(self.file_name)
+        self.assertTrue(search_tree.canonical and graph.canonical)
+        self.assertTrue(search_tree.check("TACGCC"))
+
+    def test_version_check(self):
+        save_index(self.file_name, self.search_tree, self.graph)
+        with open(self.file_name, "r+b") as file:
+            file.seek(len(MAGIC))
+            file.write(np.array([INDEX_VERSION + 1], dtype="<u4").tobytes())
+        self.assertRaises(ValueError, load_index, self.file_name)
+
+if __name__ == '__main__':
+    unittest.main()
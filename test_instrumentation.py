@@ -0,0 +1,97 @@
+""" Description: Unit tests for the instrumentation functions.
+"""
+import unittest
+import os
+import sys
+import json
+import subprocess
+import tempfile
+from instrumentation import *
+from query_session import QuerySession
+
+class TestInput(unittest.TestCase):
+    def setUp(self):
+        self.reads = {
+            "SEQ1": "ATGGCGTA",
+            "SEQ2": "CGTACCTT",
+            "SEQ3": "CCTTAGCC",
+            "SEQ4": "AGCCAAGT"
+        }
+
+    def tearDown(self):
+        disable()
+
+    def test_disabled(self):
+        self.assertFalse(enabled())
+        with stage("anything"):
+            count("reads_parsed")
+            gauge("graph_nodes", 3)
+        self.assertEqual(report(), {})
+        self.assertIsNone(disable())
+
+    def test_no_profiler_imports(self):
+        # the profilers are only loaded once a stage is profiled
+        code = ("import sys, instrumentation; instrumentation.enable()\n"
+                "with instrumentation.stage('build'): pass\n"
+                "print(*(module in sys.modules for module in ['cProfile', 'pstats', 'tracemalloc']))")
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.stdout.splitlines()[-1], "False False False")
+
+    def test_stages_and_counters(self):
+        enable()
+        for _ in range(2):
+            with stage("outer"):
+                with stage("inner"):
+                    count("steps", 5)
+        gauge("fill", 0.5)
+        gauge("fill", 0.25)
+        metrics = report()
+        self.assertEqual(metrics["stages"]["outer"]["calls"], 2)
+        self.assertGreaterEqual(metrics["stages"]["outer"]["seconds"], metrics["stages"]["inner"]["seconds"])
+        self.assertGreater(metrics["stages"]["inner"]["peak_rss_bytes"], 0)
+        self.assertEqual(metrics["counters"], {"steps": 10})
+        self.assertEqual(metrics["gauges"], {"fill": 0.25})
+
+    def test_session(self):
+        enable()
+        session = QuerySession(self.reads, 5, 959, 7)
+        self.assertEqual(session.query("TACCTTAG"), "ATGGCGTACCTTAGCCAAGT")
+        metrics = report()
+        for name in ["search_tree_build", "graph_build", "kmer_table", "graph_construction", "compact", "query"]:
+            self.assertIn(name, metrics["stages"])
+        self.assertEqual(metrics["counters"]["kmers_inserted"], 16)
+        self.assertEqual(metrics["gauges"]["graph_edges"], 16)
+        self.assertGreater(metrics["gauges"]["filter_fill_ratio"], 0)
+
+    def test_profiles(self):
+        enable("cprofile")
+        with stage("build"):
+            QuerySession(self.reads, 5, 959, 7).search_tree
+        self.assertIn("function calls", report()["profiles"]["build"])
+        enable("tracemalloc")
+        with stage("build"):
+            QuerySession(self.reads, 5, 959, 7).search_tree
+        self.assertGreater(report()["stages"]["build"]["traced_peak_bytes"], 0)
+        self.assertRaises(ValueError, enable, "perf")
+
+    def test_write_report(self):
+        enable()
+        with stage("read_input"):
+            count("reads_parsed", 4)
+        gauge("graph_nodes", 12)
+        with tempfile.TemporaryDirectory() as directory:
+            json_file = os.path.join(directory, "metrics.json")
+            write_report(json_file)
+            with open(json_file) as file:
+                self.assertEqual(json.load(file)["counters"], {"reads_parsed": 4})
+            prometheus_file = os.path.join(directory, "metrics.prom")
+            write_report(prometheus_file)
+            with open(prometheus_file) as file:
+                text = file.read()
+        self.assertIn('search_stage_calls_total{stage="read_input"} 1.0', text)
+        self.assertIn("search_reads_parsed_total 4.0", text)
+        self.assertIn("# TYPE search_graph_nodes gauge", text)
+
+if __name__ == '__main__':
+    unittest.main()
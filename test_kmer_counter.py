@@ -0,0 +1,44 @@
+""" Description: Unit tests for the k-mer counting table.
+"""
+import unittest
+from kmer_counter import *
+from kmers import kmer_array, encode_kmer
+
+class TestInput(unittest.TestCase):
+    def test_count(self):
+        # a tiny buffer so that batches are merged into the table more than once
+        counter = KmerCounter(3, buffer_size=4)
+        for read in ["ATGCTA", "GCTAGC", "TAGCAC"]:
+            counter.add(kmer_array(read, 3))
+        self.assertEqual(len(counter), 8)
+        self.assertEqual(counter[encode_kmer("GCT")], 2)
+        self.assertEqual(counter[encode_kmer("CAC")], 1)
+        self.assertEqual(counter[encode_kmer("AAA")], 0)
+        self.assertTrue(encode_kmer("TAG") in counter)
+        self.assertEqual(counter.kmers.tolist(), sorted(counter.kmers.tolist()))
+        self.assertEqual(counter.histogram().tolist(), [0, 4, 4])
+
+    def test_threshold_and_merge(self):
+        first = KmerCounter(3)
+        first.add(kmer_array("ATGCTA", 3))
+        second = KmerCounter(3)
+        second.add(kmer_array("GCTAGC", 3))
+        first.merge(second)
+        self.assertEqual(first[encode_kmer("CTA")], 2)
+        first.apply_threshold(2)
+        self.assertEqual(sorted(first.kmers.tolist()), sorted([encode_kmer("GCT"), encode_kmer("CTA")]))
+
+    def test_capacity(self):
+        reads = ["ATGCTA", "GCTAGC", "TAGCAC", "ATGCTA"]
+        for capacity, reallocations in [(8, 0), (3, 3)]:
+            counter = KmerCounter(3, buffer_size=4, capacity=capacity)
+            for read in reads:
+                counter.add(kmer_array(read, 3))
+            self.assertEqual(len(counter), 8)
+            self.assertEqual(counter.reallocations, reallocations)
+            counter.add_counts(kmer_array("TTT", 3), [2])
+            self.assertEqual(counter.kmers.tolist(), sorted(counter.kmers.tolist()))
+            self.assertEqual([counter[encode_kmer(kmer)] for kmer in ["GCT", "ATG", "TTT"]], [3, 2, 2])
+
+if __name__ == '__main__':
+    unittest.main()
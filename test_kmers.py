@@ -0,0 +1,42 @@
+""" Description: Unit tests for the k-mer encoding functions.
+"""
+import unittest
+from kmers import *
+
+class TestInput(unittest.TestCase):
+    def test_encode_kmer(self):
+        self.assertEqual(encode_kmer("ACGT"), 0b00011011)
+        self.assertEqual(decode_kmer(encode_kmer("GATTACA"), 7), "GATTACA")
+        self.assertRaises(ValueError, encode_kmer, "ACNT")
+
+    def test_kmer_array(self):
+        expected = [encode_kmer(kmer) for kmer in ["ACT", "CTG", "TGC", "GCT", "CTA"]]
+        self.assertEqual(kmer_array("ACTGCTA", 3).tolist(), expected)
+        # windows containing anything other than A, C, G or T are skipped
+        expected = [encode_kmer(kmer) for kmer in ["ACT", "GCT", "CTA"]]
+        self.assertEqual(kmer_array("ACTNGCTA", 3).tolist(), expected)
+        self.assertEqual(len(kmer_array("AC", 3)), 0)
+        kmers, positions = kmer_array("ACTNGCTA", 3, return_positions=True)
+        self.assertEqual(positions.tolist(), [0, 4, 5])
+
+    def test_reverse_complement(self):
+        kmers = np.array([encode_kmer("AACGTG"), encode_kmer("GGGCCC")], dtype=np.uint64)
+        observed = [decode_kmer(x, 6) for x in reverse_complement_kmers(kmers, 6)]
+        self.assertEqual(observed, ["CACGTT", "GGGCCC"])
+        self.assertEqual(decode_kmer(reverse_complement_kmer(encode_kmer("AACGTG"), 6), 6), "CACGTT")
+        self.assertEqual(reverse_complement("AACGTG"), "CACGTT")
+
+    def test_canonical_kmer_array(self):
+        # every k-mer of a sequence and of its reverse complement have the same canonical form
+        forward = kmer_array("ACCGTTAGGCATTTCG", 5, canonical=True)
+        reverse = kmer_array("CGAAATGCCTAACGGT", 5, canonical=True)
+        self.assertEqual(forward.tolist(), reverse[::-1].tolist())
+        expected = canonical_kmers(kmer_array("ACCGTTAGGCATTTCG", 5), 5)
+        self.assertEqual(forward.tolist(), expected.tolist())
+
+    def test_iter_kmer_arrays(self):
+        observed = [kmers.tolist() for kmers in iter_kmer_arrays(["ACGT", "GG"], 3)]
+        self.assertEqual(observed, [[encode_kmer("ACG"), encode_kmer("CGT")], []])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+""" Description: Unit tests for the command-line entry point.
+"""
+import unittest
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+from main import *
+from bloom_filter import get_m
+from bloom_filter_search_tree import foldable_size
+from hyperloglog import estimate_distinct_kmers
+from index_file import load_index
+import reading_input
+
+class TestInput(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.reads = os.path.join(self.directory.name, "reads.fasta")
+        self.queries = os.path.join(self.directory.name, "queries.fasta")
+        with open(self.reads, "w") as file:
+            file.write(">SEQ1\nATGGCGTA\n>SEQ2\nCGTACCTT\n>SEQ3\nCCTTAGCC\n>SEQ4\nAGCCAAGT\n")
+        with open(self.queries, "w") as file:
+            file.write(">query_1\nTACCTTAG\n>query_2\nGGGGGGGG\n")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_parse_args(self):
+        args = parse_args([])
+        self.assertEqual(args.reads, "READS_example.fasta")
+        self.assertEqual(args.k, 20)
+        self.assertFalse(args.targeted)
+        self.assertIsNone(args.max_rounds)
+        self.assertEqual(args.min_kmer_count, 1)
+        args = parse_args(["--reads", "r.fasta", "-k", "25", "--threads", "4", "--canonical", "--min-score", "0.9"])
+        self.assertEqual((args.reads, args.k, args.threads, args.min_score), ("r.fasta", 25, 4, 0.9))
+        self.assertTrue(args.canonical)
+
+    def test_output(self):
+        output = os.path.join(self.directory.name, "contigs.fasta")
+        main(["--reads", self.reads, "--queries", self.queries, "-k", "5", "--output", output])
+        with open(output) as file:
+            self.assertEqual(file.read(), ">query_1\nATGGCGTACCTTAGCCAAGT\n>query_2\n\n")
+        # reads this short overlap by too little to share minimizers, so a targeted contig can stop short of the
+        # whole-graph one
+        main(["--reads", self.reads, "--queries", self.queries, "-k", "5", "--targeted", "--output", output])
+        with open(output) as file:
+            contigs = file.read().split("\n")
+        self.assertIn("TACCTTAG", contigs[1])
+        self.assertIn(contigs[1], "ATGGCGTACCTTAGCCAAGT")
+
+    def test_stats(self):
+        stats_file = os.path.join(self.directory.name, "stats.json")
+        main(["--reads", self.reads, "--queries", self.queries, "-k", "5", "--stats", stats_file])
+        with open(stats_file) as file:
+            stats = json.load(file)
+        self.assertEqual((stats["reads"], stats["bases"], stats["k"]), (4, 32, 5))
+
+    def test_filter_sizes(self):
+        # 64 random reads: the estimate of every k-mer only sizes the root, and each leaf holds its own bin
+        random = np.random.default_rng(5)
+        with open(self.reads, "w") as file:
+            for i in range(64):
+                file.write(">read_" + str(i) + "\n" + "".join(random.choice(list("ACGT"), 100)) + "\n")
+        index = os.path.join(self.directory.name, "reads.idx")
+        main(["--reads", self.reads, "--queries", self.queries, "-k", "21", "--reads-per-leaf", "8",
+              "--save-index", index])
+        search_tree, _ = load_index(index)
+        num_kmers = estimate_distinct_kmers(reading_input.read_reads(self.reads).values(), 21)
+        self.assertEqual(search_tree.array_size, foldable_size(get_m(int(num_kmers * 1.03), 0.0001)))
+        self.assertEqual(search_tree.sizes[search_tree.root], search_tree.array_size)
+        self.assertEqual(len(search_tree.leaf_reads), 8)
+        # a leaf holds an eighth of the k-mers, in a filter folded down at least twice
+        for leaf in search_tree.leaf_reads:
+            self.assertLessEqual(search_tree.sizes[leaf], search_tree.array_size // 4)
+            self.assertTrue(search_tree.node_filter(leaf).fill_ratio() < 0.6)
+
+    def test_no_plotting_imports(self):
+        # a run without --explore shouldn't load matplotlib (or pandas, which isn't used at all)
+        code = ("import sys, main; main.main(" + repr(["--reads", self.reads, "--queries", self.queries, "-k", "5"]) +
+                "); print('matplotlib' in sys.modules, 'pandas' in sys.modules)")
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.stdout.splitlines()[-1], "False False")
+
+if __name__ == '__main__':
+    unittest.main()
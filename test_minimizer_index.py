@@ -0,0 +1,76 @@
+""" Description: Unit tests for the minimizer index and targeted contig assembly.
+"""
+import unittest
+import random
+from minimizer_index import *
+from kmers import reverse_complement
+
+class TestInput(unittest.TestCase):
+    def setUp(self):
+        random.seed(3014)
+        self.genome = "".join(random.choice("ACGT") for _ in range(600))
+        self.reads = {"read_" + str(i): self.genome[i:i + 50] for i in range(0, 551, 10)}
+        # reads from somewhere else, which no query should recruit
+        other = "".join(random.choice("ACGT") for _ in range(300))
+        self.reads.update({"other_" + str(i): other[i:i + 50] for i in range(0, 251, 10)})
+
+    def test_minimizers(self):
+        seq = self.genome[:100]
+        keys = minimizers(seq, 11, 5)
+        self.assertEqual(keys.tolist(), sorted(set(keys.tolist())))
+        # every window of 5 k-mers has its minimum among the minimizers
+        hashes = hash64(kmer_array(seq, 11))
+        for start in range(len(hashes) - 4):
+            self.assertIn(int(hashes[start:start + 5].min()), keys.tolist())
+        self.assertEqual(minimizers(seq, 11, 5, canonical=True).tolist(),
+                         minimizers(reverse_complement(seq), 11, 5, canonical=True).tolist())
+        self.assertEqual(len(minimizers("ACGTACGTACGT", 11, 5)), 1)
+        self.assertEqual(len(minimizers("ACGT", 11, 5)), 0)
+
+    def test_query(self):
+        index = build_minimizer_index(self.reads, 11, 5)
+        self.assertEqual(len(index), len(self.reads))
+        found = index.query(self.genome[200:240])
+        self.assertIn("read_200", found)
+        self.assertIn("read_190", found)
+        self.assertFalse(any(read_ID.startswith("other") for read_ID in found))
+        self.assertEqual(index.query(self.genome[200:240], min_shared=1000), [])
+        # reads added after a query are found too
+        index.add(self.genome[205:245], "late")
+        self.assertIn("late", index.query(self.genome[200:240]))
+
+    def test_targeted_contig(self):
+        index = build_minimizer_index(self.reads, 11, 5)
+        contig, read_IDs = targeted_contig(index, self.reads, self.genome[300:330], 21)
+        self.assertEqual(contig, DeBruijnGraph(self.reads, 21).get_longest_contig(self.genome[300:330]))
+        self.assertEqual(contig, self.genome)
+        self.assertFalse(any(read_ID.startswith("other") for read_ID in read_IDs))
+        # one round only recruits the reads around the query
+        contig, read_IDs = targeted_contig(index, self.reads, self.genome[300:330], 21, max_rounds=1)
+        self.assertLess(len(read_IDs), 10)
+        self.assertIn(self.genome[300:330], contig)
+
+    def test_targeted_contig_long(self):
+        # each round grows the contig by about a read at each end, so a long genome takes many more than ten rounds
+        genome = "".join(random.choice("ACGT") for _ in range(3000))
+        reads = {"read_" + str(i): genome[i:i + 50] for i in range(0, 2951, 10)}
+        index = build_minimizer_index(reads, 11, 5)
+        looked_up = []
+        reads_with = index.reads_with
+        index.reads_with = lambda keys, min_shared=1: looked_up.extend(keys.tolist()) or reads_with(keys, min_shared)
+        contig, read_IDs = targeted_contig(index, reads, genome[1500:1530], 21)
+        self.assertEqual(contig, genome)
+        self.assertEqual(len(read_IDs), len(reads))
+        # each round only looks up the minimizers of the ends the contig grew by, and none of them twice
+        self.assertEqual(len(looked_up), len(set(looked_up)))
+        self.assertEqual(sorted(looked_up), minimizers(genome, 11, 5).tolist())
+
+    def test_canonical(self):
+        reads = {read_ID: (reverse_complement(sequence) if i % 2 else sequence)
+                 for i, (read_ID, sequence) in enumerate(self.reads.items())}
+        index = build_minimizer_index(reads, 11, 5, canonical=True)
+        contig, _ = targeted_contig(index, reads, self.genome[300:330], 21)
+        self.assertEqual(contig, self.genome)
+
+if __name__ == '__main__':
+    unittest.main()
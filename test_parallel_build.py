@@ -0,0 +1,90 @@
+""" Description: Unit tests for the multiprocess build.
+"""
+import unittest
+import os
+import random
+import tempfile
+from parallel_build import *
+from kmers import reverse_complement
+
+class TestInput(unittest.TestCase):
+    def setUp(self):
+        random.seed(7712)
+        genome = "".join(random.choice("ACGT") for _ in range(500))
+        self.reads = {"read_" + str(i): genome[i:i + 60] for i in range(0, 440, 11)}
+
+    def test_matches_serial_build(self):
+        for reads_per_leaf in [1, 3]:
+            search_tree, kmer_table = parallel_build(self.reads, 11, 4096, 5, processes=3, reads_per_leaf=reads_per_leaf,
+                                                     leaves_per_shard=2)
+            serial_tree = BloomFilterSearchTree(11, 4096, 5, reads_per_leaf)
+            serial_counts = KmerCounter(11)
+            for read_ID, sequence in self.reads.items():
+                serial_tree.add(sequence, read_ID)
+                serial_counts.add(kmer_array(sequence, 11))
+            serial_tree.flush()
+            self.assertEqual(kmer_table.kmers.tolist(), serial_counts.kmers.tolist())
+            self.assertEqual(kmer_table.counts.tolist(), serial_counts.counts.tolist())
+            # the leaves are inserted in the same order, so the trees are the same
+            self.assertEqual(search_tree.filters[:search_tree.words_used].tolist(),
+                             serial_tree.filters[:serial_tree.words_used].tolist())
+            self.assertEqual(search_tree.leaf_reads, serial_tree.leaf_reads)
+            self.assertEqual(search_tree.num_reads, len(self.reads))
+            query = self.reads["read_88"][10:40]
+            self.assertEqual(sorted(search_tree.query(query)), sorted(serial_tree.query(query)))
+
+    def test_parent_does_not_hash(self):
+        # the workers hash the leaves; the parent only splices their filter words into the tree
+        add_leaf = BloomFilterSearchTree.add_leaf
+        def fail(*args):
+            raise AssertionError("a leaf was hashed in the parent")
+        BloomFilterSearchTree.add_leaf = fail
+        try:
+            search_tree, _ = parallel_build(self.reads, 11, 4096, 5, processes=2, reads_per_leaf=2, leaves_per_shard=3)
+        finally:
+            BloomFilterSearchTree.add_leaf = add_leaf
+        self.assertEqual(search_tree.num_reads, len(self.reads))
+        self.assertIn("read_88", search_tree.query(self.reads["read_88"][10:40]))
+
+    def test_min_kmer_count(self):
+        # the abundance counters are summed from the workers' counts, and come out the same as counting every read
+        reads = dict(self.reads, error_1=self.reads["read_88"][:30] + "A" * 30, error_2="ACGT" * 15)
+        search_tree, _ = parallel_build(reads, 11, 4096, 5, processes=2, reads_per_leaf=3, leaves_per_shard=2,
+                                        min_kmer_count=2)
+        serial_tree = BloomFilterSearchTree(11, 4096, 5, 3, min_kmer_count=2)
+        for read_ID, sequence in reads.items():
+            serial_tree.add(sequence, read_ID)
+        serial_tree.flush()
+        self.assertEqual(search_tree.abundance.array.tolist(), serial_tree.abundance.array.tolist())
+        self.assertEqual(search_tree.filters[:search_tree.words_used].tolist(),
+                         serial_tree.filters[:serial_tree.words_used].tolist())
+        # the repeated k-mers are solid, but the k-mers seen in only one read aren't
+        self.assertTrue(search_tree.check("ACGT" * 6))
+        self.assertFalse(search_tree.check(self.reads["read_0"][:30]))
+        self.assertTrue(search_tree.check(self.reads["read_88"][:30]))
+
+    def test_canonical(self):
+        search_tree, kmer_table = parallel_build(self.reads, 11, 4096, 5, processes=2, reads_per_leaf=1, canonical=True)
+        self.assertTrue(search_tree.canonical)
+        serial_counts = KmerCounter(11)
+        for sequence in self.reads.values():
+            serial_counts.add(kmer_array(sequence, 11, canonical=True))
+        self.assertEqual(kmer_table.kmers.tolist(), serial_counts.kmers.tolist())
+        query = reverse_complement(self.reads["read_88"][10:40])
+        self.assertIn("read_88", search_tree.query(query))
+
+    def test_stream_from_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "reads.fasta")
+            with open(file_name, "w") as file:
+                for read_ID, sequence in self.reads.items():
+                    file.write(">" + read_ID + "\n" + sequence + "\n")
+            search_tree, kmer_table = parallel_build(file_name, 11, 4096, 5, processes=2, reads_per_leaf=4,
+                                                     leaves_per_shard=1)
+        expected, expected_counts = parallel_build(self.reads, 11, 4096, 5, processes=1, reads_per_leaf=4)
+        self.assertEqual(search_tree.leaf_reads, expected.leaf_reads)
+        self.assertEqual(kmer_table.counts.tolist(), expected_counts.counts.tolist())
+        self.assertIn("read_88", search_tree.query(self.reads["read_88"][10:40]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+""" Description: Unit tests for the query server.
+"""
+import unittest
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from query_server import *
+from query_session import QuerySession
+
+'''Send HTTP requests over one connection and read the responses
+Input: StreamReader reader; StreamWriter writer; LIST of (method, path, body) tuples
+Output: LIST of (INT status, BYTES body) tuples
+'''
+async def _requests(reader, writer, requests):
+    responses = []
+    for method, path, body in requests:
+        body = body.encode()
+        writer.write((method + " " + path + " HTTP/1.1\r\nHost: localhost\r\nContent-Length: " + str(len(body)) +
+                      "\r\n\r\n").encode() + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        responses.append((status, await reader.readexactly(int(headers["content-length"]))))
+    return responses
+
+class TestInput(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # reads tiling ATGGCGTACCTTAGCCAAGT
+        self.reads = {"SEQ1": "ATGGCGTA", "SEQ2": "CGTACCTT", "SEQ3": "CCTTAGCC", "SEQ4": "AGCCAAGT"}
+        self.queries = {"Q1": "TACCTTAG", "Q2": "GGGGGGGG", "Q3": "CCAAGT"}
+        self.expected = {"Q1": "ATGGCGTACCTTAGCCAAGT", "Q2": "", "Q3": "ATGGCGTACCTTAGCCAAGT"}
+
+    async def test_query_all(self):
+        for processes in [1, 2]:
+            server = QueryServer(QuerySession(self.reads, 5, 959, 7), processes=processes)
+            await server.start(port=0)
+            try:
+                self.assertEqual(await server.query_all(self.queries), self.expected)
+            finally:
+                await server.close()
+
+    async def test_batching(self):
+        server = QueryServer(QuerySession(self.reads, 5, 959, 7), max_batch=2)
+        await server.start(port=0)
+        batches = []
+        check_all = server.session.check_all
+        server.session.check_all = lambda queries: batches.append(len(queries)) or check_all(queries)
+        try:
+            self.assertEqual(await server.query_all(self.queries), self.expected)
+        finally:
+            await server.close()
+        # the queries queued together are checked together, up to max_batch at a time
+        self.assertEqual(batches, [2, 1])
+
+    async def test_http(self):
+        server = QueryServer(QuerySession(self.reads, 5, 959, 7))
+        await server.start(port=0)
+        try:
+            host, port = server.addresses[0][:2]
+            reader, writer = await asyncio.open_connection(host, port)
+            # several requests on one connection
+            responses = await _requests(reader, writer, [
+                ("POST", "/query", json.dumps(self.queries)),
+                ("GET", "/health", ""),
+                ("POST", "/query", "not json"),
+                ("GET", "/query", ""),
+                ("GET", "/nothing", "")
+            ])
+            writer.close()
+        finally:
+            await server.close()
+        self.assertEqual(responses[0], (200, json.dumps(self.expected).encode()))
+        self.assertEqual(json.loads(responses[1][1]), {"status": "ok"})
+        self.assertEqual([status for status, _ in responses[2:]], [400, 405, 404])
+
+    async def test_concurrent_requests(self):
+        server = QueryServer(QuerySession(self.reads, 5, 959, 7), max_batch=1)
+        await server.start(port=0)
+        # the first check waits until a health check has been answered, which only happens if the event loop keeps
+        # serving while it runs
+        started, answered, waits = threading.Event(), threading.Event(), []
+        check_all = server.session.check_all
+        server.session.check_all = lambda queries: started.set() or waits.append(answered.wait(2)) or check_all(queries)
+        async def send(requests):
+            reader, writer = await asyncio.open_connection(host, port)
+            responses = await _requests(reader, writer, requests)
+            writer.close()
+            return responses
+        try:
+            host, port = server.addresses[0][:2]
+            requests = [asyncio.create_task(send([("POST", "/query", json.dumps({query_ID: self.queries[query_ID]}))]))
+                        for query_ID in ["Q1", "Q3"]]
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 2)
+            health = await send([("GET", "/health", "")])
+            answered.set()
+            first, second = await asyncio.gather(*requests)
+        finally:
+            await server.close()
+        self.assertEqual(health, [(200, b'{"status": "ok"}')])
+        self.assertEqual(waits, [True, True])
+        self.assertEqual(first, [(200, json.dumps({"Q1": self.expected["Q1"]}).encode())])
+        self.assertEqual(second, [(200, json.dumps({"Q3": self.expected["Q3"]}).encode())])
+
+    async def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            socket_path = os.path.join(directory, "search.sock")
+            server = QueryServer(QuerySession(self.reads, 5, 959, 7, targeted=True))
+            await server.start(socket_path=socket_path)
+            try:
+                reader, writer = await asyncio.open_unix_connection(socket_path)
+                responses = await _requests(reader, writer, [("POST", "/query", json.dumps({"Q2": "GGGGGGGG"}))])
+                writer.close()
+            finally:
+                await server.close()
+        self.assertEqual(responses, [(200, b'{"Q2": ""}')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+""" Description: Unit tests for the query session.
+"""
+import unittest
+import os
+import tempfile
+import random
+import pickle
+import multiprocessing
+from query_session import *
+from query_session import _init_worker, _query_in_worker
+
+class TestInput(unittest.TestCase):
+    def setUp(self):
+        # reads tiling ATGGCGTACCTTAGCCAAGT
+        self.reads = {
+            "SEQ1": "ATGGCGTA",
+            "SEQ2": "CGTACCTT",
+            "SEQ3": "CCTTAGCC",
+            "SEQ4": "AGCCAAGT"
+        }
+
+    def test_build_once(self):
+        session = QuerySession(self.reads, 5, 959, 7)
+        self.assertEqual(session.query("TACCTTAG"), "ATGGCGTACCTTAGCCAAGT")
+        graph = session.graph
+        search_tree = session.search_tree
+        self.assertEqual(session.query("GCGTACC"), "ATGGCGTACCTTAGCCAAGT")
+        self.assertIs(graph, session.graph)
+        self.assertIs(search_tree, session.search_tree)
+
+    def test_graph_only_built_when_needed(self):
+        session = QuerySession(self.reads, 5, 959, 7)
+        self.assertEqual(session.query("GGGGGGGG"), "")
+        self.assertIsNone(session._graph)
+
+    def test_query_all(self):
+        session = QuerySession(self.reads, 5, 959, 7)
+        queries = {"Q1": "TACCTTAG", "Q2": "GGGGGGGG", "Q3": "CCAAGT"}
+        expected = {"Q1": "ATGGCGTACCTTAGCCAAGT", "Q2": "", "Q3": "ATGGCGTACCTTAGCCAAGT"}
+        self.assertEqual(session.query_all(queries), expected)
+        self.assertEqual(session.query_all(queries, processes=2), expected)
+
+    def test_parallel_build(self):
+        session = QuerySession(self.reads, 5, 959, 7, build_processes=2, reads_per_leaf=1)
+        self.assertEqual(session.query("TACCTTAG"), "ATGGCGTACCTTAGCCAAGT")
+        self.assertEqual(session.search_tree.query("CCTTAG"), ["SEQ3"])
+
+    def test_correct_errors(self):
+        # ten copies of the reads, plus one copy of the first read with an error in the middle
+        reads = {read_ID + "_" + str(i): sequence for read_ID, sequence in self.reads.items() for i in range(10)}
+        reads["error"] = "CGTACGTT"
+        self.assertEqual(QuerySession(reads, 5, 959, 7).query("TACCTTAG"), "GTACCTTAGCCAAGT")
+        session = QuerySession(reads, 5, 959, 7, correct_errors=True)
+        self.assertEqual(session.query("TACCTTAG"), "ATGGCGTACCTTAGCCAAGT")
+        self.assertGreater(session.solid_cutoff, 1)
+
+    def test_simplify(self):
+        reads = {read_ID + "_" + str(i): sequence for read_ID, sequence in self.reads.items() for i in range(3)}
+        reads["error"] = "CGTACGTT"
+        session = QuerySession(reads, 5, 959, 7, simplify=True)
+        self.assertEqual(session.query("TACCTTAG"), "ATGGCGTACCTTAGCCAAGT")
+
+    def test_canonical(self):
+        # the second and fourth reads come from the other strand
+        reads = {"SEQ1": "ATGGCGTA", "SEQ2": "AAGGTACG", "SEQ3": "CCTTAGCC", "SEQ4": "ACTTGGCT"}
+        self.assertEqual(QuerySession(reads, 5, 959, 7).query("TACCTTAG"), "")
+        session = QuerySession(reads, 5, 959, 7, canonical=True)
+        self.assertTrue(session.search_tree.check("TACCTTAG"))
+        self.assertIn("TACCTTAG", session.query("TACCTTAG"))
+
+    def test_min_score(self):
+        # the query has one base changed from the genome
+        query = "TACCTAAG"
+        self.assertEqual(QuerySession(self.reads, 5, 959, 7).query(query), "")
+        session = QuerySession(self.reads, 5, 959, 7, min_score=0.25)
+        self.assertTrue(session.query(query).startswith("ATGGCGTACCTAAG"))
+
+    def test_targeted(self):
+        random.seed(5120)
+        genomes = ["".join(random.choice("ACGT") for _ in range(400)) for _ in range(2)]
+        reads = {"read_" + str(g) + "_" + str(i): genome[i:i + 60] for g, genome in enumerate(genomes)
+                 for i in range(0, 341, 20)}
+        session = QuerySession(reads, 21, 4096, 5, targeted=True)
+        self.assertEqual(session.query(genomes[1][100:150]), genomes[1])
+        self.assertEqual(session.query("G" * 30), "")
+        self.assertIsNone(session._graph)
+        self.assertEqual(len(session.minimizer_index), len(reads))
+
+    def test_add_reads(self):
+        # two stretches of the genome; the reads joining them arrive later
+        random.seed(4410)
+        genome = "".join(random.choice("ACGT") for _ in range(300))
+        reads = {"read_" + str(i): genome[i:i + 50] for i in range(0, 251, 10) if not 100 <= i < 150}
+        later = {"late_" + str(i): genome[i:i + 50] for i in range(100, 150, 10)}
+        for targeted in [False, True]:
+            session = QuerySession(dict(reads), 15, 4096, 5, targeted=targeted, reads_per_leaf=1)
+            left, right, gap = genome[20:60], genome[220:260], genome[110:150]
+            self.assertEqual(session.query(left), genome[:140])
+            self.assertEqual(session.query(right), genome[150:])
+            self.assertEqual(session.query(gap), "")
+            session._results["untouched"] = "unchanged" # a kept result the new reads don't touch
+            session.add_reads(later)
+            self.assertNotIn(left, session._results)
+            self.assertNotIn(right, session._results)
+            self.assertIn("untouched", session._results)
+            # the same answers as a session of all of the reads
+            rebuilt = QuerySession({**reads, **later}, 15, 4096, 5, targeted=targeted)
+            self.assertEqual(session.query(left), rebuilt.query(left))
+            self.assertEqual(session.query(gap), rebuilt.query(gap))
+            self.assertTrue(genome[:140] in session.query(left) and genome[150:] in session.query(gap))
+            self.assertEqual(sorted(session.search_tree.query(genome[120:160])), ["late_110", "late_120"])
+
+    def test_min_kmer_count(self):
+        # every read but SEQ1 is seen twice, so only SEQ1's k-mers are left out of the checks
+        reads = dict(self.reads, **{read_ID + "_copy": sequence for read_ID, sequence in self.reads.items()
+                                    if read_ID != "SEQ1"})
+        for build_processes in [1, 2]:
+            session = QuerySession(reads, 5, 959, 7, build_processes=build_processes, min_kmer_count=2)
+            self.assertEqual(session.search_tree.min_kmer_count, 2)
+            self.assertEqual(session.query("GCGTA"), "")
+            self.assertEqual(session.query("TACCTTAG"), "ATGGCGTACCTTAGCCAAGT")
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "reads.idx")
+            session.save_index(file_name)
+            self.assertEqual(load_session(file_name).min_kmer_count, 2)
+
+    def test_max_results(self):
+        session = QuerySession(self.reads, 5, 959, 7, max_results=2)
+        session.query("TACCTTAG")
+        session.query("GGGGGGGG")
+        session.query("TACCTTAG") # now the most recently used
+        session.query("CCAAGT")
+        self.assertEqual(list(session._results), ["TACCTTAG", "CCAAGT"])
+        session.query_all({"Q1": "GCGTA", "Q2": "AGCCA", "Q3": "TTAGC"}, processes=2)
+        self.assertEqual(list(session._results), ["AGCCA", "TTAGC"])
+        session.query("CCCCCC")
+        self.assertEqual(list(session._results), ["TTAGC", "CCCCCC"])
+        # results are still dropped when reads touching them are added
+        session.add_reads({"SEQ5": "TTAGCGGG"})
+        self.assertEqual(list(session._results), ["CCCCCC"])
+        rebuilt = QuerySession({**self.reads, "SEQ5": "TTAGCGGG"}, 5, 959, 7)
+        self.assertEqual(session.query("TTAGC"), rebuilt.query("TTAGC"))
+        self.assertEqual(len(QuerySession(self.reads, 5, 959, 7, max_results=0)._results), 0)
+
+    def test_pickle(self):
+        # worker processes started with spawn or forkserver get the session pickled
+        session = QuerySession(self.reads, 5, 959, 7)
+        session.build()
+        session.query("TACCTTAG")
+        copy = pickle.loads(pickle.dumps(session))
+        self.assertEqual(list(copy._results), ["TACCTTAG"])
+        self.assertEqual(copy.query("CCAAGT"), "ATGGCGTACCTTAGCCAAGT")
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(session,)) as executor:
+            self.assertEqual(list(executor.map(_query_in_worker, ["TACCTTAG", "GGGGGGGG"])),
+                             ["ATGGCGTACCTTAGCCAAGT", ""])
+
+    def test_stream_from_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "reads.fasta")
+            with open(file_name, "w") as file:
+                for read_ID, sequence in self.reads.items():
+                    file.write(">" + read_ID + "\n" + sequence + "\n")
+            session = QuerySession(file_name, 5, 959, 7, reads_per_leaf=1)
+            self.assertEqual(session.query("TACCTTAG"), "ATGGCGTACCTTAGCCAAGT")
+            self.assertEqual(session.search_tree.query("CCTTAG"), ["SEQ3"])
+            # the tree is built on two processes from the streamed file, and targeted mode looks the recruited reads
+            # up in the file rather than loading them
+            session = QuerySession(file_name, 5, 959, 7, build_processes=2, targeted=True, reads_per_leaf=1)
+            expected = QuerySession(self.reads, 5, 959, 7, targeted=True).query("TACCTTAG")
+            self.assertEqual(session.query("TACCTTAG"), expected)
+            self.assertEqual(session.search_tree.query("CCTTAG"), ["SEQ3"])
+            self.assertIsInstance(session._read_dict, reading_input.IndexedReads)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "reads.idx")
+            QuerySession(self.reads, 5, 959, 7, reads_per_leaf=2).save_index(file_name)
+            session = load_session(file_name)
+            self.assertEqual(session.reads_per_leaf, 2)
+            self.assertEqual(session.query_all({"Q1": "TACCTTAG", "Q2": "GGGGGGGG"}),
+                             {"Q1": "ATGGCGTACCTTAGCCAAGT", "Q2": ""})
+
+if __name__ == '__main__':
+    unittest.main()
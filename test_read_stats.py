@@ -0,0 +1,55 @@
+""" Description: Unit tests for the streaming read-set statistics.
+"""
+import unittest
+import json
+import os
+import random
+import tempfile
+import numpy as np
+from read_stats import *
+from kmer_counter import KmerCounter
+from kmers import iter_kmer_arrays
+
+class TestInput(unittest.TestCase):
+    def test_stats(self):
+        reads = {"r1": "ACGTACGT", "r2": "GGGGCCCC", "r3": "ACGTACGT", "r4": "ATATNNGC", "r5": "", "r6": "ACGTACGT"}
+        stats = read_set_stats(reads, 3, batch_size=4, counters=1 << 12).to_dict()
+        self.assertEqual((stats["reads"], stats["bases"], stats["min_length"], stats["max_length"]), (6, 40, 0, 8))
+        self.assertEqual(stats["length_histogram"], {"lengths": [0, 8], "counts": [1, 5]})
+        self.assertEqual(stats["n50"], 8)
+        # GC is counted over the A, C, G and T bases only
+        self.assertAlmostEqual(stats["gc_content"], 22 / 38)
+        self.assertEqual(np.flatnonzero(stats["gc_histogram"]).tolist(), [33, 50, 100])
+        self.assertEqual(stats["gc_histogram"][50], 3)
+        # the three copies of ACGTACGT
+        self.assertEqual((stats["distinct_reads"], stats["duplicate_reads"]), (4, 2))
+        self.assertEqual(stats["duplication_levels"][1:4], [3, 0, 1])
+        # ACG and CGT are seen 6 times, GTA and TAC 3 times, GGG and CCC twice and GGC, GCC, ATA and TAT once
+        self.assertEqual(stats["kmer_spectrum"][:7], [0, 4, 2, 2, 0, 0, 2])
+
+    def test_spectrum(self):
+        random.seed(2217)
+        genome = "".join(random.choice("ACGT") for _ in range(3000))
+        reads = [genome[i:i + 100] for i in (random.randrange(len(genome) - 100) for _ in range(300))]
+        counter = KmerCounter(15)
+        for kmers in iter_kmer_arrays(reads, 15):
+            counter.add(kmers)
+        expected = np.bincount(np.minimum(counter.counts, 15), minlength=16)
+        stats = read_set_stats(reads, 15, batch_size=64, counters=1 << 20)
+        self.assertEqual(stats.kmer_spectrum.tolist(), expected.tolist())
+        self.assertLess(abs(stats.to_dict()["distinct_kmers"] - len(counter)), 0.035 * len(counter))
+        # a sample of the k-mers gives about the same spectrum once scaled back up
+        sampled = read_set_stats(reads, 15, counters=1 << 20, kmer_sample=0.5).to_dict()
+        self.assertLess(abs(sum(sampled["kmer_spectrum"]) - len(counter)), 0.1 * len(counter))
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "stats.json")
+            read_set_stats("test_reads.fastq", 3, counters=1 << 12).write_json(file_name)
+            with open(file_name) as file:
+                stats = json.load(file)
+        self.assertEqual((stats["reads"], stats["bases"], stats["n50"]), (2, 16, 8))
+        self.assertEqual(stats["gc_content"], 0.75)
+
+if __name__ == '__main__':
+    unittest.main()
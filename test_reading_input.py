@@ -23,5 +23,38 @@ class TestInput(unittest.TestCase):
             file_length = len(file.readlines())
             self.assertEqual(len(reading_input.read_query("test_query.txt")), file_length/2)
 
+    def test_multiline_fasta(self):
+        # sequences split over several lines, a blank line, and an empty record in the middle of the file
+        records = list(reading_input.parse_sequences("test_multiline.fasta"))
+        self.assertEqual(records, [("read_1 first read", "ACGTACGTACGTACGT"), ("read_2", ""), ("read_3", "TTTTGGGGCC")])
+
+    def test_fastq(self):
+        # the second record has a multi-line sequence and a quality line that starts with '@'
+        expected = [("read_1", "ACGTACGT"), ("read_2", "GGGGCCCC")]
+        self.assertEqual(list(reading_input.parse_sequences("test_reads.fastq")), expected)
+        self.assertEqual(list(reading_input.parse_sequences("test_reads.fastq.gz")), expected)
+        self.assertEqual(reading_input.read_reads("test_reads.fastq.gz"), dict(expected))
+
+    def test_read_batches(self):
+        batches = list(reading_input.read_batches("test_multiline.fasta", batch_size=2))
+        self.assertEqual([IDs for IDs, codes in batches], [["read_1 first read", "read_2"], ["read_3"]])
+        # the reads of a batch are separated by an invalid base
+        self.assertEqual(len(batches[0][1]), 17)
+        self.assertEqual(batches[0][1][-1], 4)
+
+    def test_indexed_reads(self):
+        for file_name in ["test_multiline.fasta", "test_reads.fastq", "test_reads.fastq.gz"]:
+            reads = reading_input.IndexedReads(file_name)
+            expected = list(reading_input.parse_sequences(file_name))
+            # the reads are handed on while the file is read
+            self.assertEqual(list(reads.scan()), expected)
+            self.assertEqual(len(reads), len(expected))
+            self.assertEqual(list(reads), [sequence_ID for sequence_ID, _ in expected])
+            for sequence_ID, sequence in reversed(expected):
+                self.assertEqual(reads[sequence_ID], sequence)
+            self.assertNotIn("read_4", reads)
+            # only the offsets of the records are kept for a plain file
+            self.assertEqual(reads._sequences is None, file_name != "test_reads.fastq.gz")
+
 if __name__ == '__main__':
     unittest.main()